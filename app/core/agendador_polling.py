@@ -0,0 +1,126 @@
+"""
+Agendador adaptativo das verificações do histórico de geração da tabela IBPT
+"""
+import json
+import os
+import random
+import statistics
+from datetime import datetime
+
+
+class AgendadorPolling:
+    """
+    Calcula os intervalos entre as verificações do histórico a partir da duração
+    das gerações anteriores com a mesma quantidade de estados
+    """
+
+    def __init__(self, historico_file="data/historico_geracao.json", delay=10, max_attempts=30,
+                 fator=1.6, jitter=0.2, max_registros=100):
+        """
+        Inicializa o agendador
+
+        Args:
+            historico_file: Arquivo com as durações das gerações anteriores
+            delay: Intervalo base entre verificações (segundos)
+            max_attempts: Número máximo de verificações
+            fator: Fator de crescimento do intervalo a cada verificação
+            jitter: Variação aleatória aplicada aos intervalos (fração)
+            max_registros: Quantidade máxima de registros mantidos no histórico
+        """
+        self.historico_file = historico_file
+        self.delay = delay
+        self.max_attempts = max_attempts
+        self.fator = fator
+        self.jitter = jitter
+        self.max_registros = max_registros
+
+    def _carregar(self):
+        try:
+            with open(self.historico_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return []
+
+    def prever_duracao(self, num_estados):
+        """
+        Estima quanto tempo a geração deve levar
+
+        Args:
+            num_estados: Quantidade de estados solicitados
+
+        Returns:
+            float: Duração prevista em segundos ou None se não houver histórico
+        """
+        registros = self._carregar()
+        if not registros:
+            return None
+
+        mesmos = [r['duracao'] for r in registros if r['estados'] == num_estados]
+        if mesmos:
+            return statistics.median(mesmos[-10:])
+
+        # Sem registros para essa quantidade: escala a partir da quantidade mais próxima
+        referencia = min(registros, key=lambda r: abs(r['estados'] - num_estados))
+        return referencia['duracao'] * num_estados / referencia['estados']
+
+    def registrar(self, num_estados, duracao):
+        """
+        Registra a duração de uma geração concluída
+
+        Args:
+            num_estados: Quantidade de estados solicitados
+            duracao: Tempo entre a solicitação e a conclusão (segundos)
+        """
+        registros = self._carregar()
+        registros.append({
+            'estados': num_estados,
+            'duracao': round(duracao, 1),
+            'registrado_em': datetime.now().isoformat()
+        })
+
+        try:
+            os.makedirs(os.path.dirname(self.historico_file) or ".", exist_ok=True)
+            temp_file = f"{self.historico_file}.tmp"
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                json.dump(registros[-self.max_registros:], f, indent=2)
+            os.replace(temp_file, self.historico_file)
+        except OSError as e:
+            print(f"⚠️ Não foi possível salvar o histórico de geração: {str(e)}")
+
+    def esperas(self, previsao=None, decorrido=0):
+        """
+        Gera o tempo a aguardar antes de cada verificação
+
+        Sem previsão, a primeira verificação é imediata e os intervalos crescem
+        exponencialmente a partir de `delay`. Com previsão, a primeira espera cobre
+        a maior parte do tempo previsto e os intervalos recomeçam curtos em torno
+        do instante previsto de conclusão.
+
+        Args:
+            previsao: Duração prevista da geração (segundos)
+            decorrido: Tempo já decorrido desde a solicitação (segundos)
+
+        Yields:
+            float: Segundos a aguardar antes da próxima verificação
+        """
+        limite = self.max_attempts * self.delay
+        if previsao:
+            limite = max(limite, previsao * 2)
+            primeira = max(0, previsao * 0.8 - decorrido)
+            intervalo = max(2, self.delay / 4)
+        else:
+            primeira = 0
+            intervalo = self.delay
+
+        yield primeira
+        total = primeira
+        teto = self.delay * 4
+
+        for _ in range(self.max_attempts - 1):
+            if total >= limite:
+                return
+            espera = min(intervalo, teto) * random.uniform(1 - self.jitter, 1 + self.jitter)
+            espera = min(espera, limite - total)
+            yield espera
+            total += espera
+            intervalo *= self.fator
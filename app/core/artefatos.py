@@ -0,0 +1,181 @@
+"""
+Cache dos arquivos da tabela IBPT separados por estado
+
+Depois do download, o ZIP completo é dividido uma única vez em um CSV por
+estado, gravados em data/cache/<versão>/ junto de um manifest.json. O bot
+serve esses arquivos diretamente, sem abrir o ZIP a cada pedido.
+"""
+import datetime
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+import zipfile
+
+MANIFESTO = "manifest.json"
+PREFIXO_TEMP = ".gerando-"
+
+
+def sha256_arquivo(caminho):
+    digest = hashlib.sha256()
+    with open(caminho, 'rb') as f:
+        for bloco in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(bloco)
+    return digest.hexdigest()
+
+
+class CacheArtefatos:
+    """
+    Artefatos por estado de cada versão da tabela
+    """
+
+    def __init__(self, cache_dir="data/cache"):
+        """
+        Args:
+            cache_dir: Diretório base do cache (um subdiretório por versão)
+        """
+        self.cache_dir = cache_dir
+        self._manifestos = {}
+        self._lock = threading.Lock()
+        self._lock_geracao = threading.RLock()
+
+    def diretorio_versao(self, versao):
+        return os.path.join(self.cache_dir, re.sub(r'[^\w.-]', '_', versao))
+
+    def gerar(self, zip_path, versao):
+        """
+        Divide o ZIP da tabela em um arquivo por estado e grava o manifesto
+
+        O diretório da versão é montado em um diretório temporário exclusivo
+        (outros processos podem gerar a mesma versão ao mesmo tempo) e só então
+        colocado no lugar, e os diretórios de versões anteriores são removidos.
+
+        Args:
+            zip_path: ZIP completo baixado do portal
+            versao: Versão da tabela contida no ZIP
+
+        Returns:
+            dict: Manifesto gerado
+        """
+        with self._lock_geracao:
+            return self._gerar(zip_path, versao)
+
+    def _gerar(self, zip_path, versao):
+        destino = self.diretorio_versao(versao)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        temp_dir = tempfile.mkdtemp(prefix=PREFIXO_TEMP, dir=self.cache_dir)
+
+        try:
+            estados = {}
+            with zipfile.ZipFile(zip_path, 'r') as zip_file:
+                for info in zip_file.infolist():
+                    # Formato: TabelaIBPTaxCE25.2.B.csv
+                    nome = os.path.basename(info.filename)
+                    match = re.match(r'TabelaIBPTax([A-Z]{2})', nome)
+                    if info.is_dir() or not match or match.group(1) in estados:
+                        continue
+
+                    caminho = os.path.join(temp_dir, nome)
+                    with zip_file.open(info) as origem, open(caminho, 'wb') as arquivo:
+                        shutil.copyfileobj(origem, arquivo, 1024 * 1024)
+                    estados[match.group(1)] = {
+                        'arquivo': nome,
+                        'tamanho': info.file_size,
+                        'sha256': sha256_arquivo(caminho)
+                    }
+
+            manifesto = {
+                'versao': versao,
+                'origem': os.path.basename(zip_path),
+                'gerado_em': datetime.datetime.now().isoformat(),
+                'estados': estados
+            }
+            with open(os.path.join(temp_dir, MANIFESTO), 'w', encoding='utf-8') as f:
+                json.dump(manifesto, f, indent=2)
+
+            with self._lock:
+                self._substituir(temp_dir, destino)
+                self._manifestos = {versao: manifesto}
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+        self._remover_versoes_antigas(destino)
+        print(f"🗂️ Cache da versão {versao} gerado com {len(estados)} estados em {destino}")
+        return manifesto
+
+    @staticmethod
+    def _substituir(temp_dir, destino):
+        """
+        Coloca o diretório gerado no lugar de `destino` com renomeações: o
+        diretório anterior é movido para o lado antes, e não apagado no lugar
+        """
+        anterior = f"{temp_dir}.anterior"
+        try:
+            os.rename(destino, anterior)
+        except FileNotFoundError:
+            pass
+        try:
+            os.rename(temp_dir, destino)
+        except OSError:
+            # Outro processo colocou a mesma versão no lugar entre as duas renomeações
+            if not os.path.exists(os.path.join(destino, MANIFESTO)):
+                raise
+        shutil.rmtree(anterior, ignore_errors=True)
+
+    def _remover_versoes_antigas(self, atual):
+        for nome in os.listdir(self.cache_dir):
+            caminho = os.path.join(self.cache_dir, nome)
+            # Diretórios temporários podem ser de uma geração em andamento em outro processo
+            if caminho != atual and not nome.startswith(PREFIXO_TEMP) and os.path.isdir(caminho):
+                shutil.rmtree(caminho, ignore_errors=True)
+
+    def manifesto(self, versao):
+        """
+        Returns:
+            dict: Manifesto da versão ou None se o cache ainda não foi gerado
+        """
+        with self._lock:
+            if versao in self._manifestos:
+                return self._manifestos[versao]
+
+        try:
+            with open(os.path.join(self.diretorio_versao(versao), MANIFESTO), 'r', encoding='utf-8') as f:
+                manifesto = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+        with self._lock:
+            self._manifestos[versao] = manifesto
+        return manifesto
+
+    def artefato(self, versao, uf, zip_path=None):
+        """
+        Obtém o arquivo de um estado, gerando o cache a partir do ZIP se ainda não existir
+
+        Args:
+            versao: Versão da tabela
+            uf: Sigla do estado
+            zip_path: ZIP completo usado quando o cache da versão ainda não existe (opcional)
+
+        Returns:
+            dict: 'caminho', 'arquivo', 'tamanho' e 'sha256' do artefato, ou None se o estado não estiver na tabela
+        """
+        manifesto = self.manifesto(versao)
+        if manifesto is None:
+            if not zip_path or not os.path.exists(zip_path):
+                return None
+            # Cache de uma versão baixada antes desta funcionalidade existir
+            with self._lock_geracao:
+                manifesto = self.manifesto(versao) or self.gerar(zip_path, versao)
+
+        entrada = manifesto['estados'].get(uf)
+        if entrada is None:
+            return None
+
+        caminho = os.path.join(self.diretorio_versao(versao), entrada['arquivo'])
+        if not os.path.exists(caminho):
+            return None
+        return dict(entrada, caminho=caminho)
@@ -4,25 +4,47 @@ Classe para automação do download da tabela IBPT
 import requests
 import time
 import re
-from bs4 import BeautifulSoup, Tag
 import os
+import shutil
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urljoin
+from urllib3.exceptions import ProtocolError, ReadTimeoutError
 import datetime
+from app.core.agendador_polling import AgendadorPolling
+from app.core.sessao import criar_sessao, salvar_cookies, limpar_cookies
+from app.core.parser_html import obter_parser
+
+
+# Siglas das unidades federativas aceitas pelo portal
+UFS_BRASIL = {
+    'AC', 'AL', 'AM', 'AP', 'BA', 'CE', 'DF', 'ES', 'GO', 'MA', 'MG', 'MS', 'MT', 'PA',
+    'PB', 'PE', 'PI', 'PR', 'RJ', 'RN', 'RO', 'RR', 'RS', 'SC', 'SE', 'SP', 'TO'
+}
+
+# Classes CSS das mensagens exibidas pelo portal
+ERROR_CLASSES = ['text-danger', 'alert-danger', 'validation-summary-errors']
+SUCCESS_CLASSES = ['alert-success', 'text-success']
 
 
 class IBPTAutomation:
-    def __init__(self, cnpj=None, base_url=None):
-        self.session = requests.Session()
+    # Limites do bloco de leitura adaptativo do download (bytes)
+    MIN_CHUNK = 16 * 1024
+    MAX_CHUNK = 1024 * 1024
+    
+    def __init__(self, cnpj=None, base_url=None, historico_file="data/historico_geracao.json",
+                 session=None, cookies_file=None, parser="auto"):
+        # Sessão compartilhada (ex: com o verificador de versões) ou nova, com os cookies em cache
+        self.session = session or criar_sessao(cookies_file)
+        self.cookies_file = cookies_file
+        self.parser = obter_parser(parser)
         if not base_url:
             raise ValueError("URL base do IBPT não configurada. Configure a variável de ambiente URL_IBPT.")
         self.base_url = base_url
         if not cnpj:
             raise ValueError("CNPJ não configurado. Configure a variável de ambiente CNPJ_EMPRESA.")
         self.cnpj = cnpj
-        self.session.headers.update({
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36"
-        })
-        self.request_time = None  # Armazena o momento da solicitação
+        self.historico_file = historico_file  # Durações das gerações anteriores
     
     def login(self, username, password):
         """
@@ -46,19 +68,18 @@ class IBPTAutomation:
                     print(f"   🔄 {hist.status_code} -> {hist.url}")
             
             # Verificar se a página tem título esperado
-            soup = BeautifulSoup(response.content, 'html.parser')
-            title = soup.find('title')
+            doc = self.parser.carregar(response.content)
+            title = self.parser.titulo(doc)
             if title:
-                print(f"📑 Título da página: {title.text.strip()}")
+                print(f"📑 Título da página: {title}")
             
-            csrf_token = soup.find('input', {'name': '__RequestVerificationToken'})
-            if not csrf_token or not isinstance(csrf_token, Tag):
+            token_value = self.parser.csrf_token(doc)
+            if token_value is None:
                 print("❌ Token CSRF não encontrado na página!")
                 with open("login_page_debug.html", "w", encoding="utf-8") as f:
                     f.write(response.text)
                 raise Exception("Token CSRF não encontrado na página de login. HTML salvo em login_page_debug.html")
             
-            token_value = csrf_token.attrs.get('value')
             if not token_value:
                 raise Exception("Valor do token CSRF não encontrado")
             
@@ -148,11 +169,13 @@ class IBPTAutomation:
             print(f"❌ Erro no processo de login: {str(e)}")
             raise
     
-    def get_empresa_home(self):
+    def get_empresa_home(self, salvar_debug=True):
         home_url = f"{self.base_url}/Empresa/Home"
         response = self.session.get(home_url)
         
         if "Minha Empresa" not in response.text and "Gerenciar empresa" not in response.text:
+            if not salvar_debug:
+                raise Exception(f"❌ Não está autenticado! | Status: {response.status_code}")
             with open("empresa_home_debug.html", "w", encoding="utf-8") as f:
                 f.write(response.text)
             raise Exception(f"❌ Não está autenticado! Conteúdo salvo em empresa_home_debug.html | Status: {response.status_code}")
@@ -160,9 +183,40 @@ class IBPTAutomation:
         print("✅ Página da empresa acessada com sucesso")
         return response.text
     
+    def garantir_login(self, username, password):
+        """
+        Reutiliza a sessão em cache quando ainda é válida e faz login apenas se necessário
+        
+        Returns:
+            bool: True se a sessão está autenticada
+        """
+        if self.cookies_file and len(self.session.cookies) > 0:
+            try:
+                self.get_empresa_home(salvar_debug=False)
+                print("♻️ Sessão em cache válida, login dispensado")
+                return True
+            except Exception:
+                print("⌛ Sessão em cache expirada, refazendo login...")
+                limpar_cookies(self.session, self.cookies_file)
+        
+        if not self.login(username, password):
+            return False
+        
+        self.get_empresa_home()
+        
+        if self.cookies_file:
+            salvar_cookies(self.session, self.cookies_file)
+        return True
+    
     def request_table_download(self, estados=["CE"]):
         """
         Solicita o download da tabela para os estados especificados
+        
+        A solicitação é devolvida em vez de guardada no objeto, para que lotes
+        solicitados em paralelo não sobrescrevam os dados uns dos outros.
+        
+        Returns:
+            dict: 'estados' e 'solicitado_em' da solicitação, ou False em caso de erro
         """
         request_url = f"{self.base_url}/TabelaAliquota/Solicitar?cnpj={self.cnpj}"
         
@@ -188,13 +242,12 @@ class IBPTAutomation:
                         f.write(response.text)
                     raise Exception("❌ Sessão expirada. Tente fazer login novamente.")
             
-            soup = BeautifulSoup(response.content, 'html.parser')
+            doc = self.parser.carregar(response.content)
             
             # Verificar se a página contém mensagens de erro
-            error_elements = soup.select('.text-danger, .alert-danger, .validation-summary-errors')
+            error_elements = self.parser.mensagens(doc, ERROR_CLASSES)
             if error_elements:
-                for error in error_elements:
-                    error_text = error.text.strip()
+                for error_text in error_elements:
                     if error_text:
                         print(f"❌ Erro encontrado na página: {error_text}")
                 
@@ -203,8 +256,7 @@ class IBPTAutomation:
                 print("❌ Página com erro salva em solicitar_error.html")
             
             # Buscar formulário e campos específicos
-            form = soup.find('form')
-            if not form:
+            if not self.parser.tem_formulario(doc):
                 print("❌ Formulário não encontrado na página")
                 with open("solicitar_noform.html", "w", encoding="utf-8") as f:
                     f.write(response.text)
@@ -217,20 +269,19 @@ class IBPTAutomation:
                 print(f"⚠️ CNPJ não encontrado na página. Pode indicar problemas com a empresa cadastrada.")
             
             # Verificar checkbox de estados
-            estados_options = soup.select('input[name="Estados"]')
+            estados_options = self.parser.contar_inputs(doc, "Estados")
             if estados_options:
-                print(f"✅ Encontradas {len(estados_options)} opções de estados")
+                print(f"✅ Encontradas {estados_options} opções de estados")
             else:
                 print("⚠️ Nenhuma opção de estado encontrada na página")
             
-            csrf_token = soup.find('input', {'name': '__RequestVerificationToken'})
-            if not csrf_token or not isinstance(csrf_token, Tag):
+            token_value = self.parser.csrf_token(doc)
+            if token_value is None:
                 print("❌ Token CSRF não encontrado!")
                 with open("solicitar_page_debug.html", "w", encoding="utf-8") as f:
                     f.write(response.text)
                 raise Exception("Token CSRF não encontrado na página de solicitação")
             
-            token_value = csrf_token.attrs.get('value')
             if not token_value:
                 raise Exception("Valor do token CSRF não encontrado")
             
@@ -260,17 +311,16 @@ class IBPTAutomation:
             
             if response.status_code == 200:
                 # Verificar se há mensagens de sucesso ou erro na resposta
-                soup = BeautifulSoup(response.content, 'html.parser')
+                doc = self.parser.carregar(response.content)
                 
-                success_msg = soup.select('.alert-success, .text-success')
+                success_msg = self.parser.mensagens(doc, SUCCESS_CLASSES)
                 if success_msg:
                     for msg in success_msg:
-                        print(f"✅ Mensagem de sucesso: {msg.text.strip()}")
+                        print(f"✅ Mensagem de sucesso: {msg}")
                 
-                error_msg = soup.select('.alert-danger, .text-danger, .validation-summary-errors')
+                error_msg = self.parser.mensagens(doc, ERROR_CLASSES)
                 if error_msg:
-                    for msg in error_msg:
-                        error_text = msg.text.strip()
+                    for error_text in error_msg:
                         if error_text:
                             print(f"❌ Mensagem de erro: {error_text}")
                     
@@ -283,8 +333,7 @@ class IBPTAutomation:
                 now = datetime.datetime.now()
                 print(f"⏱️  Hora atual do sistema: {now.strftime('%d/%m/%Y %H:%M:%S')}")
                 print(f"⏱️  Timestamp UTC: {datetime.datetime.utcnow().strftime('%d/%m/%Y %H:%M:%S')} UTC")
-                self.request_time = now  # ⏰ Salva o momento da solicitação
-                return True
+                return {'estados': list(estados), 'solicitado_em': now}
             else:
                 print(f"❌ Erro na solicitação: {response.status_code}")
                 with open("request_http_error.html", "w", encoding="utf-8") as f:
@@ -298,116 +347,151 @@ class IBPTAutomation:
             print(f"❌ Erro no processo de solicitação: {str(e)}")
             raise
     
-    def check_download_status(self, max_attempts=60, delay=15):
+    def _obter_historico(self):
+        """
+        Obtém e interpreta a página de histórico de tabelas geradas
+        
+        Returns:
+            list: Registros do histórico (mais recentes primeiro) ou None se a tabela não for encontrada
+        """
+        history_url = f"{self.base_url}/TabelaAliquota/Historico?cnpj={self.cnpj}"
+        response = self.session.get(history_url)
+        
+        # Linhas da tabela de histórico, exceto o cabeçalho
+        linhas = self.parser.linhas_historico(self.parser.carregar(response.content))
+        if linhas is None:
+            return None
+        
+        registros = []
+        for linha in linhas:
+            href = linha['href']
+            
+            # Extrai timestamp do URL (17 dígitos, os 14 primeiros formam a data/hora)
+            timestamp = None
+            criado_em = None
+            if href:
+                match = re.search(r'/(\d{17})/', href)
+                if match:
+                    timestamp = match.group(1)
+                    criado_em = datetime.datetime.strptime(timestamp[:14], "%Y%m%d%H%M%S")
+            
+            # Estados listados na linha (quando o portal os exibe)
+            siglas = re.findall(r'\b([A-Z]{2})\b', linha['texto'])
+            
+            registros.append({
+                'url': urljoin(self.base_url, href) if href else None,
+                'timestamp': timestamp,
+                'criado_em': criado_em,
+                'pendente': linha['pendente'],
+                'estados': {sigla for sigla in siglas if sigla in UFS_BRASIL}
+            })
+        
+        return registros
+    
+    def check_download_status(self, max_attempts=60, delay=15, solicitacao=None):
         """
         Verifica o status do processamento e encontra o arquivo mais recente disponível
         ou aguarda até que um novo arquivo seja gerado após a solicitação atual
+        
+        Args:
+            max_attempts: Número máximo de consultas ao histórico
+            delay: Intervalo base entre consultas (segundos)
+            solicitacao: Retorno de request_table_download
         """
-        history_url = f"{self.base_url}/TabelaAliquota/Historico?cnpj={self.cnpj}"
         print("🔄 Verificando status do processamento...")
+        request_time = solicitacao['solicitado_em'] if solicitacao else None
         
         # Flag para indicar se encontramos um arquivo disponível (mesmo que seja antigo)
         arquivo_disponivel = False
         mais_recente_url = None
         mais_recente_time = None
+        
+        # Agendamento das verificações a partir do histórico de gerações
+        agendador = AgendadorPolling(self.historico_file, delay=delay, max_attempts=max_attempts)
+        num_estados = len(solicitacao['estados']) if solicitacao else 0
+        previsao = agendador.prever_duracao(num_estados) if num_estados else None
+        decorrido = (datetime.datetime.now() - request_time).total_seconds() if request_time else 0
+        if previsao:
+            print(f"🔮 Duração prevista para {num_estados} estados: {previsao/60:.1f} minutos")
 
-        for attempt in range(1, max_attempts + 1):
-            response = self.session.get(history_url)
-            soup = BeautifulSoup(response.text, 'html.parser')
+        for attempt, espera in enumerate(agendador.esperas(previsao, decorrido), start=1):
+            if espera > 0:
+                print(f"⏳ Aguardando {espera:.0f}s para próxima verificação...")
+                time.sleep(espera)
             
-            # Busca todas as <tr> dentro da tabela, exceto o cabeçalho
-            table = soup.find('table', class_='table')
-            if not table or not isinstance(table, Tag):
+            registros = self._obter_historico()
+            if registros is None:
                 print("❌ Tabela não encontrada")
-                time.sleep(delay)
                 continue
                 
-            rows = table.find_all('tr')
-            if len(rows) <= 1:
+            if not registros:
                 print("❌ Nenhum histórico encontrado")
-                time.sleep(delay)
                 continue
                 
-            # Pular o cabeçalho (thead)
-            rows = rows[1:]
-                
-            print(f"📊 Encontrados {len(rows)} registros no histórico")
+            print(f"📊 Encontrados {len(registros)} registros no histórico")
             
             # Verifica todos os registros buscando o mais recente após a solicitação
-            achou_arquivo_apos_solicitacao = False
-            
-            for row in rows:
-                download_btn = row.select_one("a.btn-success")
-                if download_btn:
+            for registro in registros:
+                file_time = registro['criado_em']
+                if file_time:
                     # Arquivo está pronto para download
-                    href = download_btn.get('href')
+                    print(f"🔍 Análise do timestamp do arquivo:")
+                    print(f"   📅 Timestamp original: {registro['timestamp']}")
+                    print(f"   📅 Convertido para: {file_time.strftime('%d/%m/%Y %H:%M:%S')}")
                     
-                    # Extrai timestamp do URL para validar
-                    match = re.search(r'/(\d{17})/', href)
+                    # Verifica se é o arquivo mais recente encontrado até agora
+                    if mais_recente_time is None or file_time > mais_recente_time:
+                        mais_recente_time = file_time
+                        mais_recente_url = registro['url']
+                        arquivo_disponivel = True
                     
-                    if match:
-                        file_timestamp = match.group(1)
-                        # Pega apenas os primeiros 14 dígitos para criar datetime
-                        file_time = datetime.datetime.strptime(file_timestamp[:14], "%Y%m%d%H%M%S")
-                        print(f"🔍 Análise do timestamp do arquivo:")
-                        print(f"   📅 Timestamp original: {file_timestamp}")
-                        print(f"   📅 Convertido para: {file_time.strftime('%d/%m/%Y %H:%M:%S')}")
+                    # Verifica se foi criado em uma janela razoável em torno da solicitação
+                    # (até 3 horas antes ou 1 hora depois)
+                    if request_time:
+                        time_diff = (file_time - request_time).total_seconds()
+                        is_near_request = time_diff >= -10800 and time_diff <= 3600  # -3h a +1h
                         
-                        # Verifica se é o arquivo mais recente encontrado até agora
-                        if mais_recente_time is None or file_time > mais_recente_time:
-                            mais_recente_time = file_time
-                            mais_recente_url = urljoin(self.base_url, href)
-                            arquivo_disponivel = True
-                        
-                        # Verifica se foi criado em uma janela razoável em torno da solicitação
-                        # (até 3 horas antes ou 1 hora depois)
-                        if self.request_time:
-                            time_diff = (file_time - self.request_time).total_seconds()
-                            is_near_request = time_diff >= -10800 and time_diff <= 3600  # -3h a +1h
+                        if is_near_request:
+                            print(f"✅ Arquivo encontrado próximo à solicitação!")
+                            print(f"   📅 Arquivo criado: {file_time.strftime('%d/%m/%Y %H:%M:%S')}")
+                            print(f"   📅 Solicitação feita: {request_time.strftime('%d/%m/%Y %H:%M:%S')}")
+                            print(f"   ⏱️  Diferença: {time_diff/60:.1f} minutos")
                             
-                            if is_near_request:
-                                download_url = urljoin(self.base_url, href)
-                                print(f"✅ Arquivo encontrado próximo à solicitação!")
-                                print(f"   📅 Arquivo criado: {file_time.strftime('%d/%m/%Y %H:%M:%S')}")
-                                print(f"   📅 Solicitação feita: {self.request_time.strftime('%d/%m/%Y %H:%M:%S')}")
-                                print(f"   ⏱️  Diferença: {time_diff/60:.1f} minutos")
-                                return download_url
+                            # Só um arquivo criado depois da solicitação mede a duração da geração
+                            # (o histórico registra o horário sem frações de segundo)
+                            if num_estados and file_time >= request_time.replace(microsecond=0):
+                                duracao = (datetime.datetime.now() - request_time).total_seconds()
+                                agendador.registrar(num_estados, duracao)
+                                previsto = f"{previsao/60:.1f} minutos" if previsao else "sem histórico"
+                                print(f"📈 Geração concluída em {duracao/60:.1f} minutos (previsto: {previsto})")
+                            return registro['url']
             
             # Se chegou aqui, não encontrou arquivo após a solicitação
             # Verificar se temos um arquivo pendente em processamento
-            pendente = False
-            for row in rows:
-                pendente_span = row.select_one("span.pendente")
-                if pendente_span:
-                    pendente = True
-                    print(f"⏳ Arquivo ainda em processamento... Tentativa {attempt}/{max_attempts}")
-                    break
-            
-            if not pendente:
+            pendente = any(registro['pendente'] for registro in registros)
+            if pendente:
+                print(f"⏳ Arquivo ainda em processamento... Tentativa {attempt}/{max_attempts}")
+            else:
                 # Se não tem pendente e já tentamos algumas vezes, vamos usar o mais recente disponível
                 if arquivo_disponivel and attempt >= 3:
                     print(f"⚠️ Nenhum arquivo encontrado após a solicitação, mas há arquivos disponíveis.")
                     print(f"   📅 Arquivo mais recente: {mais_recente_time.strftime('%d/%m/%Y %H:%M:%S')}")
-                    if self.request_time:
-                        print(f"   📅 Solicitação feita: {self.request_time.strftime('%d/%m/%Y %H:%M:%S')}")
+                    if request_time:
+                        print(f"   📅 Solicitação feita: {request_time.strftime('%d/%m/%Y %H:%M:%S')}")
                     print(f"   ⚠️ Usando o arquivo mais recente disponível após 3 tentativas.")
                     return mais_recente_url
                 else:
                     print(f"🔍 Verificando status... Tentativa {attempt}/{max_attempts}")
-            
-            if attempt < max_attempts:
-                print(f"⏳ Aguardando {delay}s para próxima verificação...")
-                time.sleep(delay)
 
         # Se o loop terminar, verificamos o que fazer
-        if arquivo_disponivel and self.request_time and mais_recente_time:
+        if arquivo_disponivel and request_time and mais_recente_time:
             print(f"⚠️ Timeout: Verificando se o arquivo mais recente encontrado é válido.")
             print(f"   📅 Arquivo mais recente: {mais_recente_time.strftime('%d/%m/%Y %H:%M:%S')}")
-            print(f"   📅 Solicitação feita:   {self.request_time.strftime('%d/%m/%Y %H:%M:%S')}")
+            print(f"   📅 Solicitação feita:   {request_time.strftime('%d/%m/%Y %H:%M:%S')}")
 
             # Compara o tempo do arquivo mais recente com o tempo da solicitação.
             # Damos uma margem de segurança (ex: 5 minutos) para evitar problemas com sincronia de relógio.
-            if mais_recente_time < (self.request_time - datetime.timedelta(minutes=5)):
+            if mais_recente_time < (request_time - datetime.timedelta(minutes=5)):
                 print(f"❌ O arquivo mais recente é antigo. Nenhum arquivo novo foi gerado.")
                 raise Exception("❌ Timeout: Nenhum arquivo NOVO foi gerado no tempo esperado.")
             else:
@@ -417,31 +501,285 @@ class IBPTAutomation:
             
         raise Exception("❌ Timeout: Arquivo não foi processado no tempo esperado e nenhum arquivo válido foi encontrado.")
 
-    def download_file(self, download_url, output_path="tabela_ibpt.zip"):
+    def _ajustar_chunk(self, chunk_size, duracao):
+        """
+        Ajusta o tamanho do bloco de leitura conforme a vazão observada
+        """
+        if duracao < 0.1 and chunk_size < self.MAX_CHUNK:
+            return chunk_size * 2
+        if duracao > 1.0 and chunk_size > self.MIN_CHUNK:
+            return chunk_size // 2
+        return chunk_size
+    
+    def _validar_zip(self, caminho):
+        """
+        Verifica o diretório central e o CRC de todos os arquivos do ZIP baixado
+        """
+        try:
+            with zipfile.ZipFile(caminho, 'r') as zip_file:
+                corrompido = zip_file.testzip()
+        except zipfile.BadZipFile as e:
+            raise Exception(f"❌ Arquivo baixado não é um ZIP válido: {str(e)}")
+        
+        if corrompido:
+            raise Exception(f"❌ CRC inválido no arquivo {corrompido} dentro do ZIP baixado")
+        print("✅ Integridade do ZIP verificada")
+    
+    def download_file(self, download_url, output_path="tabela_ibpt.zip", max_retries=5):
+        """
+        Baixa o arquivo em um arquivo temporário, retomando com Range após quedas de conexão,
+        e só substitui o destino depois de validar o ZIP
+        """
         print(f"📥 Iniciando download...")
         print(f"🔗 URL: {download_url}")
         print(f"📁 Destino: {output_path}")
         
-        response = self.session.get(download_url, stream=True)
-        response.raise_for_status()
-        
-        total_size = int(response.headers.get('content-length', 0))
+        temp_path = f"{output_path}.part"
+        total_size = 0
         downloaded_size = 0
+        chunk_size = 64 * 1024
+        falhas = 0
         
-        with open(output_path, 'wb') as file:
-            for chunk in response.iter_content(chunk_size=8192):
-                if chunk:
-                    file.write(chunk)
-                    downloaded_size += len(chunk)
+        try:
+            with open(temp_path, 'wb') as file:
+                while True:
+                    # ZIP já é compactado: pedir os bytes como estão para que os offsets do Range sejam válidos
+                    headers = {'Accept-Encoding': 'identity'}
+                    if downloaded_size:
+                        headers['Range'] = f"bytes={downloaded_size}-"
+                    
+                    try:
+                        with self.session.get(download_url, stream=True, headers=headers, timeout=(15, 60)) as response:
+                            response.raise_for_status()
+                            
+                            if downloaded_size and response.status_code != 206:
+                                print("\n⚠️ Servidor não aceitou a retomada, reiniciando o download")
+                                file.seek(0)
+                                file.truncate()
+                                downloaded_size = 0
+                            
+                            content_range = response.headers.get('content-range', '')
+                            if '/' in content_range and content_range.rsplit('/', 1)[1].isdigit():
+                                total_size = int(content_range.rsplit('/', 1)[1])
+                            elif not downloaded_size:
+                                total_size = int(response.headers.get('content-length', 0))
+                            
+                            while True:
+                                inicio = time.monotonic()
+                                chunk = response.raw.read(chunk_size, decode_content=False)
+                                if not chunk:
+                                    break
+                                file.write(chunk)
+                                downloaded_size += len(chunk)
+                                chunk_size = self._ajustar_chunk(chunk_size, time.monotonic() - inicio)
+                                
+                                if total_size > 0:
+                                    progress = (downloaded_size / total_size) * 100
+                                    print(f"\r📊 Progresso: {progress:.1f}% ({downloaded_size}/{total_size} bytes)", end="", flush=True)
+                        
+                        if total_size and downloaded_size < total_size:
+                            raise requests.exceptions.ChunkedEncodingError(
+                                f"conexão encerrada com {downloaded_size}/{total_size} bytes")
+                        break
                     
-                    if total_size > 0:
-                        progress = (downloaded_size / total_size) * 100
-                        print(f"\r📊 Progresso: {progress:.1f}% ({downloaded_size}/{total_size} bytes)", end="", flush=True)
+                    except (requests.exceptions.ConnectionError, requests.exceptions.ChunkedEncodingError,
+                            requests.exceptions.Timeout, ProtocolError, ReadTimeoutError) as e:
+                        falhas += 1
+                        if falhas > max_retries:
+                            raise Exception(f"❌ Download interrompido {falhas} vezes: {str(e)}")
+                        espera = min(2 ** falhas, 30)
+                        print(f"\n⚠️ Conexão interrompida em {downloaded_size} bytes ({str(e)}). Retomando em {espera}s...")
+                        time.sleep(espera)
+            
+            print()
+            self._validar_zip(temp_path)
+            os.replace(temp_path, output_path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        
+        print(f"✅ Download concluído: {output_path} ({downloaded_size} bytes)")
+        return output_path
+
+    def buscar_arquivo_existente(self, estados, detectada_em, aceitar_sem_estados=True):
+        """
+        Procura no histórico um arquivo já gerado para a versão atual e os mesmos estados
+        
+        Args:
+            estados: Lista de estados desejados
+            detectada_em: Momento em que a versão atual foi detectada (datetime); arquivos
+                anteriores podem ser da versão anterior, mesmo com a vigência igual
+            aceitar_sem_estados: Aceita linhas que não listam os estados (falso no modo em
+                lotes, em que elas podem ser o ZIP de um único lote)
+            
+        Returns:
+            str: URL do arquivo encontrado ou None
+        """
+        print(f"🔎 Procurando no histórico um arquivo gerado desde {detectada_em.strftime('%d/%m/%Y %H:%M:%S')}...")
+        registros = self._obter_historico() or []
+        
+        candidatos = [
+            r for r in registros
+            if r['url'] and r['criado_em'] and r['criado_em'] >= detectada_em
+            and (r['estados'] == set(estados) or (aceitar_sem_estados and not r['estados']))
+        ]
+        if not candidatos:
+            print("🔎 Nenhum arquivo reutilizável encontrado, será solicitada uma nova geração")
+            return None
+        
+        registro = max(candidatos, key=lambda r: r['criado_em'])
+        print(f"♻️ Reutilizando arquivo já gerado em {registro['criado_em'].strftime('%d/%m/%Y %H:%M:%S')}")
+        return registro['url']
+    
+    def _solicitar_lote(self, estados):
+        """
+        Solicita a geração da tabela para um lote de estados
+        
+        Returns:
+            dict: Informações do lote solicitado
+        """
+        solicitacao = self.request_table_download(estados)
+        if not solicitacao:
+            raise Exception(f"❌ Falha ao solicitar o lote: {', '.join(estados)}")
+        return dict(solicitacao, url=None)
+    
+    def check_lotes_status(self, lotes, conhecidos, max_attempts=60, delay=15):
+        """
+        Aguarda a geração de todos os lotes, consultando o histórico uma única vez por ciclo
+        
+        Args:
+            lotes: Lista de lotes retornados por _solicitar_lote
+            conhecidos: URLs que já estavam no histórico antes das solicitações
+            max_attempts: Número máximo de consultas ao histórico
+            delay: Intervalo entre consultas (segundos)
+            
+        Cada lote é associado à linha do histórico que lista exatamente os seus
+        estados. Se o histórico não listar os estados, as linhas novas sem estados
+        são associadas aos lotes na ordem de solicitação, mas só quando há uma
+        para cada lote pendente (todos prontos), já que os ZIPs são mesclados.
+        
+        Returns:
+            list: Os mesmos lotes, com a URL de download preenchida
+        """
+        print(f"🔄 Verificando status de {len(lotes)} lotes...")
+        usados = set(conhecidos)
+        sem_estados_vistos = False
+        
+        agendador = AgendadorPolling(self.historico_file, delay=delay, max_attempts=max_attempts)
+        maior_lote = max(len(lote['estados']) for lote in lotes)
+        previsao = agendador.prever_duracao(maior_lote)
+        if previsao:
+            print(f"🔮 Duração prevista para lotes de {maior_lote} estados: {previsao/60:.1f} minutos")
+        
+        inicio = min(lote['solicitado_em'] for lote in lotes)
+        decorrido = (datetime.datetime.now() - inicio).total_seconds()
         
-        print(f"\n✅ Download concluído: {output_path} ({downloaded_size} bytes)")
+        def concluir(lote, registro):
+            novos.remove(registro)
+            usados.add(registro['url'])
+            lote['url'] = registro['url']
+            duracao = (datetime.datetime.now() - lote['solicitado_em']).total_seconds()
+            agendador.registrar(len(lote['estados']), duracao)
+            previsto = f"{previsao/60:.1f} minutos" if previsao else "sem histórico"
+            print(f"✅ Lote pronto ({', '.join(lote['estados'])}) em {duracao/60:.1f} minutos (previsto: {previsto})")
+        
+        for attempt, espera in enumerate(agendador.esperas(previsao, decorrido), start=1):
+            if espera > 0:
+                time.sleep(espera)
+            
+            registros = self._obter_historico() or []
+            novos = [r for r in registros if r['url'] and r['url'] not in usados]
+            
+            for lote in [l for l in lotes if not l['url']]:
+                registro = next((r for r in novos if r['estados'] == set(lote['estados'])), None)
+                if registro is not None:
+                    concluir(lote, registro)
+            
+            pendentes = [l for l in lotes if not l['url']]
+            # Linhas novas, sem estados e criadas depois das solicitações (o histórico não tem frações de segundo)
+            sem_estados = sorted(
+                (r for r in novos if not r['estados'] and r['criado_em'] and r['criado_em'] >= inicio.replace(microsecond=0)),
+                key=lambda r: r['criado_em']
+            )
+            if pendentes and sem_estados:
+                sem_estados_vistos = True
+                if len(sem_estados) == len(pendentes):
+                    print("⚠️ O histórico não lista os estados; associando os arquivos novos aos lotes pela ordem de solicitação")
+                    for lote, registro in zip(sorted(pendentes, key=lambda l: l['solicitado_em']), sem_estados):
+                        concluir(lote, registro)
+                    pendentes = []
+                elif len(sem_estados) > len(pendentes):
+                    print(f"⚠️ {len(sem_estados)} arquivos novos sem estados para {len(pendentes)} lotes; não é possível associá-los")
+            
+            if not pendentes:
+                return lotes
+            
+            print(f"⏳ {len(pendentes)}/{len(lotes)} lotes em processamento... Tentativa {attempt}/{max_attempts}")
+        
+        if sem_estados_vistos:
+            raise Exception(
+                f"❌ Timeout: {len(pendentes)} lotes não foram associados a arquivos do histórico, que não lista "
+                f"os estados de cada arquivo. Desative a geração em lotes (SHARD_SIZE=0)."
+            )
+        raise Exception(f"❌ Timeout: {len(pendentes)} lotes não foram processados no tempo esperado.")
+    
+    def _mesclar_arquivos(self, arquivos, output_path):
+        """
+        Junta os ZIPs dos lotes em um único arquivo, sem carregar os membros em memória
+        """
+        temp_path = f"{output_path}.tmp"
+        nomes = set()
+        
+        with zipfile.ZipFile(temp_path, 'w', zipfile.ZIP_DEFLATED) as destino:
+            for arquivo in arquivos:
+                with zipfile.ZipFile(arquivo, 'r') as origem:
+                    for info in origem.infolist():
+                        if info.filename in nomes:
+                            continue
+                        nomes.add(info.filename)
+                        with origem.open(info) as src, destino.open(info, 'w') as dst:
+                            shutil.copyfileobj(src, dst, 1024 * 1024)
+        
+        os.replace(temp_path, output_path)
+        print(f"🗜️ {len(arquivos)} lotes mesclados em {output_path} ({len(nomes)} arquivos)")
         return output_path
+    
+    def download_em_lotes(self, estados, output_path, tamanho_lote, max_workers=4, max_attempts=60, delay=15):
+        """
+        Gera a tabela dividindo os estados em lotes solicitados e baixados em paralelo
+        
+        Args:
+            estados: Lista de estados
+            output_path: Arquivo ZIP final
+            tamanho_lote: Quantidade de estados por lote
+            max_workers: Número máximo de solicitações/downloads simultâneos
+            max_attempts: Número máximo de consultas ao histórico
+            delay: Intervalo entre consultas (segundos)
+        """
+        grupos = [estados[i:i + tamanho_lote] for i in range(0, len(estados), tamanho_lote)]
+        print(f"🧩 Modo em lotes: {len(grupos)} lotes de até {tamanho_lote} estados ({max_workers} simultâneos)")
+        
+        # Registros já existentes no histórico não pertencem a esta execução
+        conhecidos = {r['url'] for r in (self._obter_historico() or []) if r['url']}
+        
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            lotes = list(executor.map(self._solicitar_lote, grupos))
+        
+        self.check_lotes_status(lotes, conhecidos, max_attempts, delay)
+        
+        arquivos = [f"{output_path}.lote{i}" for i in range(len(lotes))]
+        try:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                list(executor.map(self.download_file, [lote['url'] for lote in lotes], arquivos))
+            
+            return self._mesclar_arquivos(arquivos, output_path)
+        finally:
+            for arquivo in arquivos:
+                if os.path.exists(arquivo):
+                    os.remove(arquivo)
 
-    def run_automation(self, username, password, estados=["CE"], output_path="tabela_ibpt.zip"):
+    def run_automation(self, username, password, estados=["CE"], output_path="tabela_ibpt.zip",
+                       tamanho_lote=0, max_workers=4, max_attempts=60, delay=15, detectada_em=None):
         try:
             print("🚀 Iniciando processo de download...")
             print(f"📅 Data/Hora: {datetime.datetime.now().strftime('%d/%m/%Y %H:%M:%S')}")
@@ -450,19 +788,33 @@ class IBPTAutomation:
             print(f"📁 Arquivo: {output_path}")
             print("-" * 50)
             
-            # 1. Fazer login
-            if not self.login(username, password):
+            # 1-2. Fazer login (ou reutilizar a sessão em cache) e acessar página da empresa
+            if not self.garantir_login(username, password):
                 return False
             
-            # 2. Acessar página da empresa
-            self.get_empresa_home()
+            em_lotes = tamanho_lote and len(estados) > tamanho_lote
+            
+            # Reaproveitar um arquivo da versão atual que já esteja no histórico
+            if detectada_em:
+                download_url = self.buscar_arquivo_existente(estados, detectada_em, aceitar_sem_estados=not em_lotes)
+                if download_url:
+                    self.download_file(download_url, output_path)
+                    print("\n✅ DOWNLOAD REALIZADO COM SUCESSO!")
+                    return True
+            
+            # 3-5. Modo em lotes: solicitações, acompanhamento e downloads em paralelo
+            if em_lotes:
+                self.download_em_lotes(estados, output_path, tamanho_lote, max_workers, max_attempts, delay)
+                print("\n✅ DOWNLOAD REALIZADO COM SUCESSO!")
+                return True
             
             # 3. Solicitar download da tabela
-            if not self.request_table_download(estados):
+            solicitacao = self.request_table_download(estados)
+            if not solicitacao:
                 return False
             
             # 4. Aguardar processamento e obter link
-            download_url = self.check_download_status()
+            download_url = self.check_download_status(max_attempts, delay, solicitacao)
             
             # 5. Baixar arquivo
             self.download_file(download_url, output_path)
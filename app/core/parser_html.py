@@ -0,0 +1,147 @@
+"""
+Camada de parsing das páginas do portal IBPT
+
+Expõe apenas as extrações usadas pela automação (token CSRF, mensagens,
+linhas do histórico, texto do comunicado) atrás de uma interface única, com
+um backend rápido baseado em lxml e o BeautifulSoup como alternativa.
+
+Uso: o documento é interpretado uma única vez com `carregar` e as extrações
+recebem o documento já carregado.
+"""
+
+
+def _classe_xpath(classe):
+    """Expressão XPath equivalente ao seletor CSS .classe"""
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {classe} ')"
+
+
+class ParserBeautifulSoup:
+    """
+    Backend baseado no BeautifulSoup (html.parser), sempre disponível
+    """
+    nome = "bs4"
+
+    def __init__(self):
+        from bs4 import BeautifulSoup
+        self._BeautifulSoup = BeautifulSoup
+
+    def carregar(self, html):
+        return self._BeautifulSoup(html, 'html.parser')
+
+    def titulo(self, doc):
+        title = doc.find('title')
+        return title.text.strip() if title else None
+
+    def csrf_token(self, doc):
+        token = doc.find('input', {'name': '__RequestVerificationToken'})
+        return token.attrs.get('value') if token else None
+
+    def tem_formulario(self, doc):
+        return doc.find('form') is not None
+
+    def contar_inputs(self, doc, nome):
+        return len(doc.find_all('input', {'name': nome}))
+
+    def mensagens(self, doc, classes):
+        seletor = ", ".join(f".{classe}" for classe in classes)
+        return [elemento.text.strip() for elemento in doc.select(seletor)]
+
+    def texto_por_id(self, doc, element_id):
+        elemento = doc.find(id=element_id)
+        return elemento.get_text() if elemento else None
+
+    def linhas_historico(self, doc):
+        table = doc.find('table', class_='table')
+        if not table:
+            return None
+
+        linhas = []
+        for row in table.find_all('tr')[1:]:
+            download_btn = row.select_one("a.btn-success")
+            linhas.append({
+                'href': download_btn.get('href') if download_btn else None,
+                'pendente': row.select_one("span.pendente") is not None,
+                'texto': row.get_text(" ")
+            })
+        return linhas
+
+
+class ParserLxml:
+    """
+    Backend baseado no lxml, várias vezes mais rápido e econômico em memória
+    """
+    nome = "lxml"
+
+    def __init__(self):
+        import lxml.html
+        self._fromstring = lxml.html.fromstring
+        # O portal serve UTF-8; sem isso o libxml2 assume latin-1 quando falta o <meta charset>
+        self._parser = lxml.html.HTMLParser(encoding='utf-8')
+
+    def carregar(self, html):
+        if isinstance(html, str):
+            html = html.encode('utf-8')
+        return self._fromstring(html, parser=self._parser)
+
+    def titulo(self, doc):
+        titulos = doc.xpath('//title/text()')
+        return titulos[0].strip() if titulos else None
+
+    def csrf_token(self, doc):
+        valores = doc.xpath('//input[@name="__RequestVerificationToken"]/@value')
+        return valores[0] if valores else None
+
+    def tem_formulario(self, doc):
+        return bool(doc.xpath('//form'))
+
+    def contar_inputs(self, doc, nome):
+        return int(doc.xpath(f'count(//input[@name="{nome}"])'))
+
+    def mensagens(self, doc, classes):
+        condicao = " or ".join(_classe_xpath(classe) for classe in classes)
+        return [elemento.text_content().strip() for elemento in doc.xpath(f'//*[{condicao}]')]
+
+    def texto_por_id(self, doc, element_id):
+        elementos = doc.xpath(f'//*[@id="{element_id}"]')
+        return elementos[0].text_content() if elementos else None
+
+    def linhas_historico(self, doc):
+        tabelas = doc.xpath(f'//table[{_classe_xpath("table")}]')
+        if not tabelas:
+            return None
+
+        linhas = []
+        for row in tabelas[0].xpath('.//tr')[1:]:
+            hrefs = row.xpath(f'.//a[{_classe_xpath("btn-success")}]/@href')
+            linhas.append({
+                'href': hrefs[0] if hrefs else None,
+                'pendente': bool(row.xpath(f'.//span[{_classe_xpath("pendente")}]')),
+                'texto': " ".join(row.itertext())
+            })
+        return linhas
+
+
+BACKENDS = {
+    'lxml': ParserLxml,
+    'bs4': ParserBeautifulSoup,
+}
+
+
+def obter_parser(nome="auto"):
+    """
+    Obtém o backend de parsing
+
+    Args:
+        nome: 'lxml', 'bs4' ou 'auto'
+
+    Returns:
+        Instância do backend; em 'auto' usa o lxml quando instalado e o BeautifulSoup caso contrário
+    """
+    nome = (nome or "auto").lower()
+    if nome in BACKENDS:
+        return BACKENDS[nome]()
+
+    try:
+        return ParserLxml()
+    except ImportError:
+        return ParserBeautifulSoup()
@@ -0,0 +1,93 @@
+"""
+Sessão HTTP compartilhada com o portal IBPT e cache persistente de cookies
+"""
+import json
+import os
+import time
+import requests
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36"
+
+
+def criar_sessao(cookies_file=None):
+    """
+    Cria uma sessão HTTP para o portal IBPT
+
+    Args:
+        cookies_file: Arquivo com os cookies de uma sessão anterior (opcional)
+
+    Returns:
+        requests.Session: Sessão configurada, com os cookies em cache carregados
+    """
+    session = requests.Session()
+    session.headers.update({"User-Agent": USER_AGENT})
+    if cookies_file:
+        carregar_cookies(session, cookies_file)
+    return session
+
+
+def carregar_cookies(session, cookies_file):
+    """
+    Carrega na sessão os cookies salvos que ainda não expiraram
+
+    Returns:
+        bool: True se algum cookie foi carregado
+    """
+    try:
+        with open(cookies_file, 'r', encoding='utf-8') as f:
+            cookies = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return False
+
+    agora = time.time()
+    carregados = 0
+    for cookie in cookies:
+        if cookie.get('expires') and cookie['expires'] < agora:
+            continue
+        session.cookies.set(
+            cookie['name'],
+            cookie['value'],
+            domain=cookie.get('domain'),
+            path=cookie.get('path', '/'),
+            expires=cookie.get('expires'),
+            secure=cookie.get('secure', False)
+        )
+        carregados += 1
+
+    if carregados:
+        print(f"🍪 {carregados} cookies carregados do cache de sessão")
+    return carregados > 0
+
+
+def salvar_cookies(session, cookies_file):
+    """
+    Salva os cookies da sessão em disco, legível apenas pelo dono do arquivo
+    """
+    cookies = [{
+        'name': cookie.name,
+        'value': cookie.value,
+        'domain': cookie.domain,
+        'path': cookie.path,
+        'expires': cookie.expires,
+        'secure': cookie.secure
+    } for cookie in session.cookies]
+
+    try:
+        os.makedirs(os.path.dirname(cookies_file) or ".", exist_ok=True)
+        temp_file = f"{cookies_file}.tmp"
+        fd = os.open(temp_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(cookies, f)
+        os.replace(temp_file, cookies_file)
+        print(f"💾 Sessão salva em cache ({len(cookies)} cookies)")
+    except OSError as e:
+        print(f"⚠️ Não foi possível salvar o cache de sessão: {str(e)}")
+
+
+def limpar_cookies(session, cookies_file):
+    """
+    Descarta os cookies da sessão e o cache em disco
+    """
+    session.cookies.clear()
+    if cookies_file and os.path.exists(cookies_file):
+        os.remove(cookies_file)
@@ -1,123 +1,282 @@
 """
 Verificador de versões da tabela IBPT
 """
-import requests
 import re
 import json
 import os
+import codecs
+import html
 from datetime import datetime
 import logging
-from bs4 import BeautifulSoup, Tag
+from app.core.sessao import criar_sessao
+from app.core.parser_html import obter_parser
 
 # Configurar logging
 logger = logging.getLogger(__name__)
 
+def _conteudo_elemento(texto, id_elemento):
+    """
+    Conteúdo HTML do elemento com o id informado, até a tag que o fecha
+
+    Returns:
+        tuple: (posição da tag de abertura ou -1, conteúdo ou None se o elemento ainda não foi fechado)
+    """
+    abertura = re.search(
+        r'<([a-zA-Z][\w-]*)\b[^>]*\bid\s*=\s*["\']?' + re.escape(id_elemento) + r'["\'\s>/]', texto, re.IGNORECASE
+    )
+    if not abertura:
+        return -1, None
+    tag = abertura.group(1)
+    inicio = texto.find('>', abertura.end() - 1) + 1
+    if inicio == 0:
+        return abertura.start(), None
+    # Elementos de mesmo nome aninhados dentro dele também são fechados antes
+    profundidade = 1
+    for match in re.finditer(r'<(/?)' + tag + r'\b[^>]*>', texto[inicio:], re.IGNORECASE):
+        profundidade += -1 if match.group(1) else 1
+        if profundidade == 0:
+            return abertura.start(), texto[inicio:inicio + match.start()]
+    return abertura.start(), None
+
+
 class IBPTVersionChecker:
     """
     Classe para verificar se há novas versões da tabela IBPT disponíveis
     comparando com a última versão baixada
     """
     
-    def __init__(self, version_file="data/last_version_downloaded.txt", base_url=None):
+    def __init__(self, version_file="data/last_version_downloaded.txt", base_url=None, session=None, parser="auto",
+                 probe_file="data/version_probe.json"):
         """
         Inicializa o verificador de versões
         
         Args:
             version_file: Arquivo para armazenar informações da última versão baixada
             base_url: URL base do site do IBPT
+            session: Sessão HTTP compartilhada com o download (opcional)
+            parser: Backend de parsing HTML ('auto', 'lxml' ou 'bs4')
+            probe_file: Cache dos validadores HTTP (ETag/Last-Modified) da página inicial
         """
         self.version_file = version_file
+        self.probe_file = probe_file
         self.current_version_info = None
         
         if not base_url:
             raise ValueError("URL base do IBPT não configurada. Configure a variável de ambiente URL_IBPT.")
         self.base_url = base_url
         
-        self.session = requests.Session()
-        self.session.headers.update({
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36"
-        })
+        self.session = session or criar_sessao()
+        self.parser = obter_parser(parser)
     
     def get_current_version_info(self):
         """
         Obtém informações da versão atual disponível no site do IBPT
         
+        A requisição é condicional (If-None-Match/If-Modified-Since): se a página não
+        mudou desde a última verificação, a versão em cache é reutilizada. Caso contrário
+        a resposta é lida em streaming e a leitura para assim que a versão e a vigência
+        aparecem no comunicado; o parsing completo fica como alternativa.
+        
         Returns:
             dict: Informações da versão atual ou None se não conseguir obter
         """
         try:
             print("🔍 Verificando versão atual no site IBPT...")
             
-            # Fazer requisição para a página inicial
-            response = self.session.get(self.base_url)
-            response.raise_for_status()
-            
-            soup = BeautifulSoup(response.content, 'html.parser')
+            probe = self._carregar_probe()
+            headers = {}
+            if probe.get('info'):
+                if probe.get('etag'):
+                    headers['If-None-Match'] = probe['etag']
+                if probe.get('last_modified'):
+                    headers['If-Modified-Since'] = probe['last_modified']
             
-            # Buscar pelo popup de comunicado
-            popup = soup.find('div', {'id': 'popupshadow'})
-            if not popup or not isinstance(popup, Tag):
-                print("⚠️ Popup de comunicado não encontrado")
-                
-                # Tentar extrair do texto geral da página
-                pattern = r"vers[aã]o\s+([0-9.A-Z]+).+?vigente\s+at[eé]\s+(\d{2}/\d{2}/\d{4})"
-                match = re.search(pattern, response.text, re.IGNORECASE)
+            # Fazer requisição para a página inicial
+            with self.session.get(self.base_url, headers=headers, stream=True) as response:
+                if response.status_code == 304 and probe.get('info'):
+                    info = dict(probe['info'], checked_at=datetime.now().isoformat())
+                    print(f"✅ Página inicial sem alterações (304). Versão atual: {info['version']}")
+                    print(f"📅 Vigência até: {info['vigencia_ate']}")
+                    return info
                 
-                if match:
-                    version = match.group(1)
-                    vigencia_ate = match.group(2)
-                    
-                    # Converter data para formato datetime
-                    vigencia_datetime = datetime.strptime(vigencia_ate, "%d/%m/%Y").strftime("%Y-%m-%dT%H:%M:%S")
-                    
-                    print(f"✅ Versão atual encontrada: {version}")
-                    print(f"📅 Vigência até: {vigencia_ate}")
-                    
-                    # Retornar informações da versão
-                    return {
-                        "version": version,
-                        "vigencia_ate": vigencia_ate,
-                        "vigencia_datetime": vigencia_datetime,
-                        "checked_at": datetime.now().isoformat()
-                    }
-                else:
-                    print("❌ Não foi possível encontrar informações da versão atual")
-                    return None
+                response.raise_for_status()
+                # Sem charset no Content-Type o requests assume ISO-8859-1 para text/html; a página é UTF-8
+                charset_declarado = 'charset' in response.headers.get('content-type', '').lower()
+                encoding = response.encoding if charset_declarado and response.encoding else 'utf-8'
+                conteudo, info = self._ler_versao_streaming(response, encoding)
+                cabecalhos = response.headers
             
-            # Extrair versão (ex: 25.2.A)
-            popup_text = popup.get_text()
-            version_match = re.search(r'Versão\s+([0-9.A-Z]+)', popup_text, re.IGNORECASE)
-            if not version_match:
-                print("⚠️ Versão não encontrada no popup")
-                return None
+            if info is None:
+                info = self._extrair_versao(conteudo, conteudo.decode(encoding, errors='replace'))
             
-            version = version_match.group(1)
+            if info:
+                self._salvar_probe(cabecalhos, info)
+            return info
+                
+        except Exception as e:
+            print(f"❌ Erro ao verificar versão atual: {str(e)}")
+            return None
+    
+    def _ler_versao_streaming(self, response, encoding):
+        """
+        Lê a página em blocos e interrompe a leitura assim que encontra versão e vigência no comunicado
+        
+        Returns:
+            tuple: (bytes lidos, informações da versão ou None se for preciso o parsing completo)
+        """
+        decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+        partes = []
+        texto = ""
+        blocos = response.iter_content(chunk_size=16384)
+        
+        for chunk in blocos:
+            partes.append(chunk)
+            texto += decoder.decode(chunk)
             
-            # Extrair data de vigência final (ex: 31/07/2025)
-            vigencia_match = re.search(r'até\s+(\d{2}/\d{2}/\d{4})', popup_text, re.IGNORECASE)
-            if not vigencia_match:
-                print("⚠️ Data de vigência não encontrada")
-                return None
+            # Apenas o conteúdo do elemento do comunicado (a palavra pode aparecer antes, ex: no CSS)
+            inicio, conteudo = _conteudo_elemento(texto, 'popupshadow')
+            if inicio == -1:
+                continue
+            if conteudo is None:
+                # Comunicado ainda incompleto: continuar lendo, até o limite
+                if len(texto) - inicio > 32768:
+                    break
+                continue
             
-            vigencia_ate = vigencia_match.group(1)
+            # Texto do comunicado sem as tags, com as entidades HTML convertidas
+            trecho = html.unescape(re.sub(r'<[^>]+>', ' ', conteudo))
+            version_match = re.search(r'Versão\s+([0-9.A-Z]+)', trecho, re.IGNORECASE)
+            vigencia_match = re.search(r'até\s+(\d{2}/\d{2}/\d{4})', trecho, re.IGNORECASE)
+            if version_match and vigencia_match:
+                version = version_match.group(1)
+                vigencia_ate = vigencia_match.group(1)
+                vigencia_datetime = datetime.strptime(vigencia_ate, "%d/%m/%Y").strftime("%Y-%m-%dT%H:%M:%S")
+                lidos = sum(len(parte) for parte in partes)
+                print(f"✅ Versão atual encontrada: {version} (leitura interrompida após {lidos} bytes)")
+                print(f"📅 Vigência até: {vigencia_ate}")
+                return b"".join(partes), self._montar_info(version, vigencia_ate, vigencia_datetime, trecho)
             
-            # Converter data para formato datetime
-            vigencia_datetime = datetime.strptime(vigencia_ate, "%d/%m/%Y").strftime("%Y-%m-%dT%H:%M:%S")
+            # Comunicado encontrado, mas sem os dados esperados: seguir para o parsing completo
+            break
+        
+        partes.extend(blocos)
+        return b"".join(partes), None
+    
+    def _extrair_versao(self, conteudo, texto):
+        """
+        Extrai versão e vigência com o parsing completo da página inicial
+        """
+        # Buscar pelo popup de comunicado
+        popup_text = self.parser.texto_por_id(self.parser.carregar(conteudo), 'popupshadow')
+        if popup_text is None:
+            print("⚠️ Popup de comunicado não encontrado")
             
-            print(f"✅ Versão atual encontrada: {version}")
-            print(f"📅 Vigência até: {vigencia_ate}")
+            # Tentar extrair do texto geral da página
+            pattern = r"vers[aã]o\s+([0-9.A-Z]+).+?vigente\s+at[eé]\s+(\d{2}/\d{2}/\d{4})"
+            match = re.search(pattern, texto, re.IGNORECASE)
             
-            # Retornar informações da versão
-            return {
-                "version": version,
-                "vigencia_ate": vigencia_ate,
-                "vigencia_datetime": vigencia_datetime,
-                "checked_at": datetime.now().isoformat()
-            }
+            if match:
+                version = match.group(1)
+                vigencia_ate = match.group(2)
                 
-        except Exception as e:
-            print(f"❌ Erro ao verificar versão atual: {str(e)}")
+                # Converter data para formato datetime
+                vigencia_datetime = datetime.strptime(vigencia_ate, "%d/%m/%Y").strftime("%Y-%m-%dT%H:%M:%S")
+                
+                print(f"✅ Versão atual encontrada: {version}")
+                print(f"📅 Vigência até: {vigencia_ate}")
+                
+                # Retornar informações da versão
+                return self._montar_info(version, vigencia_ate, vigencia_datetime, texto)
+            else:
+                print("❌ Não foi possível encontrar informações da versão atual")
+                return None
+        
+        # Extrair versão (ex: 25.2.A)
+        version_match = re.search(r'Versão\s+([0-9.A-Z]+)', popup_text, re.IGNORECASE)
+        if not version_match:
+            print("⚠️ Versão não encontrada no popup")
             return None
+        
+        version = version_match.group(1)
+        
+        # Extrair data de vigência final (ex: 31/07/2025)
+        vigencia_match = re.search(r'até\s+(\d{2}/\d{2}/\d{4})', popup_text, re.IGNORECASE)
+        if not vigencia_match:
+            print("⚠️ Data de vigência não encontrada")
+            return None
+        
+        vigencia_ate = vigencia_match.group(1)
+        
+        # Converter data para formato datetime
+        vigencia_datetime = datetime.strptime(vigencia_ate, "%d/%m/%Y").strftime("%Y-%m-%dT%H:%M:%S")
+        
+        print(f"✅ Versão atual encontrada: {version}")
+        print(f"📅 Vigência até: {vigencia_ate}")
+        
+        # Retornar informações da versão
+        return self._montar_info(version, vigencia_ate, vigencia_datetime, popup_text)
+    
+    def _carregar_probe(self):
+        try:
+            with open(self.probe_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+    
+    def _salvar_probe(self, cabecalhos, info):
+        """
+        Guarda os validadores HTTP da página inicial junto com a versão extraída
+        """
+        probe = self._carregar_probe()
+        probe.update({
+            'etag': cabecalhos.get('ETag'),
+            'last_modified': cabecalhos.get('Last-Modified'),
+            'info': info
+        })
+        self._gravar_probe(probe)
+    
+    def _gravar_probe(self, probe):
+        try:
+            os.makedirs(os.path.dirname(self.probe_file) or ".", exist_ok=True)
+            with open(self.probe_file, 'w', encoding='utf-8') as f:
+                json.dump(probe, f, ensure_ascii=False, indent=2)
+        except OSError as e:
+            print(f"⚠️ Não foi possível salvar o cache da verificação: {str(e)}")
+    
+    def _registrar_deteccao(self, info):
+        """
+        Registra (uma única vez por versão) o momento em que a nova versão foi detectada
+        
+        O momento é mantido entre execuções até a versão ser baixada e fica em
+        info['detectada_em']; só arquivos gerados depois dele são da nova versão.
+        """
+        probe = self._carregar_probe()
+        deteccao = probe.get('deteccao') or {}
+        if deteccao.get('version') != info['version']:
+            # Precisão de segundos, como os horários do histórico do portal
+            deteccao = {'version': info['version'], 'detectada_em': datetime.now().replace(microsecond=0).isoformat()}
+            probe['deteccao'] = deteccao
+            self._gravar_probe(probe)
+        info['detectada_em'] = deteccao['detectada_em']
+    
+    def _montar_info(self, version, vigencia_ate, vigencia_datetime, texto):
+        """
+        Monta o dicionário de informações da versão, incluindo o início da
+        vigência quando o texto traz o período completo (ex: 20/06/2025 a 31/07/2025)
+        """
+        info = {
+            "version": version,
+            "vigencia_ate": vigencia_ate,
+            "vigencia_datetime": vigencia_datetime,
+            "checked_at": datetime.now().isoformat()
+        }
+        
+        periodo_match = re.search(r'(\d{2}/\d{2}/\d{4})\s+(?:a|at[eé])\s+' + re.escape(vigencia_ate), texto, re.IGNORECASE)
+        if periodo_match:
+            info["vigencia_inicio"] = periodo_match.group(1)
+            print(f"📅 Vigência desde: {periodo_match.group(1)}")
+        
+        return info
     
     def get_last_downloaded_version(self):
         """
@@ -202,6 +361,7 @@ class IBPTVersionChecker:
         # Se não há registro da última versão baixada, precisa atualizar
         if not last_info:
             print("⚠️ Não há registro da última versão baixada. Precisa atualizar.")
+            self._registrar_deteccao(current_info)
             return True, current_info, None
         
         # Comparar datas de vigência
@@ -215,9 +375,11 @@ class IBPTVersionChecker:
         # Se a versão ou data de vigência mudou, precisa atualizar
         if current_vigencia > last_vigencia:
             print("🆕 Nova versão disponível!")
+            self._registrar_deteccao(current_info)
             return True, current_info, last_info
         elif current_vigencia == last_vigencia and current_info['version'] != last_info.get('version', ''):
             print("🔄 Mesma vigência, mas versão diferente - atualizando")
+            self._registrar_deteccao(current_info)
             return True, current_info, last_info
         else:
             print("✅ Tabela já está atualizada")
@@ -0,0 +1,179 @@
+"""
+Modo daemon: bot do Telegram e verificação agendada da tabela IBPT no mesmo processo
+
+Várias réplicas podem rodar o daemon com o mesmo backend de estado (SQLite em
+um volume compartilhado): cada horário do cron é reservado por uma única
+réplica e uma lease impede execuções simultâneas da automação.
+"""
+import datetime
+import threading
+from app.main import run_ibpt_automation
+from app.core.sessao import criar_sessao
+from app.telegram.instancia_bot import obter_instancia_bot, obter_estado
+from app.utils.config import (
+    TELEGRAM_TOKEN, CRON_SCHEDULE, SESSION_FILE, LOG_FILE, GRUPOS_FILE, REPLICA_ID, TELEGRAM_MODE,
+    WEBHOOK_URL, WEBHOOK_SECRET, WEBHOOK_HOST, WEBHOOK_PORT, WEBHOOK_PATH, WEBHOOK_QUEUE
+)
+from app.utils.cron import ExpressaoCron
+from app.utils.estado import Lease, identificador_replica
+from app.utils.setup import configurar_logging, garantir_diretorios
+
+# Configuração do logger
+logger = configurar_logging(LOG_FILE)
+
+# Lease da execução em andamento (renovada enquanto a automação roda)
+DURACAO_LEASE_AUTOMACAO = 300
+# Reserva de um horário do cron: longa o bastante para que nenhuma réplica o execute de novo
+DURACAO_RESERVA_HORARIO = 86400
+
+
+class AgendadorAutomacao:
+    """
+    Executa a automação IBPT conforme uma expressão cron, sem execuções sobrepostas
+    e reutilizando a mesma sessão HTTP entre as execuções
+    """
+
+    def __init__(self, expressao_cron, executar_ao_iniciar=True, estado=None, replica=None):
+        """
+        Args:
+            expressao_cron: Horários da verificação
+            executar_ao_iniciar: Executa uma vez ao iniciar, antes do primeiro horário
+            estado: Backend de estado com as leases compartilhadas entre réplicas (opcional)
+            replica: Identificador desta réplica nas leases (padrão: host e PID)
+        """
+        self.cron = ExpressaoCron(expressao_cron)
+        self.executar_ao_iniciar = executar_ao_iniciar
+        self.estado = estado
+        self.replica = replica or identificador_replica()
+        self.sessao = criar_sessao(SESSION_FILE)
+        self._lock = threading.Lock()
+        self._parar = threading.Event()
+        self._thread = None
+
+    def executar(self):
+        """
+        Executa a automação, a menos que uma execução anterior ainda esteja em andamento
+
+        Returns:
+            bool: False se a execução foi ignorada ou falhou
+        """
+        if not self._lock.acquire(blocking=False):
+            logger.warning("Execução anterior da automação ainda em andamento. Ignorando este horário.")
+            return False
+        lease = Lease(self.estado, "automacao", self.replica, DURACAO_LEASE_AUTOMACAO) if self.estado else None
+        try:
+            if lease and not lease.adquirir():
+                logger.warning("Automação em execução por outra réplica. Ignorando este horário.")
+                return False
+            encerrada = threading.Event()
+            if lease:
+                threading.Thread(target=self._manter_lease, args=(lease, encerrada), name="lease-automacao", daemon=True).start()
+            try:
+                return run_ibpt_automation(sessao=self.sessao)
+            finally:
+                encerrada.set()
+                if lease:
+                    lease.liberar()
+        except Exception as e:
+            logger.error(f"Erro na execução agendada: {str(e)}")
+            return False
+        finally:
+            self._lock.release()
+
+    @staticmethod
+    def _manter_lease(lease, encerrada):
+        while not encerrada.wait(lease.duracao / 3):
+            try:
+                lease.manter()
+            except Exception as e:
+                logger.error(f"Erro ao renovar a lease da automação: {str(e)}")
+
+    def _reservar_horario(self, horario):
+        """
+        Reserva um horário do cron para esta réplica
+
+        Returns:
+            bool: False se outra réplica já o executou ou está executando
+        """
+        if not self.estado:
+            return True
+        try:
+            nome = f"automacao:{horario.strftime('%Y-%m-%dT%H:%M')}"
+            if self.estado.adquirir_lease(nome, self.replica, DURACAO_RESERVA_HORARIO):
+                return True
+            logger.info(f"Horário {horario.strftime('%d/%m/%Y %H:%M')} executado por outra réplica")
+        except Exception as e:
+            logger.error(f"Erro ao reservar o horário da automação: {str(e)}")
+        return False
+
+    def _loop(self):
+        if self.executar_ao_iniciar:
+            self.executar()
+
+        while not self._parar.is_set():
+            proxima = self.cron.proxima_execucao()
+            logger.info(f"Próxima verificação agendada para {proxima.strftime('%d/%m/%Y %H:%M')} ({self.cron.expressao})")
+
+            espera = (proxima - datetime.datetime.now()).total_seconds()
+            if self._parar.wait(max(espera, 0)):
+                break
+            if self._reservar_horario(proxima):
+                self.executar()
+
+    def iniciar(self):
+        """Inicia o agendador em uma thread de segundo plano"""
+        self._thread = threading.Thread(target=self._loop, name="agendador-automacao", daemon=True)
+        self._thread.start()
+
+    def parar(self):
+        """Interrompe o agendador após a execução em andamento"""
+        self._parar.set()
+
+
+def run_daemon():
+    """
+    Função que inicia o bot do Telegram com a automação IBPT agendada no mesmo processo
+    """
+    agendador = None
+    try:
+        garantir_diretorios([LOG_FILE, GRUPOS_FILE])
+
+        logger.info("=" * 50)
+        logger.info("INICIANDO MODO DAEMON")
+
+        # O bot é criado antes do agendador para que as execuções agendadas enviem pela mesma instância
+        bot = obter_instancia_bot() if TELEGRAM_TOKEN else None
+
+        agendador = AgendadorAutomacao(CRON_SCHEDULE, estado=obter_estado(), replica=REPLICA_ID)
+        agendador.iniciar()
+
+        if not bot:
+            logger.warning("Token do Telegram não configurado! Executando apenas a automação agendada.")
+            agendador._thread.join()
+            return True
+
+        # O recebimento dos updates ocupa a thread principal
+        if TELEGRAM_MODE == "webhook":
+            bot.start_webhook(
+                WEBHOOK_URL, WEBHOOK_SECRET, host=WEBHOOK_HOST, porta=WEBHOOK_PORT,
+                caminho=WEBHOOK_PATH, capacidade_fila=WEBHOOK_QUEUE
+            )
+        else:
+            bot.start_polling()
+        return True
+
+    except KeyboardInterrupt:
+        logger.info("Daemon encerrado pelo usuário.")
+        return True
+
+    except Exception as e:
+        logger.error(f"Erro no modo daemon: {str(e)}")
+        return False
+
+    finally:
+        if agendador:
+            agendador.parar()
+
+
+if __name__ == "__main__":
+    run_daemon()
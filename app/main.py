@@ -4,16 +4,21 @@ Script principal para automação do download da tabela IBPT
 import datetime
 from app.core.ibpt_automation import IBPTAutomation
 from app.core.version_checker import IBPTVersionChecker
+from app.core.sessao import criar_sessao
+from app.core.artefatos import CacheArtefatos
 from app.utils.config import *
-from app.telegram.instancia_bot import obter_instancia_bot
+from app.telegram.instancia_bot import obter_notificador
 from app.utils.setup import configurar_logging, garantir_diretorios
 
 # Configuração do logger
 logger = configurar_logging(LOG_FILE, ENABLE_DEBUG)
 
-def run_ibpt_automation():
+def run_ibpt_automation(sessao=None):
     """
     Função que executa o fluxo de verificação e download da tabela IBPT
+    
+    Args:
+        sessao: Sessão HTTP já aberta para reutilizar entre execuções (opcional)
     """
     try:
         logger.info("=" * 50)
@@ -23,8 +28,17 @@ def run_ibpt_automation():
         # Criar diretórios necessários
         garantir_diretorios([LOG_FILE, OUTPUT_FILE])
         
+        # Sessão única para a verificação e o download, com os cookies da execução anterior
+        sessao = sessao or criar_sessao(SESSION_FILE)
+        
         # Verificar se há nova versão disponível
-        checker = IBPTVersionChecker(base_url=IBPT_BASE_URL)
+        checker = IBPTVersionChecker(
+            version_file=VERSION_FILE,
+            base_url=IBPT_BASE_URL,
+            session=sessao,
+            parser=HTML_PARSER,
+            probe_file=VERSION_PROBE_FILE
+        )
         needs_update, current_info, last_info = checker.needs_update()
         
         if not needs_update:
@@ -43,12 +57,30 @@ def run_ibpt_automation():
         # Se chegou aqui, precisa atualizar
         logger.info("Iniciando download da nova tabela...")
         
-        ibpt = IBPTAutomation(cnpj=CNPJ, base_url=IBPT_BASE_URL)
+        # Momento em que a versão foi detectada: só arquivos gerados depois dele podem ser reaproveitados
+        # (a vigência não serve: uma revisão como 25.2.A -> 25.2.B mantém o mesmo início)
+        detectada_em = None
+        if current_info and current_info.get('detectada_em'):
+            detectada_em = datetime.datetime.fromisoformat(current_info['detectada_em'])
+        
+        ibpt = IBPTAutomation(
+            cnpj=CNPJ,
+            base_url=IBPT_BASE_URL,
+            historico_file=GENERATION_HISTORY_FILE,
+            session=sessao,
+            cookies_file=SESSION_FILE,
+            parser=HTML_PARSER
+        )
         success = ibpt.run_automation(
             username=USERNAME,
             password=PASSWORD,
             estados=ESTADOS,
-            output_path=OUTPUT_FILE
+            output_path=OUTPUT_FILE,
+            tamanho_lote=SHARD_SIZE,
+            max_workers=SHARD_WORKERS,
+            max_attempts=MAX_ATTEMPTS,
+            delay=DELAY_SECONDS,
+            detectada_em=detectada_em
         )
         
         if not success:
@@ -62,26 +94,33 @@ def run_ibpt_automation():
         return False
 
     try:
-        # Marcar nova versão como baixada
-        if current_info:
-            checker.mark_as_downloaded(current_info)
-        else:
+        if not current_info:
             # Se não temos informações da versão atual do site,
             # vamos tentar obter novamente após o download
             try:
                 current_info = checker.get_current_version_info()
-                if current_info:
-                    checker.mark_as_downloaded(current_info)
             except Exception as e:
                 logger.error(f"Erro ao obter informações da versão após download: {str(e)}")
+        
+        # Separar a tabela por estado uma única vez, para o /tabela não abrir o ZIP a cada pedido.
+        # Gerado antes de marcar a versão, para que o bot não sirva a versão nova sem os arquivos
+        if current_info and current_info.get('version'):
+            try:
+                CacheArtefatos(ARTIFACT_CACHE_DIR).gerar(OUTPUT_FILE, current_info['version'])
+            except Exception as e:
+                logger.error(f"Erro ao gerar o cache de arquivos por estado: {str(e)}")
+        
+        # Marcar nova versão como baixada
+        if current_info:
+            checker.mark_as_downloaded(current_info)
             
         # Enviar notificação pelo Telegram
         try:
             if TELEGRAM_TOKEN:
                 logger.info("Enviando notificação pelo Telegram...")
                 
-                # Usar a instância singleton do bot
-                bot = obter_instancia_bot()
+                # Cliente somente de envio: não registra handlers nem disputa os updates com o polling do bot
+                bot = obter_notificador()
                 
                 # Preparar mensagem
                 version_info = "Nova versão disponível"
@@ -93,16 +132,16 @@ def run_ibpt_automation():
                     vigencia = current_info.get('vigencia_ate', 'Desconhecida')
                     version_info = f"Nova versão {version} (válida até {vigencia})"
                 
-                # Enviar mensagem para todos os grupos ativos
-                mensagem = f"🆕 *{version_info}*\n\nA tabela IBPT foi atualizada e está disponível para download."
-                enviados, falhas = bot.broadcast_mensagem(mensagem)
+                # Anúncio na legenda da tabela: uma mensagem por grupo e um único upload
+                anuncio = (
+                    f"🆕 *{version_info}*\n\n"
+                    "A tabela IBPT foi atualizada e está disponível para download."
+                )
+                # Chave por versão: uma nova execução retoma o envio sem repetir para quem já recebeu
+                chave = version if current_info and current_info.get('version') else None
+                enviados, falhas = bot.broadcast_anuncio(OUTPUT_FILE, anuncio, chave, chave=chave)
                 grupos_ativos = len(bot.get_grupos_ativos())
-                logger.info(f"Mensagem enviada para {enviados} grupos de um total de {grupos_ativos} grupos ativos ({falhas} falhas)")
-                
-                # Enviar arquivo para todos os grupos ativos
-                caption = f"📊 *Tabela IBPT - Versão {version} (válida até {vigencia})*"
-                enviados, falhas = bot.broadcast_arquivo(OUTPUT_FILE, caption)
-                logger.info(f"Arquivo enviado para {enviados} grupos de um total de {grupos_ativos} grupos ativos ({falhas} falhas)")
+                logger.info(f"Tabela enviada para {enviados} grupos de um total de {grupos_ativos} grupos ativos ({falhas} falhas)")
                 
         except Exception as e:
             logger.error(f"Erro ao enviar notificação pelo Telegram: {str(e)}")
@@ -4,15 +4,21 @@ Script para iniciar o bot do Telegram
 import os
 import datetime
 from app.telegram.instancia_bot import obter_instancia_bot
-from app.utils.config import TELEGRAM_TOKEN, GRUPOS_FILE, LOG_FILE
+from app.utils.config import (
+    TELEGRAM_TOKEN, GRUPOS_FILE, LOG_FILE,
+    WEBHOOK_URL, WEBHOOK_SECRET, WEBHOOK_HOST, WEBHOOK_PORT, WEBHOOK_PATH, WEBHOOK_QUEUE
+)
 from app.utils.setup import configurar_logging, garantir_diretorios
 
 # Configuração do logger
 logger = configurar_logging("logs/telegram_bot.log")
 
-def run_telegram_bot():
+def run_telegram_bot(modo="polling"):
     """
     Função que inicia o bot do Telegram
+    
+    Args:
+        modo: 'polling' (long polling) ou 'webhook' (servidor HTTP recebendo os updates)
     """
     try:
         # Criar diretórios necessários
@@ -28,9 +34,15 @@ def run_telegram_bot():
         # Iniciar o bot usando o singleton
         bot = obter_instancia_bot()
         
-        # Iniciar polling
         logger.info("Bot iniciado. Pressione Ctrl+C para encerrar.")
-        bot.start_polling()
+        if modo == "webhook":
+            bot.start_webhook(
+                WEBHOOK_URL, WEBHOOK_SECRET, host=WEBHOOK_HOST, porta=WEBHOOK_PORT,
+                caminho=WEBHOOK_PATH, capacidade_fila=WEBHOOK_QUEUE
+            )
+        else:
+            # Iniciar polling
+            bot.start_polling()
         
         return True
         
@@ -0,0 +1,149 @@
+"""
+Controle de admissão dos comandos por custo (token bucket)
+
+Cada comando tem um custo (ex: /help = 1, /tabela = 10) que é debitado de
+três orçamentos: o do usuário, o do chat e o global. Os orçamentos são
+recarregados continuamente (tokens por minuto). Quando não há saldo, o
+pedido não é recusado: ele reserva os tokens e aguarda até que estejam
+disponíveis; só é recusado se a espera passar do limite configurado.
+"""
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def ler_custos(texto):
+    """
+    Converte "tabela=10,help=1" em {'tabela': 10.0, 'help': 1.0}
+    """
+    custos = {}
+    for item in (texto or "").split(","):
+        if "=" not in item:
+            continue
+        comando, custo = item.split("=", 1)
+        try:
+            custos[comando.strip().lstrip("/").lower()] = float(custo)
+        except ValueError:
+            logger.warning(f"Custo inválido para o comando {comando.strip()}: {custo}")
+    return custos
+
+
+class EsperaExcedida(Exception):
+    """O pedido precisaria aguardar mais do que a espera máxima"""
+
+    def __init__(self, espera):
+        super().__init__(f"Espera estimada de {espera:.0f}s")
+        self.espera = espera
+
+
+class BaldeTokens:
+    """Orçamento recarregado continuamente; o saldo pode ficar negativo (tokens reservados)"""
+    __slots__ = ('capacidade', 'taxa', 'tokens', 'atualizado')
+
+    def __init__(self, capacidade, agora):
+        self.capacidade = capacidade
+        self.taxa = capacidade / 60  # tokens por segundo
+        self.tokens = capacidade
+        self.atualizado = agora
+
+    def recarregar(self, agora):
+        self.tokens = min(self.capacidade, self.tokens + (agora - self.atualizado) * self.taxa)
+        self.atualizado = agora
+
+    def espera(self, custo):
+        """Segundos até haver saldo para `custo`"""
+        falta = min(custo, self.capacidade) - self.tokens
+        return max(falta, 0) / self.taxa
+
+    def cheio(self, agora):
+        self.recarregar(agora)
+        return self.tokens >= self.capacidade
+
+
+class ControleAdmissao:
+    """
+    Orçamentos por usuário, por chat e global para os comandos
+    """
+
+    def __init__(self, custos=None, orcamento_usuario=30, orcamento_chat=60, orcamento_global=600,
+                 espera_maxima=120, custo_padrao=1):
+        """
+        Args:
+            custos: Custo de cada comando ({'tabela': 10}); os demais custam `custo_padrao`
+            orcamento_usuario: Tokens por minuto de cada usuário
+            orcamento_chat: Tokens por minuto de cada chat
+            orcamento_global: Tokens por minuto de todo o bot
+            espera_maxima: Espera máxima, em segundos, antes de recusar o pedido
+        """
+        self.custos = custos or {}
+        self.custo_padrao = custo_padrao
+        self.orcamento_usuario = orcamento_usuario
+        self.orcamento_chat = orcamento_chat
+        self.espera_maxima = espera_maxima
+        self._global = BaldeTokens(orcamento_global, time.monotonic())
+        self._usuarios = {}
+        self._chats = {}
+        self._limpeza = time.monotonic()
+
+    def custo(self, comando):
+        return self.custos.get(comando, self.custo_padrao)
+
+    def _balde(self, baldes, chave, capacidade, agora):
+        balde = baldes.get(chave)
+        if balde is None:
+            balde = baldes[chave] = BaldeTokens(capacidade, agora)
+        else:
+            balde.recarregar(agora)
+        return balde
+
+    def _limpar(self, agora):
+        """Descarta os orçamentos cheios (equivalentes a um novo), no máximo uma vez por minuto"""
+        if agora - self._limpeza < 60:
+            return
+        self._limpeza = agora
+        for baldes in (self._usuarios, self._chats):
+            for chave in [chave for chave, balde in baldes.items() if balde.cheio(agora)]:
+                del baldes[chave]
+
+    async def admitir(self, user_id, chat_id, custo, ao_adiar=None):
+        """
+        Debita o custo dos orçamentos, aguardando se necessário
+
+        Args:
+            custo: Custo do comando (0 = sempre admitido)
+            ao_adiar: Corrotina chamada com a espera em segundos quando o pedido é adiado
+
+        Raises:
+            EsperaExcedida: Se a espera passar de espera_maxima (nada é debitado)
+        """
+        if custo <= 0:
+            return
+        agora = time.monotonic()
+        self._limpar(agora)
+        self._global.recarregar(agora)
+        baldes = [
+            self._balde(self._usuarios, str(user_id), self.orcamento_usuario, agora),
+            self._balde(self._chats, str(chat_id), self.orcamento_chat, agora),
+            self._global
+        ]
+
+        espera = max(balde.espera(custo) for balde in baldes)
+        if espera > self.espera_maxima:
+            raise EsperaExcedida(espera)
+
+        # Reservar os tokens agora mantém a ordem de chegada entre os adiados
+        for balde in baldes:
+            balde.tokens -= min(custo, balde.capacidade)
+        if espera <= 0:
+            return
+
+        if ao_adiar:
+            await ao_adiar(espera)
+        try:
+            await asyncio.sleep(espera)
+        except asyncio.CancelledError:
+            for balde in baldes:
+                balde.tokens += min(custo, balde.capacidade)
+            raise
@@ -1,16 +1,41 @@
 """
 Bot do Telegram para envio da tabela IBPT
+
+Os comandos rodam em um AsyncTeleBot: cada update é tratado em uma corrotina
+e todas as chamadas dos handlers à API compartilham o mesmo pool de conexões
+aiohttp. Leitura de arquivos, acesso ao registro de grupos e extração da
+tabela rodam em um executor para não bloquear o loop de eventos.
+
+Os comandos são divididos em classes (app/telegram/filas_comandos.py):
+instantâneos (texto), pesados (/tabela) e administrativos, cada uma com
+vagas, fila e executor próprios. Antes de entrar na fila, o custo do comando
+é debitado dos orçamentos do usuário, do chat e global
+(app/telegram/admissao.py); sem saldo, o pedido é adiado.
+
+O offset dos updates concluídos é gravado em data/ (app/telegram/offset_updates.py):
+ao reiniciar, o bot continua de onde parou, sem repetir nem perder comandos.
 """
+import asyncio
+import functools
 import logging
 import os
-import telebot
 from telebot import types
+from telebot import asyncio_helper
+from telebot.async_telebot import AsyncTeleBot
 import datetime
 import sys
 import time
-import json
 import re
-from app.utils.grupos_manager import GruposManager
+import secrets
+import threading
+from app.core.artefatos import CacheArtefatos
+from app.telegram.notificador import NotificadorTelegram
+from app.telegram.execucao_compartilhada import ExecucaoCompartilhada
+from app.telegram.filas_comandos import FilaComandos, FilaCheia, fila_atual, INSTANTANEO, PESADO, ADMIN
+from app.telegram.limitador_comandos import LimitadorComandos, LimitadorCompartilhado, BLACKLISTED
+from app.telegram.admissao import ControleAdmissao, EsperaExcedida
+from app.telegram.offset_updates import CheckpointUpdates, ATUALIZACOES
+from app.telegram.webhook import ServidorWebhook
 
 # Configuração do logger
 logging.basicConfig(
@@ -23,112 +48,168 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-class TelegramBot:
-    def __init__(self, token, grupos_file="data/grupos.json"):
+class TelegramBot(NotificadorTelegram):
+    def __init__(self, token, grupos_file="data/grupos.json", tabela_file="data/tabela_aliquotas_ibpt.zip",
+                 cache_dir="data/cache", file_id_cache_file="data/telegram_file_ids.json",
+                 broadcast_workers=8, broadcast_taxa=30, broadcast_db="data/broadcasts.db", storage_chat_id=None,
+                 pool_conexoes=100, workers_io=8, workers_pesados=4, fila_pesados=50, estado=None,
+                 rate_limit_ttl=7200, rate_limit_max_usuarios=100000, intervalo_snapshot=60, admissao=None,
+                 offset_file="data/telegram_offset.json", max_updates_pendentes=200, replica=None,
+                 version_file="data/last_version_downloaded.txt"):
         """
         Inicializa o bot do Telegram
         
         Args:
             token: Token do bot do Telegram
             grupos_file: Arquivo para armazenar os IDs dos grupos e seus status
+            tabela_file: ZIP completo da tabela baixada
+            cache_dir: Diretório com os arquivos da tabela separados por estado
+            file_id_cache_file: Cache dos file_id de documentos já enviados
+            broadcast_workers: Envios simultâneos nos broadcasts
+            broadcast_taxa: Limite global de mensagens por segundo nos broadcasts
+            broadcast_db: Banco SQLite da fila de broadcasts
+            storage_chat_id: Chat privado onde os arquivos são enviados uma vez para obter o file_id (opcional)
+            pool_conexoes: Conexões simultâneas com a API do Telegram compartilhadas pelos handlers
+            workers_io: Threads para o trabalho bloqueante dos comandos instantâneos
+            workers_pesados: Comandos pesados (/tabela) executados ao mesmo tempo
+            fila_pesados: Comandos pesados que podem aguardar na fila
+            estado: Backend de grupos, blacklist e rate limits (padrão: arquivos JSON em data/)
+            rate_limit_ttl: Segundos sem comandos após os quais os contadores de um usuário são descartados
+            rate_limit_max_usuarios: Máximo de usuários com contadores em memória
+            intervalo_snapshot: Intervalo, em segundos, entre as gravações dos contadores de rate limit
+            admissao: Controle de admissão por custo dos comandos (padrão: ControleAdmissao())
+            offset_file: Checkpoint do último update processado
+            max_updates_pendentes: Updates processados ao mesmo tempo (o polling aguarda quando atinge o limite)
+            replica: Identificador desta réplica nas leases (padrão: host e PID)
+            version_file: Informações da última versão baixada
         """
-        self.bot = telebot.TeleBot(token, num_threads=5)
-        self.grupos_manager = GruposManager(grupos_file)
+        # Cliente síncrono (self.bot) para os broadcasts, que rodam em threads próprias
+        super().__init__(
+            token, grupos_file, file_id_cache_file,
+            broadcast_workers=broadcast_workers, broadcast_taxa=broadcast_taxa,
+            broadcast_db=broadcast_db, storage_chat_id=storage_chat_id, estado=estado, replica=replica,
+            version_file=version_file
+        )
+        # Cliente assíncrono para os comandos; o limite vale para a sessão aiohttp única da biblioteca
+        asyncio_helper.REQUEST_LIMIT = pool_conexoes
+        self.bot_async = AsyncTeleBot(token)
+        self.filas = {
+            INSTANTANEO: FilaComandos(INSTANTANEO, concorrencia=100, workers_io=workers_io),
+            PESADO: FilaComandos(PESADO, concorrencia=workers_pesados, capacidade=fila_pesados),
+            # Faixa prioritária: comandos de admin nunca esperam atrás dos pedidos dos usuários
+            ADMIN: FilaComandos(ADMIN, concorrencia=2)
+        }
+        self.execucoes = ExecucaoCompartilhada()
+        self.admissao = admissao or ControleAdmissao()
+        self.checkpoint = CheckpointUpdates(offset_file)
+        self.max_updates_pendentes = max_updates_pendentes
+        self._tarefas_updates = set()
+        self._loop = None
+        self._tarefa_principal = None
+        self.tabela_file = tabela_file
+        self.artefatos = CacheArtefatos(cache_dir)
         
         # Sistema de proteção contra spam
-        self.rate_limits = {}  # {user_id: {'last_command': timestamp, 'command_count': count}}
         self.blacklist = set()  # Set de usuários bloqueados
-        self.blacklist_file = "data/blacklist.txt"
         
         # Configurações de rate limiting
         self.COOLDOWN_SECONDS = 3  # Tempo mínimo entre comandos
         self.MAX_COMMANDS_PER_MINUTE = 10  # Máximo de comandos por minuto
         self.MAX_COMMANDS_PER_HOUR = 50  # Máximo de comandos por hora
         self.BLACKLIST_THRESHOLD = 20  # Comandos em 1 minuto = blacklist
+        limites = dict(
+            cooldown=self.COOLDOWN_SECONDS, max_minuto=self.MAX_COMMANDS_PER_MINUTE,
+            max_hora=self.MAX_COMMANDS_PER_HOUR, limite_blacklist=self.BLACKLIST_THRESHOLD,
+            ttl=rate_limit_ttl, max_usuarios=rate_limit_max_usuarios
+        )
+        if self.estado.compartilhado:
+            # Várias réplicas: os contadores de cada usuário ficam no backend compartilhado
+            self.rate_limiter = LimitadorCompartilhado(self.estado, **limites)
+        else:
+            self.rate_limiter = LimitadorComandos(**limites)
+        self.intervalo_snapshot = intervalo_snapshot
         
         # Criar diretório para os arquivos se não existir
         os.makedirs("data", exist_ok=True)
-        os.makedirs(os.path.dirname(self.blacklist_file), exist_ok=True)
         
-        # Carregar blacklist existente
+        # Carregar blacklist e contadores de rate limit existentes
         self._load_blacklist()
+        self._carregar_rate_limits()
         
         # Registrar handlers
         self._register_handlers()
         
-        # Registrar automaticamente grupos em que o bot já está
-        self._register_existing_groups()
-        
         logger.info("Bot do Telegram inicializado com proteção contra spam")
     
-    def _register_existing_groups(self):
+    def _registrar_grupo_do_update(self, update):
         """
-        Tenta registrar grupos em que o bot já está presente
-        quando é iniciado
+        Registra (como inativo) o grupo de origem de um update, se ainda não estiver registrado
+        
+        Como o bot não pode obter a lista dos chats onde está, os grupos são
+        registrados à medida que seus updates chegam, inclusive os acumulados
+        enquanto o bot estava parado.
         """
-        try:
-            # Verifica os membros atuais no momento de inicialização
-            logger.info("Tentando registrar grupos existentes na inicialização...")
-            
-            # Tenta obter os grupos onde o bot já está
-            registered_groups = 0
-            
-            # Registra o chat atual (se for um grupo)
-            # Como o bot não pode obter a lista completa dos chats onde está
-            # vamos ao menos registrar o chat atual
-            try:
-                updates = self.bot.get_updates(offset=0, timeout=1)
-                for update in updates:
-                    if hasattr(update, 'message') and update.message:
-                        if update.message.chat.type in ['group', 'supergroup']:
-                            chat_id = update.message.chat.id
-                            chat_id_str = str(chat_id)
-                            group_name = update.message.chat.title or "Grupo sem nome"
-                            
-                            # Verificar se o grupo já está registrado
-                            grupos = self.grupos_manager.get_grupos()
-                            if chat_id_str not in grupos:
-                                self.grupos_manager.add_grupo(chat_id, group_name, is_active=False)
-                                registered_groups += 1
-                                logger.info(f"Grupo registrado na inicialização: ID {chat_id}, Nome: {group_name}")
-                
-                # Tenta enviar uma mensagem para o chat atual para verificar se é um grupo
-                if registered_groups == 0:
-                    # Não conseguimos registrar nenhum grupo pelos updates
-                    # Vamos registrar o chat atual manualmente para teste
-                    logger.info("Não foi possível registrar grupos pelos updates. Tentando obter chats manualmente...")
-            except Exception as e:
-                logger.error(f"Erro ao tentar registrar grupos pelos updates: {str(e)}")
-            
-            if registered_groups > 0:
-                logger.info(f"Total de {registered_groups} grupos registrados na inicialização")
-            else:
-                logger.info("Nenhum grupo foi registrado na inicialização. Os grupos serão registrados quando enviarem comandos.")
-        except Exception as e:
-            logger.error(f"Erro ao registrar grupos existentes: {str(e)}")
+        message = update.message
+        if not message or message.chat.type not in ['group', 'supergroup']:
+            return
+        chat_id = message.chat.id
+        if self.grupos_manager.get_grupo(chat_id) is None:
+            group_name = message.chat.title or "Grupo sem nome"
+            self.grupos_manager.add_grupo(chat_id, group_name, is_active=False)
+            logger.info(f"Grupo registrado pelos updates: ID {chat_id}, Nome: {group_name}")
 
     def _load_blacklist(self):
         """Carrega a lista de usuários bloqueados"""
         try:
-            if os.path.exists(self.blacklist_file):
-                with open(self.blacklist_file, 'r') as f:
-                    for line in f:
-                        if line.strip():
-                            self.blacklist.add(line.strip())
-                logger.info(f"Blacklist carregada: {len(self.blacklist)} usuários bloqueados")
+            self.blacklist = self.estado.carregar_blacklist()
+            logger.info(f"Blacklist carregada: {len(self.blacklist)} usuários bloqueados")
         except Exception as e:
             logger.error(f"Erro ao carregar blacklist: {str(e)}")
 
-    def _save_blacklist(self):
-        """Salva a lista de usuários bloqueados"""
+    def _na_blacklist(self, user_id):
+        """Verifica a blacklist (no backend compartilhado, vê os bloqueios feitos por outras réplicas)"""
+        user_id = str(user_id)
+        if user_id in self.blacklist:
+            return True
+        if not self.estado.compartilhado:
+            return False
+        try:
+            if self.estado.na_blacklist(user_id):
+                self.blacklist.add(user_id)
+                return True
+        except Exception as e:
+            logger.error(f"Erro ao consultar blacklist: {str(e)}")
+        return False
+
+    def _bloquear_usuario(self, user_id):
+        """Adiciona um usuário à blacklist (gravação de uma única entrada)"""
+        self.blacklist.add(str(user_id))
         try:
-            with open(self.blacklist_file, 'w') as f:
-                for user_id in self.blacklist:
-                    f.write(f"{user_id}\n")
-            logger.info(f"Blacklist salva: {len(self.blacklist)} usuários bloqueados")
+            self.estado.adicionar_blacklist(str(user_id))
         except Exception as e:
             logger.error(f"Erro ao salvar blacklist: {str(e)}")
 
+    def _carregar_rate_limits(self):
+        """Restaura o último snapshot dos contadores de rate limit"""
+        try:
+            self.rate_limiter.carregar(self.estado)
+            logger.info(f"Rate limits carregados: {len(self.rate_limiter)} usuários")
+        except Exception as e:
+            logger.error(f"Erro ao carregar rate limits: {str(e)}")
+
+    def _salvar_rate_limits(self):
+        """Grava o snapshot dos contadores de rate limit para sobreviver a reinícios"""
+        try:
+            self.rate_limiter.salvar(self.estado)
+        except Exception as e:
+            logger.error(f"Erro ao salvar rate limits: {str(e)}")
+
+    async def _gravar_rate_limits_periodicamente(self):
+        """Grava o snapshot dos rate limits a cada intervalo_snapshot enquanto o bot roda"""
+        while True:
+            await asyncio.sleep(self.intervalo_snapshot)
+            await self._em_executor(self._salvar_rate_limits)
+
     def _is_rate_limited(self, user_id):
         """
         Verifica se o usuário está sendo rate limited
@@ -140,65 +221,175 @@ class TelegramBot:
             tuple: (is_limited, reason, remaining_time)
         """
         user_id_str = str(user_id)
-        current_time = time.time()
         
         # Verificar se está na blacklist
-        if user_id_str in self.blacklist:
+        if self._na_blacklist(user_id_str):
             return True, "BLACKLISTED", 0
         
-        # Inicializar dados do usuário se não existir
-        if user_id_str not in self.rate_limits:
-            self.rate_limits[user_id_str] = {
-                'last_command': 0,
-                'command_count': 0,
-                'minute_start': current_time,
-                'hour_start': current_time,
-                'minute_count': 0,
-                'hour_count': 0
-            }
+        is_limited, reason, remaining_time = self.rate_limiter.verificar(user_id_str)
+        if reason == BLACKLISTED:
+            # Adicionar à blacklist se exceder muito
+            self._bloquear_usuario(user_id_str)
+            logger.warning(f"Usuário {user_id} adicionado à blacklist por spam excessivo")
+        return is_limited, reason, remaining_time
+
+    async def _em_executor(self, funcao, *args, **kwargs):
+        """Executa uma função bloqueante (disco, ZIP, broadcast) no executor da classe do comando atual"""
+        fila = fila_atual.get() or self.filas[INSTANTANEO]
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(fila.executor, functools.partial(funcao, *args, **kwargs))
+
+    async def _verificar_rate_limit(self, message):
+        """
+        Aplica o rate limit do usuário (fora do loop de eventos: o backend pode ser SQLite)
         
-        user_data = self.rate_limits[user_id_str]
+        Returns:
+            bool: False se o pedido foi recusado (e o usuário avisado)
+        """
+        user_id = message.from_user.id if message.from_user else message.chat.id
+        try:
+            is_limited, reason, remaining_time = await self._em_executor(self._is_rate_limited, user_id)
+            if is_limited:
+                await self._send_rate_limit_message(message.chat.id, reason, remaining_time)
+                logger.warning(f"Rate limit aplicado para usuário {user_id}: {reason}")
+                return False
+            return True
+        except Exception as e:
+            logger.error(f"Erro ao verificar rate limit de {user_id}: {str(e)}")
+            await self.bot_async.reply_to(message, "❌ Ocorreu um erro ao processar seu comando. Tente novamente mais tarde.")
+            return False
+
+    def _classe_comando(self, classe, custo=None, limitar=False):
+        """
+        Decorador que executa o handler na fila da classe de comando
         
-        # Verificar cooldown entre comandos
-        time_since_last = current_time - user_data['last_command']
-        if time_since_last < self.COOLDOWN_SECONDS:
-            remaining = self.COOLDOWN_SECONDS - time_since_last
-            return True, "COOLDOWN", remaining
+        Quando não há vaga o usuário é avisado da posição na fila; com a fila
+        cheia o pedido é recusado.
         
-        # Verificar limite por minuto
-        if current_time - user_data['minute_start'] >= 60:
-            user_data['minute_start'] = current_time
-            user_data['minute_count'] = 0
+        Args:
+            classe: Classe do comando (INSTANTANEO, PESADO ou ADMIN)
+            custo: Nome do comando na tabela de custos da admissão (None = sem custo)
+            limitar: Aplica o rate limit do usuário antes da admissão
+        """
+        fila = self.filas[classe]
         
-        user_data['minute_count'] += 1
+        def decorador(handler):
+            @functools.wraps(handler)
+            async def executar(message):
+                # Pedidos recusados pelo rate limit não consomem os orçamentos da admissão
+                if limitar and not await self._verificar_rate_limit(message):
+                    return
+                if custo and not await self._admitir(message, custo):
+                    return
+                
+                async def avisar_posicao(posicao):
+                    try:
+                        await self.bot_async.reply_to(
+                            message,
+                            f"⏳ Muitos pedidos no momento. Seu pedido está na fila, posição {posicao}."
+                        )
+                    except Exception as e:
+                        logger.error(f"Erro ao avisar posição na fila: {str(e)}")
+                
+                try:
+                    await fila.executar(lambda: handler(message), avisar_posicao)
+                except FilaCheia as e:
+                    logger.warning(str(e))
+                    await self.bot_async.reply_to(
+                        message,
+                        "⚠️ O bot está recebendo muitos pedidos no momento. Tente novamente em alguns minutos."
+                    )
+            return executar
+        return decorador
+
+    async def _enviar_documento_async(self, chat_id, caminho, versao, sha256, caption=None, nome=None, parse_mode=None):
+        """
+        Versão assíncrona do _enviar_documento, usada pelos handlers
+        """
+        nome = nome or os.path.basename(caminho)
         
-        if user_data['minute_count'] > self.MAX_COMMANDS_PER_MINUTE:
-            # Adicionar à blacklist se exceder muito
-            if user_data['minute_count'] > self.BLACKLIST_THRESHOLD:
-                self.blacklist.add(user_id_str)
-                self._save_blacklist()
-                logger.warning(f"Usuário {user_id} adicionado à blacklist por spam excessivo")
-                return True, "BLACKLISTED", 0
-            
-            return True, "RATE_LIMITED_MINUTE", 60 - (current_time - user_data['minute_start'])
+        file_id = await self._em_executor(self.file_ids.obter, versao, nome, sha256) if versao else None
+        if file_id:
+            try:
+                return await self.bot_async.send_document(chat_id, file_id, caption=caption, parse_mode=parse_mode)
+            except asyncio_helper.ApiTelegramException as e:
+                # file_id inválido ou expirado: descartar e enviar os bytes novamente
+                if e.error_code != 400:
+                    raise
+                logger.warning(f"file_id de {nome} recusado pelo Telegram ({e.description}), reenviando o arquivo")
+                await self._em_executor(self.file_ids.descartar, versao, nome, sha256)
         
-        # Verificar limite por hora
-        if current_time - user_data['hour_start'] >= 3600:
-            user_data['hour_start'] = current_time
-            user_data['hour_count'] = 0
+        # O aiohttp lê o arquivo em um executor durante o upload
+        with open(caminho, 'rb') as f:
+            enviada = await self.bot_async.send_document(
+                chat_id,
+                f,
+                caption=caption,
+                visible_file_name=nome,
+                parse_mode=parse_mode
+            )
+        if versao and enviada.document:
+            await self._em_executor(self.file_ids.registrar, versao, nome, sha256, enviada.document.file_id)
+        return enviada
+
+    async def _enviar_tabela_estado(self, chat_id, versao, estado, artefato):
+        """
+        Envia o arquivo de um estado, com um único upload para pedidos simultâneos
         
-        user_data['hour_count'] += 1
+        Enquanto o primeiro envio de (versão, UF) faz o upload, os pedidos
+        seguintes aguardam e então enviam pelo file_id obtido.
+        """
+        def enviar():
+            return self._enviar_documento_async(
+                chat_id,
+                artefato['caminho'],
+                versao,
+                artefato['sha256'],
+                caption=f"📊 Tabela IBPT para {estado} - Versão {versao}",
+                nome=artefato['arquivo']
+            )
         
-        if user_data['hour_count'] > self.MAX_COMMANDS_PER_HOUR:
-            return True, "RATE_LIMITED_HOUR", 3600 - (current_time - user_data['hour_start'])
+        if await self._em_executor(self.file_ids.obter, versao, artefato['arquivo'], artefato['sha256']):
+            return await enviar()
         
-        # Atualizar timestamp do último comando
-        user_data['last_command'] = current_time
-        user_data['command_count'] += 1
+        enviada, compartilhado = await self.execucoes.executar(('upload', versao, estado), enviar)
+        if compartilhado:
+            # O upload foi feito para outro chat: enviar aqui pelo file_id
+            enviada = await enviar()
+        return enviada
+
+    async def _admitir(self, message, comando):
+        """
+        Debita o custo do comando dos orçamentos, adiando o pedido se não houver saldo
         
-        return False, None, 0
+        Returns:
+            bool: False se o pedido foi recusado por exigir espera longa demais
+        """
+        user_id = message.from_user.id if message.from_user else message.chat.id
+        
+        async def avisar_adiamento(espera):
+            if espera < 2:
+                return
+            try:
+                await self.bot_async.reply_to(
+                    message,
+                    f"⏳ Muitos pedidos no momento. Seu pedido será processado em cerca de {int(espera) + 1} segundos."
+                )
+            except Exception as e:
+                logger.error(f"Erro ao avisar adiamento: {str(e)}")
+        
+        try:
+            await self.admissao.admitir(user_id, message.chat.id, self.admissao.custo(comando), avisar_adiamento)
+            return True
+        except EsperaExcedida as e:
+            logger.warning(f"Pedido /{comando} de {user_id} no chat {message.chat.id} recusado: {str(e)}")
+            await self.bot_async.reply_to(
+                message,
+                f"⚠️ O bot está recebendo muitos pedidos no momento. Tente novamente em {int(e.espera) + 1} segundos."
+            )
+            return False
 
-    def _send_rate_limit_message(self, chat_id, reason, remaining_time):
+    async def _send_rate_limit_message(self, chat_id, reason, remaining_time):
         """Envia mensagem de rate limit"""
         if reason == "BLACKLISTED":
             message = (
@@ -223,11 +414,11 @@ class TelegramBot:
             )
         
         try:
-            self.bot.send_message(chat_id, message, parse_mode='Markdown')
+            await self.bot_async.send_message(chat_id, message, parse_mode='Markdown')
         except Exception as e:
             logger.error(f"Erro ao enviar mensagem de rate limit: {str(e)}")
 
-    def _send_long_message(self, chat_id, text, header=""):
+    async def _send_long_message(self, chat_id, text, header=""):
         """
         Envia uma mensagem longa, dividindo-a em partes se necessário.
         
@@ -258,9 +449,9 @@ class TelegramBot:
         for i, part in enumerate(parts):
             try:
                 if i > 0 and header:
-                    self.bot.send_message(chat_id, header + part, parse_mode='Markdown')
+                    await self.bot_async.send_message(chat_id, header + part, parse_mode='Markdown')
                 else:
-                    self.bot.send_message(chat_id, part, parse_mode='Markdown')
+                    await self.bot_async.send_message(chat_id, part, parse_mode='Markdown')
             except Exception as e:
                 logger.error(f"Erro ao enviar parte da mensagem longa para {chat_id}: {e}")
 
@@ -268,7 +459,7 @@ class TelegramBot:
         """Registra os handlers para comandos do bot"""
         
         # Função auxiliar para verificar se um grupo está ativo
-        def check_grupo_ativo(message):
+        async def check_grupo_ativo(message):
             """
             Verifica se um grupo está ativo e envia uma mensagem se não estiver
             
@@ -285,16 +476,15 @@ class TelegramBot:
                 return True
                 
             # Verificar se o grupo está registrado e ativo
-            chat_id_str = str(chat_id)
-            grupos = self.grupos_manager.get_grupos()
+            grupo = await self._em_executor(self.grupos_manager.get_grupo, chat_id)
             
             # Registrar o grupo automaticamente se ainda não estiver registrado
-            if chat_id_str not in grupos:
+            if grupo is None:
                 group_name = message.chat.title or "Grupo sem nome"
-                self.grupos_manager.add_grupo(chat_id, group_name, is_active=False)
+                await self._em_executor(self.grupos_manager.add_grupo, chat_id, group_name, is_active=False)
                 logger.info(f"Grupo registrado automaticamente ao receber comando: ID {chat_id}, Nome: {group_name}")
                 
-                self.bot.reply_to(
+                await self.bot_async.reply_to(
                     message,
                     "⚠️ Este grupo foi registrado automaticamente, mas está inativo.\n\n"
                     "Um administrador do bot precisa ativar este grupo para que os comandos funcionem.\n\n"
@@ -303,8 +493,8 @@ class TelegramBot:
                 return False
             
             # Verificar se o grupo está ativo
-            if not grupos[chat_id_str].get('ativo', False):
-                self.bot.reply_to(
+            if not grupo.get('ativo', False):
+                await self.bot_async.reply_to(
                     message,
                     "⚠️ Este grupo está registrado, mas ainda não foi ativado por um administrador do bot.\n\n"
                     "Os comandos só funcionarão após a ativação."
@@ -314,23 +504,22 @@ class TelegramBot:
             return True
         
         # Handler para quando o bot é adicionado a um novo grupo
-        @self.bot.message_handler(content_types=['new_chat_members'])
-        def handle_new_chat_members(message):
+        @self.bot_async.message_handler(content_types=['new_chat_members'])
+        @self._classe_comando(INSTANTANEO)
+        async def handle_new_chat_members(message):
             """Handler para detectar quando o bot é adicionado a um grupo"""
             try:
                 # Verificar se o bot está entre os novos membros
                 for member in message.new_chat_members:
-                    if member.id == self.bot.get_me().id:
+                    if member.id == self.bot_async.bot_id:
                         # Bot foi adicionado a um novo grupo
                         chat_id = message.chat.id
-                        chat_id_str = str(chat_id)
                         group_name = message.chat.title or "Grupo sem nome"
                         
                         # Verificar se o grupo já está na lista
-                        grupos = self.grupos_manager.get_grupos()
-                        if chat_id_str not in grupos:
+                        if await self._em_executor(self.grupos_manager.get_grupo, chat_id) is None:
                             # Adicionar grupo como inativo
-                            self.grupos_manager.add_grupo(chat_id, group_name, is_active=False)
+                            await self._em_executor(self.grupos_manager.add_grupo, chat_id, group_name, is_active=False)
                             
                             # Enviar mensagem de boas-vindas
                             welcome_text = (
@@ -341,7 +530,7 @@ class TelegramBot:
                                 "Use `/help` para ver os comandos disponíveis."
                             )
                             
-                            self.bot.send_message(
+                            await self.bot_async.send_message(
                                 chat_id, 
                                 welcome_text, 
                                 parse_mode='Markdown'
@@ -355,54 +544,45 @@ class TelegramBot:
                 logger.error(f"Erro ao processar adição do bot a um grupo: {str(e)}")
         
         # Handler para quando o bot é removido de um grupo
-        @self.bot.message_handler(content_types=['left_chat_member'])
-        def handle_left_chat_member(message):
+        @self.bot_async.message_handler(content_types=['left_chat_member'])
+        @self._classe_comando(INSTANTANEO)
+        async def handle_left_chat_member(message):
             """Handler para detectar quando o bot é removido de um grupo"""
             try:
                 # Verificar se o bot foi removido
-                if message.left_chat_member.id == self.bot.get_me().id:
+                if message.left_chat_member.id == self.bot_async.bot_id:
                     # Bot foi removido do grupo
                     chat_id = message.chat.id
-                    chat_id_str = str(chat_id)
                     group_name = message.chat.title or "Grupo sem nome"
                     
-                    # Verificar se o grupo está na lista e remover
-                    grupos = self.grupos_manager.get_grupos()
-                    if chat_id_str in grupos:
-                        self.grupos_manager.remove_grupo(chat_id)
+                    # Remover o grupo se estiver na lista
+                    if await self._em_executor(self.grupos_manager.remove_grupo, chat_id):
                         logger.info(f"Bot removido do grupo: ID {chat_id}, Nome: {group_name}")
             except Exception as e:
                 logger.error(f"Erro ao processar remoção do bot de um grupo: {str(e)}")
         
-        @self.bot.message_handler(commands=['start'])
-        def handle_start(message):
+        @self.bot_async.message_handler(commands=['start'])
+        @self._classe_comando(INSTANTANEO, custo='start', limitar=True)
+        async def handle_start(message):
             """Handler para o comando /start"""
             try:
                 user_id = message.from_user.id
                 chat_id = message.chat.id
                 
-                # Verificar rate limiting
-                is_limited, reason, remaining_time = self._is_rate_limited(user_id)
-                if is_limited:
-                    self._send_rate_limit_message(chat_id, reason, remaining_time)
-                    logger.warning(f"Rate limit aplicado para usuário {user_id}: {reason}")
-                    return
-                
                 username = message.from_user.username or "Sem username"
                 first_name = message.from_user.first_name or "Sem nome"
                 
                 # Verificar se é um grupo
                 if message.chat.type in ['group', 'supergroup']:
                     # Verificar se o grupo já está na lista
-                    grupos = self.grupos_manager.get_grupos()
-                    chat_id_str = str(chat_id)
+                    grupo = await self._em_executor(self.grupos_manager.get_grupo, chat_id)
                     
-                    if chat_id_str in grupos:
+                    if grupo is not None:
                         # Grupo já está registrado
                         group_name = message.chat.title or "Grupo"
                         
                         # Verificar se está ativo
-                        if grupos[chat_id_str].get('ativo', False):
+                        if grupo.get('ativo', False):
                             status_text = "✅ *Este grupo já está ativo para receber notificações!*"
                         else:
                             # Não ativar o grupo - apenas informar que precisa de ativação por admin
@@ -419,7 +599,7 @@ class TelegramBot:
                             "/remover - Remove o grupo do recebimento de notificações"
                         )
                         
-                        self.bot.send_message(
+                        await self.bot_async.send_message(
                             chat_id, 
                             already_registered_text, 
                             parse_mode='Markdown'
@@ -430,7 +610,7 @@ class TelegramBot:
                     else:
                         # Adicionar grupo à lista como inativo
                         group_name = message.chat.title or "Grupo"
-                        self.grupos_manager.add_grupo(chat_id, group_name, is_active=False)
+                        await self._em_executor(self.grupos_manager.add_grupo, chat_id, group_name, is_active=False)
                         
                         # Enviar mensagem de boas-vindas
                         welcome_text = (
@@ -440,7 +620,7 @@ class TelegramBot:
                             "Os comandos só funcionarão quando o grupo for ativado por um administrador do bot."
                         )
                         
-                        self.bot.send_message(
+                        await self.bot_async.send_message(
                             chat_id, 
                             welcome_text, 
                             parse_mode='Markdown'
@@ -461,7 +641,7 @@ class TelegramBot:
                         "/remover - Remove o grupo do recebimento de notificações"
                     )
                     
-                    self.bot.send_message(
+                    await self.bot_async.send_message(
                         user_id, 
                         private_chat_text, 
                         parse_mode='Markdown'
@@ -471,23 +651,18 @@ class TelegramBot:
                 
             except Exception as e:
                 logger.error(f"Erro no comando /start: {str(e)}")
-                self.bot.reply_to(message, "❌ Ocorreu um erro ao processar seu comando. Tente novamente mais tarde.")
+                await self.bot_async.reply_to(message, "❌ Ocorreu um erro ao processar seu comando. Tente novamente mais tarde.")
         
-        @self.bot.message_handler(commands=['help'])
-        def handle_help(message):
+        @self.bot_async.message_handler(commands=['help'])
+        @self._classe_comando(INSTANTANEO, custo='help', limitar=True)
+        async def handle_help(message):
             """Handler para o comando /help"""
             try:
                 user_id = message.from_user.id
                 chat_id = message.chat.id
                 
-                # Verificar rate limiting
-                is_limited, reason, remaining_time = self._is_rate_limited(user_id)
-                if is_limited:
-                    self._send_rate_limit_message(chat_id, reason, remaining_time)
-                    return
-                
                 # Verificar se o grupo está ativo (exceto para chats privados)
-                if message.chat.type in ['group', 'supergroup'] and not check_grupo_ativo(message):
+                if message.chat.type in ['group', 'supergroup'] and not await check_grupo_ativo(message):
                     return
                 
                 help_text = (
@@ -517,7 +692,7 @@ class TelegramBot:
                     "• Usuários abusivos são bloqueados automaticamente"
                 )
                 
-                self.bot.send_message(
+                await self.bot_async.send_message(
                     message.chat.id, 
                     help_text, 
                     parse_mode='MarkdownV2'
@@ -525,33 +700,24 @@ class TelegramBot:
                 
             except Exception as e:
                 logger.error(f"Erro no comando /help: {str(e)}")
-                self.bot.reply_to(message, "❌ Ocorreu um erro ao processar seu comando. Tente novamente mais tarde.")
+                await self.bot_async.reply_to(message, "❌ Ocorreu um erro ao processar seu comando. Tente novamente mais tarde.")
         
-        @self.bot.message_handler(commands=['status'])
-        def handle_status(message):
+        @self.bot_async.message_handler(commands=['status'])
+        @self._classe_comando(INSTANTANEO, custo='status', limitar=True)
+        async def handle_status(message):
             """Handler para o comando /status"""
             try:
                 user_id = message.from_user.id
                 chat_id = message.chat.id
                 
-                # Verificar rate limiting
-                is_limited, reason, remaining_time = self._is_rate_limited(user_id)
-                if is_limited:
-                    self._send_rate_limit_message(chat_id, reason, remaining_time)
-                    return
-                
                 # Verificar se o grupo está ativo (exceto para chats privados)
-                if message.chat.type in ['group', 'supergroup'] and not check_grupo_ativo(message):
+                if message.chat.type in ['group', 'supergroup'] and not await check_grupo_ativo(message):
                     return
                 
-                # Verificar se existe o arquivo last_version_downloaded.txt
-                version_file = "data/last_version_downloaded.txt"
+                # Informações da última versão baixada (version_file)
+                data = await self._em_executor(self._info_versao)
                 
-                if os.path.exists(version_file):
-                    import json
-                    with open(version_file, 'r') as f:
-                        data = json.load(f)
-                    
+                if data:
                     version = data.get('version', 'Desconhecida')
                     vigencia = data.get('vigencia_ate', 'Desconhecida')
                     checked_at = data.get('checked_at', 'Desconhecida')
@@ -578,7 +744,7 @@ class TelegramBot:
                         "Para solicitar a tabela de um estado, use o comando /tabela UF (ex: /tabela SP)"
                     )
                 
-                self.bot.send_message(
+                await self.bot_async.send_message(
                     message.chat.id, 
                     status_text, 
                     parse_mode='Markdown'
@@ -586,23 +752,18 @@ class TelegramBot:
                 
             except Exception as e:
                 logger.error(f"Erro no comando /status: {str(e)}")
-                self.bot.reply_to(message, "❌ Ocorreu um erro ao processar seu comando. Tente novamente mais tarde.")
+                await self.bot_async.reply_to(message, "❌ Ocorreu um erro ao processar seu comando. Tente novamente mais tarde.")
         
-        @self.bot.message_handler(commands=['tabela'])
-        def handle_tabela(message):
+        @self.bot_async.message_handler(commands=['tabela'])
+        @self._classe_comando(PESADO, custo='tabela', limitar=True)
+        async def handle_tabela(message):
             """Handler para solicitar tabela de um estado específico"""
             try:
                 user_id = message.from_user.id
                 chat_id = message.chat.id
                 
-                # Verificar rate limiting
-                is_limited, reason, remaining_time = self._is_rate_limited(user_id)
-                if is_limited:
-                    self._send_rate_limit_message(chat_id, reason, remaining_time)
-                    return
-                
                 # Verificar se o grupo está ativo (exceto para chats privados)
-                if message.chat.type in ['group', 'supergroup'] and not check_grupo_ativo(message):
+                if message.chat.type in ['group', 'supergroup'] and not await check_grupo_ativo(message):
                     return
                 
                 # Extrair o estado do comando
@@ -613,7 +774,7 @@ class TelegramBot:
                     # Obter lista de estados disponíveis do .env
                     estados_disponiveis = os.getenv("ESTADOS", "CE").split(",")
                     
-                    self.bot.send_message(
+                    await self.bot_async.send_message(
                         message.chat.id,
                         f"*Uso:* `/tabela UF`\n\n"
                         f"Onde UF é a sigla do estado desejado (ex: SP, RJ, MG).\n\n"
@@ -627,7 +788,7 @@ class TelegramBot:
                 
                 # Verificar se o estado é válido (2 letras)
                 if not re.match(r'^[A-Z]{2}$', estado):
-                    self.bot.send_message(
+                    await self.bot_async.send_message(
                         message.chat.id,
                         f"❌ *Estado inválido:* {estado}\n\n"
                         f"Use a sigla do estado com 2 letras (ex: SP, RJ, MG).",
@@ -638,7 +799,7 @@ class TelegramBot:
                 # Verificar se o estado está na lista de estados configurados
                 estados_disponiveis = os.getenv("ESTADOS", "CE").split(",")
                 if estado not in estados_disponiveis:
-                    self.bot.send_message(
+                    await self.bot_async.send_message(
                         message.chat.id,
                         f"❌ *Estado não disponível:* {estado}\n\n"
                         f"Estados disponíveis: {', '.join(estados_disponiveis)}",
@@ -646,10 +807,10 @@ class TelegramBot:
                     )
                     return
                 
-                # Verificar se existe o arquivo da versão
-                version_file = "data/last_version_downloaded.txt"
-                if not os.path.exists(version_file):
-                    self.bot.send_message(
+                # Carregar informações da versão
+                data = await self._em_executor(self._info_versao)
+                if not data:
+                    await self.bot_async.send_message(
                         message.chat.id,
                         "❌ *Informações da tabela não disponíveis*\n\n"
                         "A tabela ainda não foi baixada. Tente novamente mais tarde.",
@@ -657,10 +818,6 @@ class TelegramBot:
                     )
                     return
                 
-                # Carregar informações da versão
-                with open(version_file, 'r') as f:
-                    data = json.load(f)
-                
                 version = data.get('version', 'Desconhecida')
                 vigencia = data.get('vigencia_ate', 'Desconhecida')
                 
@@ -671,164 +828,93 @@ class TelegramBot:
                 except:
                     data_formatted = vigencia
                 
-                # Caminho para a tabela completa
-                tabela_completa_path = "data/tabela_aliquotas_ibpt.zip"
-                
-                # Verificar se o arquivo existe
-                if not os.path.exists(tabela_completa_path):
-                    self.bot.send_message(
-                        message.chat.id,
-                        f"❌ *Tabela para {estado} não disponível*\n\n"
-                        "A tabela solicitada ainda não está disponível. Tente novamente mais tarde.",
-                        parse_mode='Markdown'
-                    )
-                    return
-                
-                # Enviar mensagem de preparação
-                self.bot.send_message(
-                    message.chat.id,
-                    f"🔍 *Preparando tabela IBPT para {estado}...*\n\n"
-                    f"Isso pode levar alguns instantes.",
-                    parse_mode='Markdown'
+                # Arquivo do estado já separado no cache da versão (gerado após o download)
+                artefato, _ = await self.execucoes.executar(
+                    ('artefato', version, estado),
+                    lambda: self._em_executor(self.artefatos.artefato, version, estado, self.tabela_file)
                 )
                 
-                # Diretório temporário para extrair o arquivo
-                import tempfile
-                import zipfile
-                import shutil
-                
-                # Criar diretório temporário
-                temp_dir = tempfile.mkdtemp()
-                
-                try:
-                    # Padrão de arquivo para o estado solicitado
-                    # Formato: TabelaIBPTaxCE25.2.B.csv
-                    arquivo_estado_pattern = f"TabelaIBPTax{estado}"
-                    
-                    # Flag para indicar se encontramos o arquivo do estado
-                    encontrou_arquivo = False
-                    nome_arquivo = ""
-                    
-                    # Processar o arquivo ZIP
-                    with zipfile.ZipFile(tabela_completa_path, 'r') as zip_completo:
-                        # Listar todos os arquivos
-                        arquivos = zip_completo.namelist()
-                        
-                        # Filtrar apenas os arquivos do estado solicitado
-                        arquivos_estado = [arq for arq in arquivos if arquivo_estado_pattern in arq]
-                        
-                        if not arquivos_estado:
-                            self.bot.send_message(
-                                message.chat.id,
-                                f"❌ *Tabela para {estado} não encontrada*\n\n"
-                                f"Não foi possível encontrar a tabela para o estado {estado} no arquivo atual.",
-                                parse_mode='Markdown'
-                            )
-                            return
-                        
-                        # Extrair o primeiro arquivo encontrado (normalmente só deve haver um por estado)
-                        arquivo_csv = arquivos_estado[0]
-                        nome_arquivo = os.path.basename(arquivo_csv)
-                        arquivo_path = os.path.join(temp_dir, nome_arquivo)
-                        
-                        # Extrair o arquivo para o diretório temporário
-                        with open(arquivo_path, 'wb') as f:
-                            f.write(zip_completo.read(arquivo_csv))
-                            encontrou_arquivo = True
-                            logger.info(f"Arquivo {arquivo_csv} extraído para o estado {estado}")
-                    
-                    if not encontrou_arquivo:
-                        self.bot.send_message(
-                            message.chat.id,
-                            f"❌ *Tabela para {estado} não encontrada*\n\n"
-                            f"Não foi possível encontrar a tabela para o estado {estado} no arquivo atual.",
-                            parse_mode='Markdown'
-                        )
-                        return
-                    
-                    # Enviar o arquivo CSV diretamente
-                    try:
-                        with open(arquivo_path, 'rb') as f:
-                            self.bot.send_document(
-                                message.chat.id,
-                                f,
-                                caption=f"📊 Tabela IBPT para {estado} - Versão {version}",
-                                visible_file_name=nome_arquivo
-                            )
-                        
-                        self.bot.send_message(
+                if artefato is None:
+                    if not os.path.exists(self.tabela_file):
+                        await self.bot_async.send_message(
                             message.chat.id,
-                            f"✅ *Tabela IBPT para {estado} enviada com sucesso!*\n\n"
-                            f"*Versão:* {version}\n"
-                            f"*Vigência até:* {data_formatted}\n\n"
-                            "Utilize esta tabela para configurar o seu sistema de emissão de Notas Fiscais.",
+                            f"❌ *Tabela para {estado} não disponível*\n\n"
+                            "A tabela solicitada ainda não está disponível. Tente novamente mais tarde.",
                             parse_mode='Markdown'
                         )
-                        
-                        logger.info(f"Tabela para {estado} enviada para o usuário {message.from_user.id}")
-                    except Exception as e:
-                        self.bot.send_message(
+                    else:
+                        await self.bot_async.send_message(
                             message.chat.id,
-                            f"❌ *Erro ao enviar a tabela para {estado}:* {str(e)}",
+                            f"❌ *Tabela para {estado} não encontrada*\n\n"
+                            f"Não foi possível encontrar a tabela para o estado {estado} no arquivo atual.",
                             parse_mode='Markdown'
                         )
-                        logger.error(f"Erro ao enviar tabela para {estado} ao usuário {message.from_user.id}: {str(e)}")
-                finally:
-                    # Limpar arquivos temporários
-                    try:
-                        shutil.rmtree(temp_dir)
-                        logger.info(f"Diretório temporário {temp_dir} removido")
-                    except Exception as e:
-                        logger.error(f"Erro ao remover diretório temporário {temp_dir}: {str(e)}")
+                    return
+                
+                # Enviar o arquivo CSV diretamente (ou reaproveitar o file_id de um envio anterior)
+                try:
+                    await self._enviar_tabela_estado(message.chat.id, version, estado, artefato)
+                    
+                    await self.bot_async.send_message(
+                        message.chat.id,
+                        f"✅ *Tabela IBPT para {estado} enviada com sucesso!*\n\n"
+                        f"*Versão:* {version}\n"
+                        f"*Vigência até:* {data_formatted}\n\n"
+                        "Utilize esta tabela para configurar o seu sistema de emissão de Notas Fiscais.",
+                        parse_mode='Markdown'
+                    )
+                    
+                    logger.info(f"Tabela para {estado} enviada para o usuário {message.from_user.id}")
+                except Exception as e:
+                    await self.bot_async.send_message(
+                        message.chat.id,
+                        f"❌ *Erro ao enviar a tabela para {estado}:* {str(e)}",
+                        parse_mode='Markdown'
+                    )
+                    logger.error(f"Erro ao enviar tabela para {estado} ao usuário {message.from_user.id}: {str(e)}")
             
             except Exception as e:
                 logger.error(f"Erro no comando /tabela: {str(e)}")
-                self.bot.reply_to(message, "❌ Ocorreu um erro ao processar seu comando. Tente novamente mais tarde.")
+                await self.bot_async.reply_to(message, "❌ Ocorreu um erro ao processar seu comando. Tente novamente mais tarde.")
         
-        @self.bot.message_handler(commands=['remover'])
-        def handle_remover(message):
+        @self.bot_async.message_handler(commands=['remover'])
+        @self._classe_comando(INSTANTANEO, custo='remover', limitar=True)
+        async def handle_remover(message):
             """Handler para o comando /remover"""
             try:
                 user_id = message.from_user.id
                 chat_id = message.chat.id
                 
-                # Verificar rate limiting
-                is_limited, reason, remaining_time = self._is_rate_limited(user_id)
-                if is_limited:
-                    self._send_rate_limit_message(chat_id, reason, remaining_time)
-                    logger.warning(f"Rate limit aplicado para usuário {user_id}: {reason}")
-                    return
-                
                 # Verificar se é um grupo
                 if message.chat.type not in ['group', 'supergroup']:
-                    self.bot.reply_to(
+                    await self.bot_async.reply_to(
                         message,
                         "❌ Este comando só pode ser usado em grupos."
                     )
                     return
                 
                 # Verificar se o grupo está ativo
-                if not check_grupo_ativo(message):
+                if not await check_grupo_ativo(message):
                     return
                 
                 # Verificar se o usuário é admin do grupo
-                chat_member = self.bot.get_chat_member(chat_id, user_id)
+                chat_member = await self.bot_async.get_chat_member(chat_id, user_id)
                 if chat_member.status not in ['creator', 'administrator']:
-                    self.bot.reply_to(
+                    await self.bot_async.reply_to(
                         message,
                         "❌ Apenas administradores do grupo podem remover o bot da lista de notificações."
                     )
                     return
                 
                 # Remover grupo da lista
-                if self.grupos_manager.remove_grupo(chat_id):
+                if await self._em_executor(self.grupos_manager.remove_grupo, chat_id):
                     cancel_text = (
                         "✅ *Remoção realizada com sucesso!*\n\n"
                         "Este grupo não receberá mais notificações automáticas sobre atualizações da tabela IBPT.\n\n"
                         "Caso deseje reativar as notificações no futuro, utilize o comando /start."
                     )
                     
-                    self.bot.send_message(
+                    await self.bot_async.send_message(
                         chat_id, 
                         cancel_text, 
                         parse_mode='Markdown'
@@ -836,7 +922,7 @@ class TelegramBot:
                     
                     logger.info(f"Grupo removido das notificações: ID {chat_id}, Nome: {message.chat.title}")
                 else:
-                    self.bot.reply_to(
+                    await self.bot_async.reply_to(
                         message,
                         "❓ Este grupo não estava inscrito para receber notificações."
                     )
@@ -845,26 +931,21 @@ class TelegramBot:
                 
             except Exception as e:
                 logger.error(f"Erro no comando /remover: {str(e)}")
-                self.bot.reply_to(message, "❌ Ocorreu um erro ao processar seu comando. Tente novamente mais tarde.")
+                await self.bot_async.reply_to(message, "❌ Ocorreu um erro ao processar seu comando. Tente novamente mais tarde.")
 
-        @self.bot.message_handler(commands=['admin'])
-        def handle_admin(message):
+        @self.bot_async.message_handler(commands=['admin'])
+        @self._classe_comando(ADMIN, limitar=True)
+        async def handle_admin(message):
             """Handler para comandos administrativos"""
             try:
                 user_id = message.from_user.id
                 chat_id = message.chat.id
                 
-                # Verificar rate limiting
-                is_limited, reason, remaining_time = self._is_rate_limited(user_id)
-                if is_limited:
-                    self._send_rate_limit_message(chat_id, reason, remaining_time)
-                    return
-                
                 # Verificar se é administrador (você pode configurar uma lista de admins)
                 admin_ids = os.getenv("ADMIN_IDS", "")
                 
                 if not admin_ids or str(user_id) not in admin_ids.split(","):
-                    self.bot.reply_to(message, "❌ Você não tem permissão para usar comandos administrativos.")
+                    await self.bot_async.reply_to(message, "❌ Você não tem permissão para usar comandos administrativos.")
                     return
                 
                 # Parse do comando
@@ -882,18 +963,21 @@ class TelegramBot:
                         "`/admin remove GRUPO_ID` - Remove completamente um grupo da lista\n"
                         "`/admin broadcast MENSAGEM` - Envia mensagem para todos os grupos ativos"
                     )
-                    self.bot.send_message(chat_id, admin_help, parse_mode='Markdown')
+                    await self.bot_async.send_message(chat_id, admin_help, parse_mode='Markdown')
                     return
                 
                 subcommand = command_parts[1].lower()
                 
                 if subcommand == "stats":
                     # Estatísticas gerais
-                    grupos = self.grupos_manager.get_grupos()
-                    grupos_ativos = self.grupos_manager.get_grupos_ativos()
-                    grupos_inativos = self.grupos_manager.get_grupos_inativos()
+                    grupos = await self._em_executor(self.grupos_manager.get_grupos)
+                    grupos_ativos = await self._em_executor(self.grupos_manager.get_grupos_ativos)
+                    grupos_inativos = await self._em_executor(self.grupos_manager.get_grupos_inativos)
+                    if self.estado.compartilhado:
+                        # Inclui os bloqueios feitos pelas outras réplicas
+                        await self._em_executor(self._load_blacklist)
                     blacklist_count = len(self.blacklist)
-                    rate_limited_count = len(self.rate_limits)
+                    rate_limited_count = await self._em_executor(len, self.rate_limiter)
                     
                     stats_text = (
                         "*Estatísticas do Bot*\n\n"
@@ -909,44 +993,43 @@ class TelegramBot:
                         f"• Threshold blacklist: {self.BLACKLIST_THRESHOLD}"
                     )
                     
-                    self.bot.send_message(chat_id, stats_text, parse_mode='Markdown')
+                    await self.bot_async.send_message(chat_id, stats_text, parse_mode='Markdown')
                     
                 elif subcommand == "blacklist":
                     # Listar blacklist
+                    if self.estado.compartilhado:
+                        await self._em_executor(self._load_blacklist)
                     if not self.blacklist:
-                        self.bot.send_message(chat_id, "✅ Nenhum usuário está bloqueado.")
+                        await self.bot_async.send_message(chat_id, "✅ Nenhum usuário está bloqueado.")
                     else:
                         blacklist_text = "*Usuários Bloqueados:*\n\n"
                         for i, user_id in enumerate(self.blacklist, 1):
                             blacklist_text += f"{i}. `{user_id}`\n"
                         
-                        self._send_long_message(chat_id, blacklist_text, header="*Usuários Bloqueados (continuação):*\n\n")
+                        await self._send_long_message(chat_id, blacklist_text, header="*Usuários Bloqueados (continuação):*\n\n")
                         
                 elif subcommand == "unblock" and len(command_parts) >= 3:
                     # Desbloquear usuário
                     target_user_id = command_parts[2]
                     
-                    if target_user_id in self.blacklist:
-                        self.blacklist.remove(target_user_id)
-                        self._save_blacklist()
+                    if await self._em_executor(self._na_blacklist, target_user_id):
+                        self.blacklist.discard(target_user_id)
+                        await self._em_executor(self.estado.remover_blacklist, target_user_id)
                         
                         # Limpar dados de rate limit também
-                        if target_user_id in self.rate_limits:
-                            del self.rate_limits[target_user_id]
+                        await self._em_executor(self.rate_limiter.remover, target_user_id)
                         
-                        self.bot.send_message(chat_id, f"✅ Usuário `{target_user_id}` foi desbloqueado.", parse_mode='Markdown')
+                        await self.bot_async.send_message(chat_id, f"✅ Usuário `{target_user_id}` foi desbloqueado.", parse_mode='Markdown')
                         logger.info(f"Usuário {target_user_id} desbloqueado por admin {user_id}")
                     else:
-                        self.bot.send_message(chat_id, f"❌ Usuário `{target_user_id}` não está bloqueado.", parse_mode='Markdown')
+                        await self.bot_async.send_message(chat_id, f"❌ Usuário `{target_user_id}` não está bloqueado.", parse_mode='Markdown')
                         
                 elif subcommand == "rate" and len(command_parts) >= 3:
                     # Estatísticas de rate limit de um usuário
                     target_user_id = command_parts[2]
                     
-                    if target_user_id in self.rate_limits:
-                        user_data = self.rate_limits[target_user_id]
-                        current_time = time.time()
-                        
+                    user_data = await self._em_executor(self.rate_limiter.consultar, target_user_id)
+                    if user_data is not None:
                         rate_text = (
                             f"*Estatísticas de Rate Limit*\n"
                             f"Usuário: `{target_user_id}`\n\n"
@@ -954,20 +1037,20 @@ class TelegramBot:
                             f"⏰ Último comando: *{datetime.datetime.fromtimestamp(user_data['last_command']).strftime('%d/%m/%Y %H:%M:%S')}*\n"
                             f"🕐 Comandos/minuto: *{user_data['minute_count']}*\n"
                             f"🕐 Comandos/hora: *{user_data['hour_count']}*\n\n"
-                            f"🚫 Na blacklist: *{'Sim' if target_user_id in self.blacklist else 'Não'}*"
+                            f"🚫 Na blacklist: *{'Sim' if await self._em_executor(self._na_blacklist, target_user_id) else 'Não'}*"
                         )
                         
-                        self.bot.send_message(chat_id, rate_text, parse_mode='Markdown')
+                        await self.bot_async.send_message(chat_id, rate_text, parse_mode='Markdown')
                     else:
-                        self.bot.send_message(chat_id, f"❌ Usuário `{target_user_id}` não tem dados de rate limit.", parse_mode='Markdown')
+                        await self.bot_async.send_message(chat_id, f"❌ Usuário `{target_user_id}` não tem dados de rate limit.", parse_mode='Markdown')
                 
                 elif subcommand == "grupos":
                     # Listar todos os grupos
-                    grupos_dict = self.grupos_manager.get_grupos()
+                    grupos_dict = await self._em_executor(self.grupos_manager.get_grupos)
                     
                     try:
                         if not grupos_dict:
-                            self.bot.send_message(
+                            await self.bot_async.send_message(
                                 chat_id, 
                                 "*Todos os Grupos Registrados:*\n\n"
                                 "Nenhum grupo está registrado ainda.\n\n"
@@ -984,11 +1067,11 @@ class TelegramBot:
                                 nome = grupo_info.get('nome', 'Grupo sem nome')
                                 grupos_text += f"{i}. `{grupo_id}` - {status} - {nome}\n"
                             
-                            self._send_long_message(chat_id, grupos_text, header="*Todos os Grupos Registrados (continuação):*\n\n")
+                            await self._send_long_message(chat_id, grupos_text, header="*Todos os Grupos Registrados (continuação):*\n\n")
                             
                             # Exibir contagem de grupos
-                            grupos_ativos = len(self.grupos_manager.get_grupos_ativos())
-                            grupos_inativos = len(self.grupos_manager.get_grupos_inativos())
+                            grupos_ativos = len(await self._em_executor(self.grupos_manager.get_grupos_ativos))
+                            grupos_inativos = len(await self._em_executor(self.grupos_manager.get_grupos_inativos))
                             total_grupos = len(grupos_dict)
                             
                             stats_text = f"\n*Resumo:*\n"
@@ -996,21 +1079,20 @@ class TelegramBot:
                             stats_text += f"• Grupos ativos: {grupos_ativos}\n"
                             stats_text += f"• Grupos inativos: {grupos_inativos}\n"
                             
-                            self.bot.send_message(chat_id, stats_text, parse_mode='Markdown')
+                            await self.bot_async.send_message(chat_id, stats_text, parse_mode='Markdown')
                     except Exception as e:
                         logger.error(f"Erro ao listar grupos: {str(e)}")
-                        self.bot.send_message(chat_id, f"❌ Erro ao listar grupos: {str(e)}", parse_mode='Markdown')
+                        await self.bot_async.send_message(chat_id, f"❌ Erro ao listar grupos: {str(e)}", parse_mode='Markdown')
                 
                 elif subcommand == "ativar" and len(command_parts) >= 3:
                     # Ativar um grupo
                     target_group_id = command_parts[2]
                     
-                    if self.grupos_manager.ativar_grupo(target_group_id):
-                        grupos_dict = self.grupos_manager.get_grupos()
-                        nome = grupos_dict.get(target_group_id, {}).get('nome', 'Grupo sem nome')
+                    if await self._em_executor(self.grupos_manager.ativar_grupo, target_group_id):
+                        nome = (await self._em_executor(self.grupos_manager.get_grupo, target_group_id)).get('nome', 'Grupo sem nome')
                         
                         # Informar ao administrador
-                        self.bot.send_message(
+                        await self.bot_async.send_message(
                             chat_id, 
                             f"✅ Grupo `{target_group_id}` ({nome}) foi ativado com sucesso.", 
                             parse_mode='Markdown'
@@ -1018,7 +1100,7 @@ class TelegramBot:
                         
                         # Enviar mensagem ao grupo informando que foi ativado
                         try:
-                            self.bot.send_message(
+                            await self.bot_async.send_message(
                                 int(target_group_id),
                                 "✅ *Grupo Ativado!*\n\n"
                                 "Este grupo foi ativado por um administrador do bot e agora "
@@ -1031,7 +1113,7 @@ class TelegramBot:
                             
                         logger.info(f"Grupo {target_group_id} ativado por admin {user_id}")
                     else:
-                        self.bot.send_message(
+                        await self.bot_async.send_message(
                             chat_id, 
                             f"❌ Grupo `{target_group_id}` não encontrado.", 
                             parse_mode='Markdown'
@@ -1041,17 +1123,16 @@ class TelegramBot:
                     # Desativar um grupo
                     target_group_id = command_parts[2]
                     
-                    if self.grupos_manager.desativar_grupo(target_group_id):
-                        grupos_dict = self.grupos_manager.get_grupos()
-                        nome = grupos_dict.get(target_group_id, {}).get('nome', 'Grupo sem nome')
-                        self.bot.send_message(
+                    if await self._em_executor(self.grupos_manager.desativar_grupo, target_group_id):
+                        nome = (await self._em_executor(self.grupos_manager.get_grupo, target_group_id)).get('nome', 'Grupo sem nome')
+                        await self.bot_async.send_message(
                             chat_id, 
                             f"✅ Grupo `{target_group_id}` ({nome}) foi desativado com sucesso.", 
                             parse_mode='Markdown'
                         )
                         logger.info(f"Grupo {target_group_id} desativado por admin {user_id}")
                     else:
-                        self.bot.send_message(
+                        await self.bot_async.send_message(
                             chat_id, 
                             f"❌ Grupo `{target_group_id}` não encontrado.", 
                             parse_mode='Markdown'
@@ -1062,26 +1143,26 @@ class TelegramBot:
                     target_group_id = command_parts[2]
                     
                     # Verificar se o grupo existe na lista antes de remover
-                    grupos_dict = self.grupos_manager.get_grupos()
-                    if target_group_id in grupos_dict:
-                        nome = grupos_dict.get(target_group_id, {}).get('nome', 'Grupo sem nome')
+                    grupo = await self._em_executor(self.grupos_manager.get_grupo, target_group_id)
+                    if grupo is not None:
+                        nome = grupo.get('nome', 'Grupo sem nome')
                         
                         # Remover o grupo usando o método do GruposManager
-                        if self.grupos_manager.remove_grupo(target_group_id):
-                            self.bot.send_message(
+                        if await self._em_executor(self.grupos_manager.remove_grupo, target_group_id):
+                            await self.bot_async.send_message(
                                 chat_id, 
                                 f"✅ Grupo `{target_group_id}` ({nome}) foi removido completamente da lista.", 
                                 parse_mode='Markdown'
                             )
                             logger.info(f"Grupo {target_group_id} removido completamente por admin {user_id}")
                         else:
-                            self.bot.send_message(
+                            await self.bot_async.send_message(
                                 chat_id, 
                                 f"❌ Erro ao remover o grupo `{target_group_id}` ({nome}).", 
                                 parse_mode='Markdown'
                             )
                     else:
-                        self.bot.send_message(
+                        await self.bot_async.send_message(
                             chat_id, 
                             f"❌ Grupo `{target_group_id}` não encontrado na lista.", 
                             parse_mode='Markdown'
@@ -1090,178 +1171,192 @@ class TelegramBot:
                 elif subcommand == "broadcast" and len(command_parts) >= 3:
                     # Enviar mensagem para todos os grupos
                     mensagem = " ".join(command_parts[2:])
-                    enviados, falhas = self.broadcast_mensagem(mensagem)
+                    enviados, falhas = await self._em_executor(self.broadcast_mensagem, mensagem)
                     
-                    grupos_ativos = len(self.grupos_manager.get_grupos_ativos())
+                    grupos_ativos = len(await self._em_executor(self.grupos_manager.get_grupos_ativos))
                     
-                    self.bot.send_message(
+                    await self.bot_async.send_message(
                         chat_id, 
                         f"✅ Broadcast concluído: enviado para {enviados} grupos de um total de {grupos_ativos} grupos ativos, {falhas} falhas.",
                         parse_mode='Markdown'
                     )
                         
                 else:
-                    self.bot.send_message(chat_id, "❌ Comando administrativo inválido. Use /admin para ver a ajuda.")
+                    await self.bot_async.send_message(chat_id, "❌ Comando administrativo inválido. Use /admin para ver a ajuda.")
                 
             except Exception as e:
                 logger.error(f"Erro no comando /admin: {str(e)}")
-                self.bot.reply_to(message, "❌ Ocorreu um erro ao processar seu comando. Tente novamente mais tarde.")
+                await self.bot_async.reply_to(message, "❌ Ocorreu um erro ao processar seu comando. Tente novamente mais tarde.")
 
-    def get_grupos(self):
-        """
-        Obtém a lista de todos os grupos
-        
-        Returns:
-            list: Lista de IDs dos grupos
-        """
-        grupos_dict = self.grupos_manager.get_grupos()
-        return list(grupos_dict.keys())
-    
-    def get_grupos_ativos(self):
-        """
-        Obtém a lista de grupos ativos
-        
-        Returns:
-            list: Lista de IDs dos grupos ativos
-        """
-        return self.grupos_manager.get_grupos_ativos()
-
-    def enviar_mensagem(self, chat_id, mensagem):
-        """
-        Envia uma mensagem para um chat
-        
-        Args:
-            chat_id: ID do chat no Telegram
-            mensagem: Texto da mensagem
-        
-        Returns:
-            bool: True se a mensagem foi enviada com sucesso, False caso contrário
-        """
+    async def _processar_update(self, update):
+        """Despacha um update para os handlers"""
+        await self._em_executor(self._registrar_grupo_do_update, update)
         try:
-            self.bot.send_message(chat_id, mensagem, parse_mode='Markdown')
-            return True
+            await self.bot_async.process_new_updates([update])
         except Exception as e:
-            logger.error(f"Erro ao enviar mensagem para {chat_id}: {str(e)}")
-            return False
+            logger.error(f"Erro ao processar o update {update.update_id}: {str(e)}")
 
-    def enviar_arquivo(self, chat_id, arquivo, caption=None):
-        """
-        Envia um arquivo para um chat
-        
-        Args:
-            chat_id: ID do chat no Telegram
-            arquivo: Caminho do arquivo
-            caption: Legenda do arquivo (opcional)
-            
-        Returns:
-            bool: True se o arquivo foi enviado com sucesso, False caso contrário
-        """
+    async def _processar_update_polling(self, update, vagas, concluidos):
         try:
-            # Verificar tamanho do arquivo
-            file_size = os.path.getsize(arquivo)
-            max_size = 40 * 1024 * 1024  # 40MB (limite seguro para o Telegram)
-            
-            if file_size > max_size:
-                # Arquivo muito grande para enviar diretamente
-                size_mb = file_size / (1024 * 1024)
-                mensagem = f"⚠️ *Arquivo muito grande para envio direto* ({size_mb:.1f}MB)\n\n"
-                mensagem += f"O Telegram tem um limite de 50MB para envio de arquivos por bots, e este arquivo excede o limite seguro.\n\n"
-                mensagem += f"*Recomendação:* Use o comando `/estado UF` para solicitar apenas a tabela de um estado específico."
-                
-                self.bot.send_message(
-                    chat_id,
-                    mensagem,
-                    parse_mode='Markdown'
-                )
-                logger.warning(f"Arquivo muito grande para envio ({size_mb:.1f}MB): {arquivo}")
-                return False
-                
-            with open(arquivo, 'rb') as f:
-                self.bot.send_document(
-                    chat_id,
-                    f,
-                    caption=caption,
-                    visible_file_name=os.path.basename(arquivo),
-                    parse_mode='Markdown'
-                )
-            return True
-        except Exception as e:
-            logger.error(f"Erro ao enviar arquivo para {chat_id}: {str(e)}")
-            return False
+            await self._processar_update(update)
+        finally:
+            self.checkpoint.concluido(update.update_id)
+            vagas.release()
+            concluidos.set()
 
-    def broadcast_mensagem(self, mensagem):
+    async def _receber_updates(self):
         """
-        Envia uma mensagem para todos os grupos ativos
+        Busca os updates a partir do checkpoint e processa cada um em uma tarefa
         
-        Args:
-            mensagem: Texto da mensagem
-            
-        Returns:
-            tuple: (total_enviados, total_falhas)
+        O backlog acumulado é lido em lotes de até 100 updates e no máximo
+        max_updates_pendentes são processados ao mesmo tempo. O offset enviado
+        ao Telegram é o do update mais antigo ainda em andamento (os em andamento
+        não são descartados pelo Telegram antes de concluídos), então os lotes
+        repetem os updates já recebidos acima dele, que são ignorados.
         """
-        grupos_ativos = self.grupos_manager.get_grupos_ativos()
-        total = len(grupos_ativos)
-        enviados = 0
-        falhas = 0
-        
-        logger.info(f"Iniciando broadcast para {total} grupos ativos")
+        # getUpdates não funciona enquanto houver um webhook registrado (modo webhook)
+        try:
+            await self.bot_async.delete_webhook()
+        except Exception as e:
+            logger.error(f"Erro ao remover o webhook: {str(e)}")
         
-        for chat_id in grupos_ativos:
+        vagas = asyncio.Semaphore(self.max_updates_pendentes)
+        concluidos = asyncio.Event()
+        intervalo_erro = 0.25
+        self.bot_async._polling = True
+        while self.bot_async._polling:
             try:
-                success = self.enviar_mensagem(chat_id, mensagem)
-                if success:
-                    enviados += 1
-                else:
-                    falhas += 1
+                concluidos.clear()
+                updates = await self.bot_async.get_updates(
+                    offset=self.checkpoint.confirmado, limit=100, timeout=5,
+                    allowed_updates=ATUALIZACOES, request_timeout=20
+                )
+                intervalo_erro = 0.25
+            except asyncio.CancelledError:
+                raise
             except Exception as e:
-                logger.error(f"Erro no broadcast para {chat_id}: {str(e)}")
-                falhas += 1
-        
-        logger.info(f"Broadcast concluído: {enviados} enviados, {falhas} falhas")
-        return enviados, falhas
+                logger.error(f"Erro ao obter updates: {str(e)}")
+                await asyncio.sleep(intervalo_erro)
+                intervalo_erro = min(intervalo_erro * 2, 60)
+                continue
+            
+            novos = [update for update in updates if not self.checkpoint.ja_recebido(update.update_id)]
+            for update in novos:
+                await vagas.acquire()
+                self.checkpoint.recebido(update.update_id)
+                tarefa = asyncio.create_task(self._processar_update_polling(update, vagas, concluidos))
+                self._tarefas_updates.add(tarefa)
+                tarefa.add_done_callback(self._tarefas_updates.discard)
+            self.checkpoint.salvar()
+            
+            if updates and not novos:
+                # O lote só trouxe updates já recebidos (o getUpdates responde na hora):
+                # aguardar a conclusão de algum deles antes de consultar de novo
+                try:
+                    await asyncio.wait_for(concluidos.wait(), timeout=5)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def _fechar_sessao(self):
+        """Fecha a sessão aiohttp compartilhada pelos handlers"""
+        sessao = asyncio_helper.session_manager.session
+        if sessao and not sessao.closed:
+            await sessao.close()
+
+    async def _executar_polling(self):
+        self._loop = asyncio.get_running_loop()
+        self._tarefa_principal = asyncio.current_task()
+        snapshots = asyncio.create_task(self._gravar_rate_limits_periodicamente())
+        try:
+            await self._receber_updates()
+        except asyncio.CancelledError:
+            pass
+        finally:
+            snapshots.cancel()
+            # Aguardar os updates em andamento; os que não terminarem serão recebidos de novo no próximo início
+            if self._tarefas_updates:
+                await asyncio.wait(set(self._tarefas_updates), timeout=10)
+            self.checkpoint.salvar()
+            await self._fechar_sessao()
+
+    async def _executar_webhook(self, servidor, url):
+        self._loop = asyncio.get_running_loop()
+        self._tarefa_principal = asyncio.current_task()
+        snapshots = asyncio.create_task(self._gravar_rate_limits_periodicamente())
+        try:
+            await servidor.iniciar()
+            if url:
+                await self.bot_async.set_webhook(
+                    url=url, secret_token=servidor.secret_token, allowed_updates=ATUALIZACOES,
+                    max_connections=100
+                )
+                logger.info(f"Webhook registrado no Telegram: {url}")
+            # Os updates chegam pelo servidor até o bot ser parado
+            await asyncio.Event().wait()
+        except asyncio.CancelledError:
+            pass
+        finally:
+            snapshots.cancel()
+            await servidor.parar()
+            await self._fechar_sessao()
+
+    def _encerrar(self):
+        for fila in self.filas.values():
+            fila.encerrar()
+        self.grupos_manager.flush()
+        self._salvar_rate_limits()
+
+    def start_polling(self):
+        """Inicia o polling do bot (bloqueia a thread atual rodando o loop de eventos)"""
+        logger.info("Iniciando polling do bot")
+        threading.Thread(target=self.retomar_broadcasts, name="retomar-broadcasts", daemon=True).start()
+        try:
+            asyncio.run(self._executar_polling())
+        except Exception as e:
+            logger.error(f"Erro no polling do bot: {str(e)}")
+            raise
+        finally:
+            self._encerrar()
 
-    def broadcast_arquivo(self, arquivo, caption=None):
+    def start_webhook(self, url=None, secret_token=None, host="0.0.0.0", porta=8443, caminho="/telegram",
+                      capacidade_fila=1000):
         """
-        Envia um arquivo para todos os grupos ativos
+        Recebe os updates por webhook em vez de polling (bloqueia a thread atual)
         
         Args:
-            arquivo: Caminho do arquivo
-            caption: Legenda do arquivo (opcional)
-            
-        Returns:
-            tuple: (total_enviados, total_falhas)
+            url: URL pública do webhook, registrada no Telegram ao iniciar (None = já registrada externamente)
+            secret_token: Valor esperado no cabeçalho X-Telegram-Bot-Api-Secret-Token
+                (gerado ao iniciar se a URL for registrada aqui)
+            host: Endereço em que o servidor HTTP escuta
+            porta: Porta do servidor HTTP
+            caminho: Caminho da rota que recebe os updates
+            capacidade_fila: Updates aguardando processamento (acima disso o Telegram recebe 503 e reenvia)
         """
-        grupos_ativos = self.grupos_manager.get_grupos_ativos()
-        total = len(grupos_ativos)
-        enviados = 0
-        falhas = 0
+        if not secret_token:
+            if not url:
+                raise ValueError("Informe WEBHOOK_SECRET quando o webhook for registrado fora do bot (WEBHOOK_URL vazio)")
+            secret_token = secrets.token_urlsafe(32)
+            if self.estado.compartilhado:
+                # Cada réplica registraria o próprio segredo e recusaria os updates enviados às demais
+                logger.warning("WEBHOOK_SECRET não configurado: com várias réplicas, todas precisam do mesmo segredo")
         
-        logger.info(f"Iniciando broadcast de arquivo para {total} grupos ativos")
-        
-        for chat_id in grupos_ativos:
-            try:
-                success = self.enviar_arquivo(chat_id, arquivo, caption)
-                if success:
-                    enviados += 1
-                else:
-                    falhas += 1
-            except Exception as e:
-                logger.error(f"Erro no broadcast de arquivo para {chat_id}: {str(e)}")
-                falhas += 1
-        
-        logger.info(f"Broadcast de arquivo concluído: {enviados} enviados, {falhas} falhas")
-        return enviados, falhas
-
-    def start_polling(self):
-        """Inicia o polling do bot"""
-        logger.info("Iniciando polling do bot")
+        servidor = ServidorWebhook(
+            self._processar_update, secret_token, host=host, porta=porta, caminho=caminho,
+            capacidade_fila=capacidade_fila, workers=self.max_updates_pendentes
+        )
+        logger.info(f"Iniciando o bot em modo webhook em {host}:{porta}{caminho}")
+        threading.Thread(target=self.retomar_broadcasts, name="retomar-broadcasts", daemon=True).start()
         try:
-            self.bot.infinity_polling(timeout=20, long_polling_timeout=5)
+            asyncio.run(self._executar_webhook(servidor, url))
         except Exception as e:
-            logger.error(f"Erro no polling do bot: {str(e)}")
+            logger.error(f"Erro no webhook do bot: {str(e)}")
             raise
+        finally:
+            self._encerrar()
 
     def stop_polling(self):
-        """Para o polling do bot"""
+        """Para o polling (ou o servidor de webhook) do bot"""
         logger.info("Parando polling do bot")
-        self.bot.stop_polling()
\ No newline at end of file
+        self.bot_async._polling = False
+        if self._loop and self._tarefa_principal:
+            self._loop.call_soon_threadsafe(self._tarefa_principal.cancel)
\ No newline at end of file
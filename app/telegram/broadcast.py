@@ -0,0 +1,218 @@
+"""
+Envio em massa para os grupos respeitando os limites da API do Telegram
+
+O Telegram aceita cerca de 30 mensagens por segundo por bot e 20 por minuto
+em cada grupo. O motor distribui os envios entre várias threads, limita a
+vazão com token buckets (global e por chat), obedece ao retry_after das
+respostas 429 e repete erros transitórios com backoff.
+"""
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+from telebot.apihelper import ApiTelegramException
+
+logger = logging.getLogger(__name__)
+
+ENVIADO = "enviado"
+FALHA = "falha"
+FALHA_PERMANENTE = "falha_permanente"
+
+
+class LimitadorTaxa:
+    """
+    Token bucket: até `capacidade` envios imediatos e depois `taxa` por segundo
+    """
+
+    def __init__(self, taxa, capacidade=None):
+        self.taxa = taxa
+        self.capacidade = capacidade or max(1, taxa)
+        self._tokens = self.capacidade
+        self._atualizado = time.monotonic()
+        self._pausado_ate = 0
+        self._lock = threading.Lock()
+
+    def _reservar(self):
+        """Consome um token e retorna 0, ou retorna quanto esperar antes de tentar de novo"""
+        with self._lock:
+            agora = time.monotonic()
+            if agora < self._pausado_ate:
+                return self._pausado_ate - agora
+
+            self._tokens = min(self.capacidade, self._tokens + (agora - self._atualizado) * self.taxa)
+            self._atualizado = agora
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0
+            return (1 - self._tokens) / self.taxa
+
+    def aguardar(self):
+        """Bloqueia até haver um token disponível"""
+        while True:
+            espera = self._reservar()
+            if not espera:
+                return
+            time.sleep(espera)
+
+    def pausar(self, segundos):
+        """Suspende todos os envios (ex: retry_after de um 429)"""
+        with self._lock:
+            self._pausado_ate = max(self._pausado_ate, time.monotonic() + segundos)
+            self._tokens = 0
+            self._atualizado = self._pausado_ate
+
+
+def _classificar_erro(erro):
+    """
+    Returns:
+        tuple: (tipo, espera) com tipo 'limite' (429), 'transitorio' ou 'permanente'
+    """
+    if isinstance(erro, ApiTelegramException):
+        if erro.error_code == 429:
+            parametros = (erro.result_json or {}).get('parameters') or {}
+            return 'limite', parametros.get('retry_after', 5)
+        if erro.error_code >= 500:
+            return 'transitorio', None
+        # 400 (chat não encontrado, grupo migrado) e 403 (bot removido/bloqueado) não mudam com novas tentativas
+        return 'permanente', None
+    if isinstance(erro, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)):
+        return 'transitorio', None
+    return 'permanente', None
+
+
+class MotorBroadcast:
+    """
+    Envia para muitos chats em paralelo, sem exceder os limites do Telegram
+    """
+
+    def __init__(self, max_workers=8, taxa_global=30, taxa_por_chat=20 / 60, rajada_por_chat=3,
+                 max_tentativas=4, intervalo_progresso=5):
+        """
+        Args:
+            max_workers: Envios simultâneos
+            taxa_global: Mensagens por segundo somando todos os chats
+            taxa_por_chat: Mensagens por segundo em um mesmo chat
+            rajada_por_chat: Mensagens seguidas permitidas em um chat antes de aplicar a taxa
+            max_tentativas: Tentativas por chat em erros transitórios e 429
+            intervalo_progresso: Segundos entre os registros de progresso no log
+        """
+        self.max_workers = max_workers
+        self.taxa_por_chat = taxa_por_chat
+        self.rajada_por_chat = rajada_por_chat
+        self.max_tentativas = max_tentativas
+        self.intervalo_progresso = intervalo_progresso
+        self.limitador_global = LimitadorTaxa(taxa_global)
+        self._limitadores_chat = {}
+        self._lock = threading.Lock()
+
+    def _limitador_chat(self, chat_id):
+        with self._lock:
+            limitador = self._limitadores_chat.get(chat_id)
+            if limitador is None:
+                limitador = LimitadorTaxa(self.taxa_por_chat, self.rajada_por_chat)
+                self._limitadores_chat[chat_id] = limitador
+            return limitador
+
+    def enviar(self, chat_id, funcao):
+        """
+        Executa um envio para um chat, com limites de taxa e novas tentativas
+
+        Args:
+            chat_id: ID do chat
+            funcao: Callable que recebe o chat_id e faz a chamada à API (deve lançar exceção em caso de erro)
+
+        Returns:
+            str: ENVIADO, FALHA ou FALHA_PERMANENTE
+        """
+        for tentativa in range(1, self.max_tentativas + 1):
+            self._limitador_chat(chat_id).aguardar()
+            self.limitador_global.aguardar()
+            try:
+                funcao(chat_id)
+                return ENVIADO
+            except Exception as e:
+                tipo, espera = _classificar_erro(e)
+                if tipo == 'permanente':
+                    logger.error(f"Falha permanente no envio para {chat_id}: {str(e)}")
+                    return FALHA_PERMANENTE
+                if tentativa == self.max_tentativas:
+                    logger.error(f"Envio para {chat_id} falhou após {tentativa} tentativas: {str(e)}")
+                    return FALHA
+
+                if tipo == 'limite':
+                    # Limite de flood vale para o bot inteiro: suspender todos os envios
+                    logger.warning(f"Limite do Telegram atingido (429), pausando envios por {espera}s")
+                    self.limitador_global.pausar(espera)
+                else:
+                    espera = min(2 ** tentativa, 30) * random.uniform(0.8, 1.2)
+                    logger.warning(f"Erro transitório no envio para {chat_id}, nova tentativa em {espera:.1f}s: {str(e)}")
+                    time.sleep(espera)
+        return FALHA
+
+    def processar(self, chat_id, funcao, antes_de_enviar=None, apos_enviar=None):
+        """
+        Envia para um chat com os ganchos de controle do envio
+
+        Args:
+            antes_de_enviar: Callable(chat_id) -> bool; se retornar False o chat é ignorado
+            apos_enviar: Callable(chat_id, status) chamado com o resultado do envio
+
+        Returns:
+            str: Status do envio ou None se o chat foi ignorado
+        """
+        if antes_de_enviar and not antes_de_enviar(chat_id):
+            return None
+        status = self.enviar(chat_id, funcao)
+        if apos_enviar:
+            apos_enviar(chat_id, status)
+        return status
+
+    def executar(self, destinatarios, funcao, descricao="broadcast", antes_de_enviar=None, apos_enviar=None):
+        """
+        Envia para todos os destinatários em paralelo
+
+        Args:
+            destinatarios: IDs dos chats
+            funcao: Callable que recebe o chat_id e faz o envio
+            descricao: Nome do envio nos registros de progresso
+            antes_de_enviar: Callable(chat_id) -> bool chamado antes do envio (False ignora o chat)
+            apos_enviar: Callable(chat_id, status) chamado com o resultado de cada envio
+
+        Returns:
+            dict: Status final de cada chat enviado (ENVIADO, FALHA ou FALHA_PERMANENTE)
+        """
+        destinatarios = list(destinatarios)
+        total = len(destinatarios)
+        resultados = {}
+        inicio = time.monotonic()
+        ultimo_registro = inicio
+
+        logger.info(f"Iniciando {descricao} para {total} chats ({self.max_workers} envios simultâneos)")
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futuros = {
+                executor.submit(self.processar, chat_id, funcao, antes_de_enviar, apos_enviar): chat_id
+                for chat_id in destinatarios
+            }
+            for futuro in as_completed(futuros):
+                status = futuro.result()
+                if status is not None:
+                    resultados[futuros[futuro]] = status
+
+                agora = time.monotonic()
+                if agora - ultimo_registro >= self.intervalo_progresso:
+                    ultimo_registro = agora
+                    enviados = sum(1 for status in resultados.values() if status == ENVIADO)
+                    logger.info(
+                        f"Progresso do {descricao}: {len(resultados)}/{total} processados, {enviados} enviados "
+                        f"({len(resultados) / (agora - inicio):.1f} chats/s)"
+                    )
+
+        enviados = sum(1 for status in resultados.values() if status == ENVIADO)
+        logger.info(
+            f"{descricao.capitalize()} concluído em {time.monotonic() - inicio:.1f}s: "
+            f"{enviados} enviados, {len(resultados) - enviados} falhas"
+        )
+        return resultados
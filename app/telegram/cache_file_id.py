@@ -0,0 +1,145 @@
+"""
+Cache dos file_id dos documentos já enviados ao Telegram
+
+Depois do primeiro upload de um arquivo, o Telegram devolve um file_id que
+pode ser usado para reenviar o mesmo documento sem transferir os bytes de
+novo. As entradas são chaveadas por (versão, artefato, sha256) e descartadas
+quando a versão da tabela muda.
+
+Com um backend de estado compartilhado (SQLite), as entradas ficam no banco
+e o upload feito por uma réplica é reaproveitado pelas demais. No arquivo
+JSON, compartilhado entre o bot e a automação, cada processo recarrega o
+arquivo quando outro o altera e grava sob um lock de arquivo, aplicando a
+sua alteração sobre o conteúdo atual.
+"""
+import json
+import logging
+import os
+import threading
+
+from app.core.artefatos import sha256_arquivo
+from app.utils.estado import trava_arquivo
+
+logger = logging.getLogger(__name__)
+
+
+class CacheFileId:
+    """
+    Cache persistente de file_id por versão da tabela
+    """
+
+    def __init__(self, arquivo="data/telegram_file_ids.json", estado=None):
+        """
+        Args:
+            arquivo: Arquivo JSON onde o cache é persistido
+            estado: Backend de estado; se for compartilhado, as entradas ficam nele em vez do arquivo
+        """
+        self.arquivo = arquivo
+        self.estado = estado if estado is not None and estado.compartilhado else None
+        self._lock = threading.Lock()
+        self._hashes = {}
+        self._versao, self._entradas = None, {}
+        self._marcador = None
+        self._recarregar_se_alterado()
+
+    def _marcador_arquivo(self):
+        try:
+            return os.stat(self.arquivo).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _recarregar_se_alterado(self):
+        """Relê o arquivo se outro processo o gravou (chamado com o lock)"""
+        marcador = self._marcador_arquivo()
+        if marcador == self._marcador:
+            return
+        try:
+            with open(self.arquivo, 'r', encoding='utf-8') as f:
+                dados = json.load(f)
+            self._versao, self._entradas = dados.get('versao'), dados.get('arquivos', {})
+        except (FileNotFoundError, ValueError):
+            self._versao, self._entradas = None, {}
+        self._marcador = marcador
+
+    def _alterar(self, alteracao):
+        """
+        Aplica `alteracao` sobre o conteúdo atual do arquivo e grava (chamado com o lock)
+
+        Args:
+            alteracao: Função sem argumentos que altera _versao/_entradas e retorna True se algo mudou
+        """
+        try:
+            with trava_arquivo(self.arquivo):
+                self._recarregar_se_alterado()
+                if not alteracao():
+                    return
+                temp_file = f"{self.arquivo}.tmp"
+                with open(temp_file, 'w', encoding='utf-8') as f:
+                    json.dump({'versao': self._versao, 'arquivos': self._entradas}, f, indent=2)
+                os.replace(temp_file, self.arquivo)
+                self._marcador = self._marcador_arquivo()
+        except OSError as e:
+            logger.error(f"Erro ao salvar cache de file_id: {str(e)}")
+
+    @staticmethod
+    def _chave(artefato, sha256):
+        return f"{artefato}:{sha256}"
+
+    def hash_arquivo(self, caminho):
+        """
+        SHA-256 do arquivo, calculado uma vez enquanto o arquivo não for alterado
+        """
+        stat = os.stat(caminho)
+        chave = (os.path.abspath(caminho), stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            if chave in self._hashes:
+                return self._hashes[chave]
+
+        sha256 = sha256_arquivo(caminho)
+        with self._lock:
+            self._hashes[chave] = sha256
+        return sha256
+
+    def obter(self, versao, artefato, sha256):
+        """
+        Returns:
+            str: file_id do documento já enviado ou None
+        """
+        if self.estado:
+            return self.estado.obter_file_id(versao, self._chave(artefato, sha256))
+        with self._lock:
+            self._recarregar_se_alterado()
+            if versao != self._versao:
+                return None
+            return self._entradas.get(self._chave(artefato, sha256))
+
+    def registrar(self, versao, artefato, sha256, file_id):
+        """
+        Guarda o file_id de um upload; uma versão nova descarta as entradas da anterior
+        """
+        if self.estado:
+            self.estado.registrar_file_id(versao, self._chave(artefato, sha256), file_id)
+            return
+        def alteracao():
+            if versao != self._versao:
+                if self._entradas:
+                    logger.info(f"Versão {versao} diferente da do cache ({self._versao}), descartando file_ids antigos")
+                self._versao = versao
+                self._entradas = {}
+            self._entradas[self._chave(artefato, sha256)] = file_id
+            return True
+
+        with self._lock:
+            self._alterar(alteracao)
+
+    def descartar(self, versao, artefato, sha256):
+        """
+        Remove um file_id recusado pelo Telegram
+        """
+        if self.estado:
+            self.estado.descartar_file_id(versao, self._chave(artefato, sha256))
+            return
+        with self._lock:
+            self._alterar(
+                lambda: versao == self._versao and self._entradas.pop(self._chave(artefato, sha256), None) is not None
+            )
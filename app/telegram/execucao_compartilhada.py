@@ -0,0 +1,52 @@
+"""
+Execução compartilhada de trabalhos idênticos simultâneos (single-flight)
+
+Quando vários pedidos precisam do mesmo resultado ao mesmo tempo (ex: vários
+grupos pedindo /tabela SP logo após uma nova versão), apenas o primeiro
+executa o trabalho; os demais aguardam e recebem o mesmo resultado.
+"""
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class ExecucaoCompartilhada:
+    """
+    Coalesce execuções concorrentes com a mesma chave em uma só
+    """
+
+    def __init__(self):
+        self._em_andamento = {}
+
+    async def executar(self, chave, funcao):
+        """
+        Executa `funcao` ou aguarda a execução já em andamento com a mesma chave
+
+        Se a execução compartilhada falhar, quem estava aguardando tenta de novo
+        com a própria `funcao` (um deles executa e os outros aguardam), para que
+        o erro de um pedido (ex: chat que bloqueou o bot) não se propague aos demais.
+
+        Args:
+            chave: Identificador do trabalho (ex: ('upload', versão, UF))
+            funcao: Callable sem argumentos que retorna a corrotina do trabalho
+
+        Returns:
+            tuple: (resultado, compartilhado) com compartilhado=True quando o
+            resultado veio da execução de outro pedido
+        """
+        tarefa = self._em_andamento.get(chave)
+        if tarefa is None:
+            tarefa = asyncio.ensure_future(funcao())
+            self._em_andamento[chave] = tarefa
+            tarefa.add_done_callback(lambda _: self._em_andamento.pop(chave, None))
+            # shield: cancelar quem iniciou não cancela o trabalho dos que aguardam
+            return await asyncio.shield(tarefa), False
+
+        try:
+            return await asyncio.shield(tarefa), True
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Execução compartilhada {chave} falhou ({str(e)}), executando novamente")
+            return await self.executar(chave, funcao)
@@ -0,0 +1,184 @@
+"""
+Fila persistente de broadcasts com o status de cada destinatário
+
+Cada broadcast é um job gravado em SQLite (data/broadcasts.db) com uma linha
+por chat. Se o processo cair no meio do envio, a próxima execução retoma o
+job apenas para os chats que ainda não receberam.
+
+Status de cada envio:
+    pendente          ainda não enviado
+    enviando          envio em andamento
+    enviado           entregue
+    falha             erro transitório; tentado de novo ao retomar o job
+    falha_permanente  chat inexistente, bot removido etc.; não é tentado de novo
+    incerto           o processo caiu durante o envio; não é reenviado para evitar duplicidade
+"""
+import datetime
+import json
+import os
+import sqlite3
+import threading
+
+from app.telegram.broadcast import FALHA
+
+PENDENTE = "pendente"
+ENVIANDO = "enviando"
+INCERTO = "incerto"
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    chave TEXT UNIQUE NOT NULL,
+    tipo TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    criado_em TEXT NOT NULL,
+    concluido_em TEXT
+);
+CREATE TABLE IF NOT EXISTS envios (
+    job_id INTEGER NOT NULL REFERENCES jobs(id),
+    chat_id INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    tentativas INTEGER NOT NULL DEFAULT 0,
+    atualizado_em TEXT NOT NULL,
+    PRIMARY KEY (job_id, chat_id)
+);
+CREATE INDEX IF NOT EXISTS envios_status ON envios (job_id, status);
+"""
+
+
+def _agora():
+    return datetime.datetime.now().isoformat()
+
+
+class FilaBroadcast:
+    """
+    Jobs de broadcast persistidos em SQLite
+    """
+
+    def __init__(self, arquivo="data/broadcasts.db", max_tentativas=3):
+        """
+        Args:
+            arquivo: Banco SQLite da fila
+            max_tentativas: Execuções em que um chat com falha transitória é tentado de novo
+        """
+        os.makedirs(os.path.dirname(arquivo) or ".", exist_ok=True)
+        self.arquivo = arquivo
+        self.max_tentativas = max_tentativas
+        self._lock = threading.Lock()
+        self._conexao = sqlite3.connect(arquivo, check_same_thread=False, isolation_level=None)
+        self._conexao.execute("PRAGMA journal_mode=WAL")
+        self._conexao.executescript(_ESQUEMA)
+
+    def _executar(self, sql, parametros=()):
+        with self._lock:
+            return self._conexao.execute(sql, parametros).fetchall()
+
+    def recuperar_interrompidos(self, job_id):
+        """
+        Marca como incertos os envios do job que ficaram em andamento (podem ter sido entregues)
+
+        Deve ser chamado só por quem detém a lease do job ao retomá-lo: com a
+        lease, nenhum outro processo está enviando, e todo envio em andamento
+        foi interrompido por uma queda.
+
+        Returns:
+            int: Envios marcados como incertos
+        """
+        with self._lock:
+            return self._conexao.execute(
+                "UPDATE envios SET status = ?, atualizado_em = ? WHERE job_id = ? AND status = ?",
+                (INCERTO, _agora(), job_id, ENVIANDO)
+            ).rowcount
+
+    def criar_job(self, chave, tipo, payload, destinatarios):
+        """
+        Cria o job ou, se já existir um com a mesma chave, inclui os destinatários novos
+
+        Args:
+            chave: Identificador do broadcast (ex: "25.2.A:arquivo"); a mesma chave nunca envia duas vezes ao mesmo chat
+            tipo: Tipo do envio ('mensagem' ou 'arquivo')
+            payload: Dados necessários para refazer o envio (serializáveis em JSON)
+            destinatarios: IDs dos chats
+
+        Returns:
+            int: ID do job
+        """
+        agora = _agora()
+        with self._lock:
+            self._conexao.execute("BEGIN IMMEDIATE")
+            try:
+                self._conexao.execute(
+                    "INSERT OR IGNORE INTO jobs (chave, tipo, payload, criado_em) VALUES (?, ?, ?, ?)",
+                    (chave, tipo, json.dumps(payload), agora)
+                )
+                job_id = self._conexao.execute("SELECT id FROM jobs WHERE chave = ?", (chave,)).fetchone()[0]
+                novos = self._conexao.executemany(
+                    "INSERT OR IGNORE INTO envios (job_id, chat_id, status, atualizado_em) VALUES (?, ?, ?, ?)",
+                    [(job_id, int(chat_id), PENDENTE, agora) for chat_id in destinatarios]
+                ).rowcount
+                if novos > 0:
+                    self._conexao.execute("UPDATE jobs SET concluido_em = NULL WHERE id = ?", (job_id,))
+                self._conexao.execute("COMMIT")
+            except Exception:
+                self._conexao.execute("ROLLBACK")
+                raise
+        return job_id
+
+    def job(self, job_id):
+        linhas = self._executar("SELECT id, chave, tipo, payload FROM jobs WHERE id = ?", (job_id,))
+        if not linhas:
+            return None
+        job_id, chave, tipo, payload = linhas[0]
+        return {'id': job_id, 'chave': chave, 'tipo': tipo, 'payload': json.loads(payload)}
+
+    def jobs_inacabados(self):
+        """
+        Returns:
+            list: IDs dos jobs com destinatários ainda por enviar
+        """
+        return [linha[0] for linha in self._executar("SELECT id FROM jobs WHERE concluido_em IS NULL ORDER BY id")]
+
+    def pendentes(self, job_id):
+        """
+        Returns:
+            list: Chats a enviar: pendentes e falhas transitórias que ainda podem ser tentadas
+        """
+        linhas = self._executar(
+            "SELECT chat_id FROM envios WHERE job_id = ? AND (status = ? OR (status = ? AND tentativas < ?))",
+            (job_id, PENDENTE, FALHA, self.max_tentativas)
+        )
+        return [linha[0] for linha in linhas]
+
+    def iniciar_envio(self, job_id, chat_id):
+        """
+        Marca o envio como em andamento antes da chamada à API
+
+        Returns:
+            bool: False se outro worker já assumiu o envio ou ele não está mais pendente
+        """
+        with self._lock:
+            cursor = self._conexao.execute(
+                "UPDATE envios SET status = ?, tentativas = tentativas + 1, atualizado_em = ? "
+                "WHERE job_id = ? AND chat_id = ? AND (status = ? OR (status = ? AND tentativas < ?))",
+                (ENVIANDO, _agora(), job_id, chat_id, PENDENTE, FALHA, self.max_tentativas)
+            )
+            return cursor.rowcount == 1
+
+    def concluir_envio(self, job_id, chat_id, status):
+        self._executar(
+            "UPDATE envios SET status = ?, atualizado_em = ? WHERE job_id = ? AND chat_id = ?",
+            (status, _agora(), job_id, chat_id)
+        )
+
+    def finalizar_job(self, job_id):
+        """Marca o job como concluído quando não há mais nada a tentar"""
+        if not self.pendentes(job_id):
+            self._executar("UPDATE jobs SET concluido_em = ? WHERE id = ?", (_agora(), job_id))
+
+    def resumo(self, job_id):
+        """
+        Returns:
+            dict: Quantidade de chats em cada status
+        """
+        linhas = self._executar("SELECT status, COUNT(*) FROM envios WHERE job_id = ? GROUP BY status", (job_id,))
+        return dict(linhas)
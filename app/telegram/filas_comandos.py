@@ -0,0 +1,102 @@
+"""
+Filas de execução dos comandos do bot por classe de custo
+
+Cada classe de comando tem um número máximo de execuções simultâneas, uma
+fila de espera limitada e um executor de threads próprio para o trabalho
+bloqueante. Assim, uma rajada de /tabela (extração e upload) ocupa apenas a
+fila pesada e os comandos de texto continuam respondendo imediatamente.
+"""
+import asyncio
+import collections
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+INSTANTANEO = "instantaneo"
+PESADO = "pesado"
+ADMIN = "admin"
+
+# Fila em que o handler atual está rodando (usada para escolher o executor)
+fila_atual = contextvars.ContextVar("fila_atual", default=None)
+
+
+class FilaCheia(Exception):
+    """A fila de espera da classe de comando atingiu a capacidade"""
+
+
+class FilaComandos:
+    """
+    Limita as execuções simultâneas de uma classe de comandos, em ordem de chegada
+    """
+
+    def __init__(self, nome, concorrencia, capacidade=None, workers_io=None):
+        """
+        Args:
+            nome: Nome da classe de comandos
+            concorrencia: Execuções simultâneas
+            capacidade: Pedidos aguardando além das execuções em andamento (None = ilimitado)
+            workers_io: Threads do executor de trabalho bloqueante (padrão: igual à concorrência)
+        """
+        self.nome = nome
+        self.concorrencia = concorrencia
+        self.capacidade = capacidade
+        self.executor = ThreadPoolExecutor(max_workers=workers_io or concorrencia, thread_name_prefix=f"bot-{nome}")
+        self._ativos = 0
+        self._espera = collections.deque()
+
+    @property
+    def ativos(self):
+        return self._ativos
+
+    @property
+    def aguardando(self):
+        return len(self._espera)
+
+    async def executar(self, funcao, ao_enfileirar=None):
+        """
+        Executa a corrotina criada por `funcao` quando houver vaga
+
+        Args:
+            funcao: Callable sem argumentos que retorna a corrotina do comando
+            ao_enfileirar: Corrotina chamada com a posição na fila quando o pedido precisa esperar
+
+        Raises:
+            FilaCheia: Se a fila de espera estiver cheia
+        """
+        if self._ativos < self.concorrencia and not self._espera:
+            self._ativos += 1
+        else:
+            if self.capacidade is not None and len(self._espera) >= self.capacidade:
+                raise FilaCheia(f"Fila {self.nome} cheia ({len(self._espera)} pedidos aguardando)")
+
+            vez = asyncio.get_running_loop().create_future()
+            self._espera.append(vez)
+            if ao_enfileirar:
+                await ao_enfileirar(len(self._espera))
+            try:
+                await vez
+            except asyncio.CancelledError:
+                if vez in self._espera:
+                    self._espera.remove(vez)
+                elif vez.done() and not vez.cancelled():
+                    # A vaga já tinha sido passada para este pedido
+                    self._liberar()
+                raise
+
+        token = fila_atual.set(self)
+        try:
+            return await funcao()
+        finally:
+            fila_atual.reset(token)
+            self._liberar()
+
+    def _liberar(self):
+        """Passa a vaga para o próximo da fila ou a devolve"""
+        while self._espera:
+            vez = self._espera.popleft()
+            if not vez.done():
+                vez.set_result(None)
+                return
+        self._ativos -= 1
+
+    def encerrar(self):
+        self.executor.shutdown(wait=False)
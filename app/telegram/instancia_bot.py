@@ -1,14 +1,61 @@
 """
 Instância singleton do bot do Telegram
 """
+from app.telegram.admissao import ControleAdmissao, ler_custos
 from app.telegram.bot import TelegramBot
-from app.utils.config import TELEGRAM_TOKEN, GRUPOS_FILE
+from app.telegram.notificador import NotificadorTelegram
+from app.utils.estado import criar_estado
+from app.utils.config import (
+    TELEGRAM_TOKEN, GRUPOS_FILE, OUTPUT_FILE, ARTIFACT_CACHE_DIR, FILE_ID_CACHE_FILE, TELEGRAM_OFFSET_FILE,
+    BROADCAST_WORKERS, BROADCAST_RATE, BROADCAST_DB, TELEGRAM_STORAGE_CHAT_ID, TELEGRAM_POOL_SIZE,
+    HEAVY_COMMAND_WORKERS, HEAVY_COMMAND_QUEUE, COMMAND_COSTS,
+    ADMISSION_USER_BUDGET, ADMISSION_CHAT_BUDGET, ADMISSION_GLOBAL_BUDGET, ADMISSION_MAX_WAIT,
+    BLACKLIST_FILE, RATE_LIMITS_FILE, STATE_BACKEND, STATE_DB, RATE_LIMIT_TTL, RATE_LIMIT_MAX_USERS, REPLICA_ID,
+    VERSION_FILE
+)
 
 _instancia_bot = None
+_instancia_notificador = None
+_instancia_estado = None
+
+def obter_estado():
+    """Obter ou criar o backend de estado compartilhado pelo bot, o notificador e o agendador"""
+    global _instancia_estado
+    if _instancia_estado is None:
+        _instancia_estado = criar_estado(STATE_BACKEND, GRUPOS_FILE, BLACKLIST_FILE, RATE_LIMITS_FILE, STATE_DB)
+    return _instancia_estado
 
 def obter_instancia_bot():
     """Obter ou criar a instância singleton do bot"""
     global _instancia_bot
     if _instancia_bot is None:
-        _instancia_bot = TelegramBot(TELEGRAM_TOKEN, GRUPOS_FILE)
+        _instancia_bot = TelegramBot(
+            TELEGRAM_TOKEN, GRUPOS_FILE, OUTPUT_FILE, ARTIFACT_CACHE_DIR, FILE_ID_CACHE_FILE,
+            broadcast_workers=BROADCAST_WORKERS, broadcast_taxa=BROADCAST_RATE, broadcast_db=BROADCAST_DB,
+            storage_chat_id=TELEGRAM_STORAGE_CHAT_ID, pool_conexoes=TELEGRAM_POOL_SIZE,
+            workers_pesados=HEAVY_COMMAND_WORKERS, fila_pesados=HEAVY_COMMAND_QUEUE,
+            estado=obter_estado(), replica=REPLICA_ID, rate_limit_ttl=RATE_LIMIT_TTL, rate_limit_max_usuarios=RATE_LIMIT_MAX_USERS,
+            admissao=ControleAdmissao(
+                ler_custos(COMMAND_COSTS), ADMISSION_USER_BUDGET, ADMISSION_CHAT_BUDGET,
+                ADMISSION_GLOBAL_BUDGET, ADMISSION_MAX_WAIT
+            ),
+            offset_file=TELEGRAM_OFFSET_FILE, version_file=VERSION_FILE
+        )
     return _instancia_bot
+
+def obter_notificador():
+    """
+    Obter o cliente de envio: o bot já em execução neste processo ou um
+    notificador sem handlers nem polling
+    """
+    global _instancia_notificador
+    if _instancia_bot is not None:
+        return _instancia_bot
+    if _instancia_notificador is None:
+        _instancia_notificador = NotificadorTelegram(
+            TELEGRAM_TOKEN, GRUPOS_FILE, FILE_ID_CACHE_FILE,
+            broadcast_workers=BROADCAST_WORKERS, broadcast_taxa=BROADCAST_RATE, broadcast_db=BROADCAST_DB,
+            storage_chat_id=TELEGRAM_STORAGE_CHAT_ID, estado=obter_estado(), replica=REPLICA_ID,
+            version_file=VERSION_FILE
+        )
+    return _instancia_notificador
@@ -0,0 +1,319 @@
+"""
+Limite de comandos por usuário (proteção contra spam)
+
+Cada usuário tem um registro compacto (__slots__) com contadores de janela
+deslizante por minuto e por hora: a contagem estimada é a da janela atual
+mais a fração ainda válida da janela anterior, sem guardar um timestamp por
+comando. Os registros ficam em partições com locks próprios, ordenados pelo
+último acesso, e os que ficam ociosos além do TTL são descartados. O estado
+pode ser exportado/restaurado (snapshot) para sobreviver a reinícios.
+
+LimitadorCompartilhado aplica as mesmas regras com os contadores no backend
+de estado compartilhado (SQLite), para que várias réplicas do bot contem os
+comandos de um usuário juntas.
+"""
+import collections
+import threading
+import time
+
+COOLDOWN = "COOLDOWN"
+RATE_LIMITED_MINUTE = "RATE_LIMITED_MINUTE"
+RATE_LIMITED_HOUR = "RATE_LIMITED_HOUR"
+BLACKLISTED = "BLACKLISTED"
+
+
+class _Janela:
+    """Contador de janela deslizante (janela atual + anterior)"""
+    __slots__ = ('inicio', 'atual', 'anterior')
+
+    def __init__(self, inicio=0, atual=0, anterior=0):
+        self.inicio = inicio
+        self.atual = atual
+        self.anterior = anterior
+
+    def avancar(self, agora, duracao):
+        """Move a janela para o período de `agora`"""
+        inicio = int(agora // duracao) * duracao
+        if inicio == self.inicio:
+            return
+        self.anterior = self.atual if inicio - self.inicio == duracao else 0
+        self.atual = 0
+        self.inicio = inicio
+
+    def estimar(self, agora, duracao):
+        """Comandos estimados nos últimos `duracao` segundos"""
+        peso = 1 - (agora - self.inicio) / duracao
+        return self.atual + self.anterior * max(peso, 0)
+
+
+class RegistroUsuario:
+    """Contadores de um usuário"""
+    __slots__ = ('ultimo_comando', 'total', 'acesso', 'minuto', 'hora')
+
+    def __init__(self):
+        self.ultimo_comando = 0
+        self.total = 0
+        self.acesso = 0
+        self.minuto = _Janela()
+        self.hora = _Janela()
+
+
+def _exportar(r):
+    """Contadores de um registro em formato serializável em JSON"""
+    return {
+        'last_command': r.ultimo_comando,
+        'command_count': r.total,
+        'last_seen': r.acesso,
+        'minute': [r.minuto.inicio, r.minuto.atual, r.minuto.anterior],
+        'hour': [r.hora.inicio, r.hora.atual, r.hora.anterior]
+    }
+
+
+def _importar(valores):
+    """Registro a partir do resultado de _exportar() (ou do formato antigo, sem janelas)"""
+    registro = RegistroUsuario()
+    registro.ultimo_comando = valores.get('last_command', 0)
+    registro.total = valores.get('command_count', 0)
+    registro.acesso = valores.get('last_seen', registro.ultimo_comando)
+    if 'minute' in valores:
+        registro.minuto = _Janela(*valores['minute'])
+        registro.hora = _Janela(*valores['hour'])
+    return registro
+
+
+class LimitadorComandos:
+    """
+    Cooldown, limite por minuto e por hora e detecção de spam para a blacklist
+    """
+
+    def __init__(self, cooldown=3, max_minuto=10, max_hora=50, limite_blacklist=20,
+                 ttl=7200, max_usuarios=100000, particoes=16):
+        """
+        Args:
+            cooldown: Tempo mínimo, em segundos, entre comandos
+            max_minuto: Máximo de comandos por minuto
+            max_hora: Máximo de comandos por hora
+            limite_blacklist: Tentativas em 1 minuto que levam à blacklist
+            ttl: Segundos sem comandos após os quais o registro do usuário é descartado
+            max_usuarios: Máximo de registros em memória (os mais antigos são descartados)
+            particoes: Número de partições (cada uma com seu lock)
+        """
+        self.cooldown = cooldown
+        self.max_minuto = max_minuto
+        self.max_hora = max_hora
+        self.limite_blacklist = limite_blacklist
+        self.ttl = ttl
+        self._max_por_particao = max(1, max_usuarios // particoes)
+        self._particoes = [collections.OrderedDict() for _ in range(particoes)]
+        self._locks = [threading.Lock() for _ in range(particoes)]
+
+    def _particao(self, user_id):
+        indice = hash(user_id) % len(self._particoes)
+        return self._particoes[indice], self._locks[indice]
+
+    def _expirar(self, registros, agora):
+        """Descarta os registros ociosos (os mais antigos ficam no início)"""
+        while registros:
+            registro = next(iter(registros.values()))
+            if agora - registro.acesso < self.ttl and len(registros) <= self._max_por_particao:
+                break
+            registros.popitem(last=False)
+
+    def __len__(self):
+        return sum(len(registros) for registros in self._particoes)
+
+    def verificar(self, user_id, agora=None):
+        """
+        Registra a tentativa de comando e verifica os limites
+
+        Args:
+            user_id: ID do usuário
+
+        Returns:
+            tuple: (is_limited, reason, remaining_time); reason BLACKLISTED indica
+            que o usuário excedeu limite_blacklist e deve ser bloqueado
+        """
+        user_id = str(user_id)
+        registros, lock = self._particao(user_id)
+
+        with lock:
+            # Horário lido dentro do lock para que os comandos fiquem em ordem
+            agora = time.time() if agora is None else agora
+            registro = registros.get(user_id)
+            if registro is None:
+                registro = registros[user_id] = RegistroUsuario()
+            else:
+                registros.move_to_end(user_id)
+            # Acesso atualizado antes da expiração, que descartaria um registro novo (acesso 0)
+            registro.acesso = agora
+            self._expirar(registros, agora)
+            return self._aplicar(registro, agora)
+
+    def _aplicar(self, registro, agora):
+        """Conta a tentativa no registro e aplica os limites (ver verificar())"""
+        registro.acesso = agora
+
+        # Verificar cooldown entre comandos
+        desde_ultimo = agora - registro.ultimo_comando
+        if desde_ultimo < self.cooldown:
+            return True, COOLDOWN, self.cooldown - desde_ultimo
+
+        # Verificar limite por minuto (tentativas recusadas também contam)
+        registro.minuto.avancar(agora, 60)
+        registro.minuto.atual += 1
+        estimado = registro.minuto.estimar(agora, 60)
+        if estimado > self.max_minuto:
+            if estimado > self.limite_blacklist:
+                return True, BLACKLISTED, 0
+            return True, RATE_LIMITED_MINUTE, registro.minuto.inicio + 60 - agora
+
+        # Verificar limite por hora
+        registro.hora.avancar(agora, 3600)
+        registro.hora.atual += 1
+        if registro.hora.estimar(agora, 3600) > self.max_hora:
+            return True, RATE_LIMITED_HOUR, registro.hora.inicio + 3600 - agora
+
+        registro.ultimo_comando = agora
+        registro.total += 1
+        return False, None, 0
+
+    @staticmethod
+    def _resumo(registro, agora):
+        registro.minuto.avancar(agora, 60)
+        registro.hora.avancar(agora, 3600)
+        return {
+            'command_count': registro.total,
+            'last_command': registro.ultimo_comando,
+            'minute_count': round(registro.minuto.estimar(agora, 60)),
+            'hour_count': round(registro.hora.estimar(agora, 3600))
+        }
+
+    def consultar(self, user_id, agora=None):
+        """
+        Returns:
+            dict: command_count, last_command, minute_count e hour_count do usuário, ou None
+        """
+        user_id = str(user_id)
+        agora = time.time() if agora is None else agora
+        registros, lock = self._particao(user_id)
+        with lock:
+            registro = registros.get(user_id)
+            if registro is None:
+                return None
+            return self._resumo(registro, agora)
+
+    def remover(self, user_id):
+        """Descarta os contadores de um usuário (ex: ao desbloquear)"""
+        user_id = str(user_id)
+        registros, lock = self._particao(user_id)
+        with lock:
+            return registros.pop(user_id, None) is not None
+
+    def expirar(self, agora=None):
+        """Descarta os registros ociosos de todas as partições"""
+        agora = time.time() if agora is None else agora
+        for registros, lock in zip(self._particoes, self._locks):
+            with lock:
+                self._expirar(registros, agora)
+
+    def snapshot(self):
+        """
+        Descarta os registros ociosos e exporta os demais
+
+        Returns:
+            dict: {user_id: contadores} serializável em JSON
+        """
+        agora = time.time()
+        dados = {}
+        for registros, lock in zip(self._particoes, self._locks):
+            with lock:
+                self._expirar(registros, agora)
+                for user_id, r in registros.items():
+                    dados[user_id] = _exportar(r)
+        return dados
+
+    def restaurar(self, dados, agora=None):
+        """
+        Carrega um snapshot, ignorando os registros já expirados
+
+        Args:
+            dados: Resultado de snapshot()
+        """
+        agora = time.time() if agora is None else agora
+        # Inserir em ordem de acesso para manter a ordem usada na expiração
+        itens = sorted(dados.items(), key=lambda item: item[1].get('last_seen', item[1].get('last_command', 0)))
+        for user_id, valores in itens:
+            registro = _importar(valores)
+            if agora - registro.acesso >= self.ttl:
+                continue
+            registros, lock = self._particao(str(user_id))
+            with lock:
+                registros[str(user_id)] = registro
+                self._expirar(registros, agora)
+
+    def carregar(self, estado):
+        """Restaura o snapshot gravado no backend de estado"""
+        self.restaurar(estado.carregar_rate_limits())
+
+    def salvar(self, estado):
+        """Grava o snapshot no backend de estado"""
+        estado.salvar_rate_limits(self.snapshot())
+
+
+class LimitadorCompartilhado(LimitadorComandos):
+    """
+    Mesmas regras, com os contadores de cada usuário lidos e gravados no
+    backend de estado compartilhado a cada comando (transação por usuário)
+    """
+
+    def __init__(self, estado, **kwargs):
+        """
+        Args:
+            estado: Backend com atualizar_rate_limit() (EstadoSQLite)
+            **kwargs: Limites, como em LimitadorComandos
+        """
+        super().__init__(**kwargs)
+        self.estado = estado
+
+    def __len__(self):
+        return self.estado.contar_rate_limits()
+
+    def verificar(self, user_id, agora=None):
+        def aplicar(valores):
+            # Horário lido dentro da transação para que os comandos fiquem em ordem entre réplicas
+            instante = time.time() if agora is None else agora
+            registro = _importar(valores) if valores else RegistroUsuario()
+            resultado = self._aplicar(registro, instante)
+            return _exportar(registro), resultado
+
+        return self.estado.atualizar_rate_limit(user_id, aplicar)
+
+    def consultar(self, user_id, agora=None):
+        valores = self.estado.obter_rate_limit(user_id)
+        if valores is None:
+            return None
+        return self._resumo(_importar(valores), time.time() if agora is None else agora)
+
+    def remover(self, user_id):
+        existia = self.estado.obter_rate_limit(user_id) is not None
+        self.estado.remover_rate_limit(user_id)
+        return existia
+
+    def expirar(self, agora=None):
+        agora = time.time() if agora is None else agora
+        self.estado.expirar_rate_limits(agora - self.ttl)
+
+    def snapshot(self):
+        self.expirar()
+        return self.estado.carregar_rate_limits()
+
+    def restaurar(self, dados, agora=None):
+        # Os contadores já estão no backend
+        pass
+
+    def carregar(self, estado):
+        pass
+
+    def salvar(self, estado):
+        # Cada comando já foi gravado; resta descartar os usuários ociosos
+        self.expirar()
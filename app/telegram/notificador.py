@@ -0,0 +1,388 @@
+"""
+Cliente do Telegram somente para envio
+
+Usado pela automação para anunciar uma nova versão da tabela sem montar o
+bot completo: não registra handlers, não consulta get_updates e não
+concorre com o polling do bot. O TelegramBot estende esta classe com os
+comandos e o polling.
+
+Com várias réplicas, cada broadcast é enviado pela réplica que obtém a
+lease do job no backend de estado; as demais o ignoram enquanto ela durar.
+"""
+import json
+import logging
+import os
+import uuid
+
+import telebot
+
+from app.utils.grupos_manager import GruposManager
+from app.utils.estado import EstadoJSON, Lease, identificador_replica
+from app.telegram.cache_file_id import CacheFileId
+from app.telegram.broadcast import MotorBroadcast, ENVIADO
+from app.telegram.fila_broadcast import FilaBroadcast, PENDENTE, ENVIANDO
+
+logger = logging.getLogger(__name__)
+
+# Tamanho máximo da legenda de um documento no Telegram
+LIMITE_LEGENDA = 1024
+
+# Duração, em segundos, da lease de um broadcast (renovada durante o envio)
+DURACAO_LEASE_BROADCAST = 60
+
+
+class NotificadorTelegram:
+    def __init__(self, token, grupos_file="data/grupos.json", file_id_cache_file="data/telegram_file_ids.json",
+                 broadcast_workers=8, broadcast_taxa=30, broadcast_db="data/broadcasts.db", storage_chat_id=None,
+                 bot=None, estado=None, replica=None, version_file="data/last_version_downloaded.txt"):
+        """
+        Inicializa o cliente de envio
+        
+        Args:
+            token: Token do bot do Telegram
+            grupos_file: Arquivo com os IDs dos grupos e seus status
+            file_id_cache_file: Cache dos file_id de documentos já enviados
+            broadcast_workers: Envios simultâneos nos broadcasts
+            broadcast_taxa: Limite global de mensagens por segundo nos broadcasts
+            broadcast_db: Banco SQLite da fila de broadcasts
+            storage_chat_id: Chat privado onde os arquivos são enviados uma vez para obter o file_id (opcional)
+            bot: Instância do TeleBot a usar (padrão: um cliente sem threads de processamento de updates)
+            estado: Backend de grupos, blacklist e rate limits (padrão: arquivos JSON em data/)
+            replica: Identificador desta réplica nas leases (padrão: host e PID)
+            version_file: Informações da última versão baixada (gravadas pelo IBPTVersionChecker)
+        """
+        os.makedirs("data", exist_ok=True)
+        self.bot = bot or telebot.TeleBot(token, threaded=False)
+        self.estado = estado or EstadoJSON(grupos_file)
+        self.grupos_manager = GruposManager(grupos_file, estado=self.estado)
+        self.file_ids = CacheFileId(file_id_cache_file, estado=self.estado)
+        self.motor_broadcast = MotorBroadcast(max_workers=broadcast_workers, taxa_global=broadcast_taxa)
+        self.fila_broadcast = FilaBroadcast(broadcast_db)
+        self.storage_chat_id = storage_chat_id
+        self.replica = replica or identificador_replica()
+        self.version_file = version_file
+
+    def get_grupos(self):
+        """
+        Obtém a lista de todos os grupos
+        
+        Returns:
+            list: Lista de IDs dos grupos
+        """
+        grupos_dict = self.grupos_manager.get_grupos()
+        return list(grupos_dict.keys())
+    
+    def get_grupos_ativos(self):
+        """
+        Obtém a lista de grupos ativos
+        
+        Returns:
+            list: Lista de IDs dos grupos ativos
+        """
+        return self.grupos_manager.get_grupos_ativos()
+
+    def enviar_mensagem(self, chat_id, mensagem):
+        """
+        Envia uma mensagem para um chat
+        
+        Args:
+            chat_id: ID do chat no Telegram
+            mensagem: Texto da mensagem
+        
+        Returns:
+            bool: True se a mensagem foi enviada com sucesso, False caso contrário
+        """
+        try:
+            self.bot.send_message(chat_id, mensagem, parse_mode='Markdown')
+            return True
+        except Exception as e:
+            logger.error(f"Erro ao enviar mensagem para {chat_id}: {str(e)}")
+            return False
+
+    def _info_versao(self):
+        """Informações da última tabela baixada (version_file) ou None"""
+        try:
+            with open(self.version_file, 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _versao_atual(self):
+        """Versão da última tabela baixada ou None"""
+        return (self._info_versao() or {}).get('version')
+
+    def _enviar_documento(self, chat_id, caminho, versao, sha256, caption=None, nome=None, parse_mode=None):
+        """
+        Envia um documento reaproveitando o file_id de um upload anterior do mesmo conteúdo
+        
+        Args:
+            chat_id: ID do chat no Telegram
+            caminho: Caminho do arquivo
+            versao: Versão da tabela a que o arquivo pertence
+            sha256: Hash do conteúdo do arquivo
+            caption: Legenda do arquivo (opcional)
+            nome: Nome exibido do arquivo (padrão: nome do arquivo em disco)
+            parse_mode: Formatação da legenda (opcional)
+        """
+        nome = nome or os.path.basename(caminho)
+        
+        file_id = self.file_ids.obter(versao, nome, sha256) if versao else None
+        if file_id:
+            try:
+                return self.bot.send_document(chat_id, file_id, caption=caption, parse_mode=parse_mode)
+            except telebot.apihelper.ApiTelegramException as e:
+                # file_id inválido ou expirado: descartar e enviar os bytes novamente
+                if e.error_code != 400:
+                    raise
+                logger.warning(f"file_id de {nome} recusado pelo Telegram ({e.description}), reenviando o arquivo")
+                self.file_ids.descartar(versao, nome, sha256)
+        
+        with open(caminho, 'rb') as f:
+            enviada = self.bot.send_document(
+                chat_id,
+                f,
+                caption=caption,
+                visible_file_name=nome,
+                parse_mode=parse_mode
+            )
+        if versao and enviada.document:
+            self.file_ids.registrar(versao, nome, sha256, enviada.document.file_id)
+        return enviada
+
+    def _mensagem_arquivo_grande(self, arquivo):
+        """
+        Returns:
+            str: Aviso a enviar no lugar do arquivo, ou None se o arquivo cabe no limite do Telegram
+        """
+        file_size = os.path.getsize(arquivo)
+        max_size = 40 * 1024 * 1024  # 40MB (limite seguro para o Telegram)
+        
+        if file_size <= max_size:
+            return None
+        
+        # Arquivo muito grande para enviar diretamente
+        size_mb = file_size / (1024 * 1024)
+        logger.warning(f"Arquivo muito grande para envio ({size_mb:.1f}MB): {arquivo}")
+        mensagem = f"⚠️ *Arquivo muito grande para envio direto* ({size_mb:.1f}MB)\n\n"
+        mensagem += f"O Telegram tem um limite de 50MB para envio de arquivos por bots, e este arquivo excede o limite seguro.\n\n"
+        mensagem += f"*Recomendação:* Use o comando `/estado UF` para solicitar apenas a tabela de um estado específico."
+        return mensagem
+
+    def enviar_arquivo(self, chat_id, arquivo, caption=None, versao=None):
+        """
+        Envia um arquivo para um chat
+        
+        Args:
+            chat_id: ID do chat no Telegram
+            arquivo: Caminho do arquivo
+            caption: Legenda do arquivo (opcional)
+            versao: Versão da tabela contida no arquivo (padrão: última versão baixada)
+            
+        Returns:
+            bool: True se o arquivo foi enviado com sucesso, False caso contrário
+        """
+        try:
+            aviso = self._mensagem_arquivo_grande(arquivo)
+            if aviso:
+                self.bot.send_message(chat_id, aviso, parse_mode='Markdown')
+                return False
+            
+            versao = versao or self._versao_atual()
+            self._enviar_documento(
+                chat_id,
+                arquivo,
+                versao,
+                self.file_ids.hash_arquivo(arquivo),
+                caption=caption,
+                parse_mode='Markdown'
+            )
+            return True
+        except Exception as e:
+            logger.error(f"Erro ao enviar arquivo para {chat_id}: {str(e)}")
+            return False
+
+    def _funcao_envio(self, job):
+        """
+        Monta a função de envio de um job da fila de broadcasts
+        
+        Returns:
+            tuple: (função que recebe o chat_id, nome do arquivo enviado ou None)
+        """
+        payload = job['payload']
+        if job['tipo'] == 'arquivo':
+            arquivo = payload['arquivo']
+            
+            def enviar(chat_id):
+                self._enviar_documento(
+                    chat_id, arquivo, payload['versao'], payload['sha256'],
+                    caption=payload.get('caption'), parse_mode='Markdown'
+                )
+            return enviar, os.path.basename(arquivo)
+        
+        return lambda chat_id: self.bot.send_message(chat_id, payload['texto'], parse_mode='Markdown'), None
+
+    def _executar_job(self, job_id, retomar=False):
+        """
+        Envia um job da fila aos chats que ainda não o receberam
+        
+        Cada envio é marcado como em andamento antes da chamada à API, para que
+        um job retomado após uma queda nunca envie duas vezes ao mesmo chat.
+        Se outra réplica detém a lease do job, ele não é executado aqui.
+        
+        Args:
+            job_id: ID do job na fila
+            retomar: Job retomado na inicialização; com a lease obtida, os envios
+                ainda em andamento foram interrompidos e passam a incertos
+        
+        Returns:
+            tuple: (total_enviados, total_falhas) considerando todas as execuções do job
+        """
+        fila = self.fila_broadcast
+        lease = Lease(self.estado, f"broadcast:{job_id}", self.replica, DURACAO_LEASE_BROADCAST)
+        if not lease.adquirir():
+            logger.info(f"Broadcast {job_id} em execução por outra réplica")
+            resumo = fila.resumo(job_id)
+            # Os chats ainda pendentes ficam com a outra réplica e não contam como falha
+            em_andamento = resumo.get(ENVIADO, 0) + resumo.get(PENDENTE, 0) + resumo.get(ENVIANDO, 0)
+            return resumo.get(ENVIADO, 0), sum(resumo.values()) - em_andamento
+        try:
+            if retomar:
+                interrompidos = fila.recuperar_interrompidos(job_id)
+                if interrompidos:
+                    logger.warning(f"Broadcast {job_id}: {interrompidos} envios interrompidos marcados como incertos")
+            return self._enviar_job(job_id, lease)
+        finally:
+            lease.liberar()
+
+    def _enviar_job(self, job_id, lease):
+        fila = self.fila_broadcast
+        job = fila.job(job_id)
+        enviar, nome_arquivo = self._funcao_envio(job)
+        pendentes = fila.pendentes(job_id)
+        descricao = f"broadcast {job['chave']}"
+        
+        def antes(chat_id):
+            # Sem a lease (expirou e outra réplica assumiu), os chats restantes ficam para ela
+            return lease.manter() and fila.iniciar_envio(job_id, chat_id)
+        
+        def depois(chat_id, status):
+            fila.concluir_envio(job_id, chat_id, status)
+        
+        # Arquivo: um único upload (no chat de armazenamento ou no primeiro grupo) antes de distribuir em paralelo
+        if nome_arquivo:
+            versao, sha256 = job['payload']['versao'], job['payload']['sha256']
+            if pendentes and versao:
+                self._enviar_para_armazenamento(job['payload']['arquivo'], versao, sha256)
+            while pendentes and versao and not self.file_ids.obter(versao, nome_arquivo, sha256):
+                self.motor_broadcast.processar(pendentes.pop(0), enviar, antes, depois)
+        
+        self.motor_broadcast.executar(pendentes, enviar, descricao, antes, depois)
+        fila.finalizar_job(job_id)
+        
+        resumo = fila.resumo(job_id)
+        enviados = resumo.get(ENVIADO, 0)
+        return enviados, sum(resumo.values()) - enviados
+
+    def _enviar_para_armazenamento(self, arquivo, versao, sha256):
+        """
+        Faz o upload no chat de armazenamento para obter o file_id sem depender de um grupo
+        """
+        if not self.storage_chat_id or self.file_ids.obter(versao, os.path.basename(arquivo), sha256):
+            return
+        try:
+            self._enviar_documento(self.storage_chat_id, arquivo, versao, sha256, caption=f"Versão {versao}")
+            logger.info(f"Arquivo {os.path.basename(arquivo)} enviado ao chat de armazenamento")
+        except Exception as e:
+            logger.error(f"Erro ao enviar ao chat de armazenamento, o upload será feito no primeiro grupo: {str(e)}")
+
+    def broadcast_anuncio(self, arquivo, anuncio, versao=None, chave=None):
+        """
+        Anuncia uma nova versão enviando a tabela com o anúncio na legenda
+        
+        Cada grupo recebe uma única mensagem (documento + legenda) e o arquivo é
+        enviado ao Telegram uma única vez; os demais envios usam o file_id. Se o
+        anúncio não couber na legenda, ele é enviado antes como mensagem.
+        
+        Args:
+            arquivo: Caminho do arquivo
+            anuncio: Texto do anúncio (Markdown)
+            versao: Versão da tabela contida no arquivo (padrão: última versão baixada)
+            chave: Identificador do broadcast; repetir a chave retoma o envio sem duplicar (opcional)
+            
+        Returns:
+            tuple: (total_enviados, total_falhas) do envio do arquivo
+        """
+        if len(anuncio) <= LIMITE_LEGENDA:
+            return self.broadcast_arquivo(arquivo, anuncio, versao, chave=chave and f"{chave}:tabela")
+        
+        self.broadcast_mensagem(anuncio, chave=chave and f"{chave}:anuncio")
+        return self.broadcast_arquivo(arquivo, None, versao, chave=chave and f"{chave}:tabela")
+
+    def broadcast_mensagem(self, mensagem, chave=None):
+        """
+        Envia uma mensagem para todos os grupos ativos, em paralelo e dentro dos limites do Telegram
+        
+        Args:
+            mensagem: Texto da mensagem
+            chave: Identificador do broadcast; repetir a chave retoma o envio sem duplicar (opcional)
+            
+        Returns:
+            tuple: (total_enviados, total_falhas)
+        """
+        job_id = self.fila_broadcast.criar_job(
+            chave or f"mensagem:{uuid.uuid4().hex}",
+            'mensagem',
+            {'texto': mensagem},
+            self.grupos_manager.get_grupos_ativos()
+        )
+        return self._executar_job(job_id)
+
+    def broadcast_arquivo(self, arquivo, caption=None, versao=None, chave=None):
+        """
+        Envia um arquivo para todos os grupos ativos, em paralelo e dentro dos limites do Telegram
+        
+        O upload é feito uma única vez, no primeiro grupo; os demais recebem o file_id em cache.
+        
+        Args:
+            arquivo: Caminho do arquivo
+            caption: Legenda do arquivo (opcional)
+            versao: Versão da tabela contida no arquivo (padrão: última versão baixada)
+            chave: Identificador do broadcast (padrão: versão e hash do arquivo)
+            
+        Returns:
+            tuple: (total_enviados, total_falhas); do aviso, se o arquivo for grande demais para o Telegram
+        """
+        grupos_ativos = self.grupos_manager.get_grupos_ativos()
+        
+        versao = versao or self._versao_atual()
+        sha256 = self.file_ids.hash_arquivo(arquivo)
+        
+        aviso = self._mensagem_arquivo_grande(arquivo)
+        if aviso:
+            # Mesmo caminho dos demais broadcasts: fila, chave e lease evitam reenviar o aviso
+            job_id = self.fila_broadcast.criar_job(
+                f"{chave}:aviso" if chave else f"aviso:{versao}:{sha256}",
+                'mensagem',
+                {'texto': aviso},
+                grupos_ativos
+            )
+            return self._executar_job(job_id)
+        
+        job_id = self.fila_broadcast.criar_job(
+            chave or f"arquivo:{versao}:{sha256}",
+            'arquivo',
+            {'arquivo': arquivo, 'caption': caption, 'versao': versao, 'sha256': sha256},
+            grupos_ativos
+        )
+        return self._executar_job(job_id)
+
+    def retomar_broadcasts(self):
+        """
+        Retoma os broadcasts interrompidos (ex: reinício do container no meio do envio)
+        """
+        for job_id in self.fila_broadcast.jobs_inacabados():
+            try:
+                enviados, falhas = self._executar_job(job_id, retomar=True)
+                logger.info(f"Broadcast {job_id} retomado: {enviados} enviados, {falhas} falhas no total")
+            except Exception as e:
+                logger.error(f"Erro ao retomar o broadcast {job_id}: {str(e)}")
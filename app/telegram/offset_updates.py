@@ -0,0 +1,92 @@
+"""
+Checkpoint do offset dos updates do Telegram
+
+Guarda em data/ o menor update_id ainda não concluído, que é também o offset
+enviado ao getUpdates: o Telegram só descarta os updates anteriores a ele, ou
+seja, os já concluídos. Ao reiniciar, o bot pede os updates a partir desse
+offset: nada do que estava em andamento (ou ainda não tinha sido lido) é
+perdido. A entrega é pelo menos uma vez: os updates concluídos acima do mais
+antigo em andamento são processados de novo após uma queda. Durante a
+execução, eles voltam nas consultas seguintes e são ignorados com
+ja_recebido().
+"""
+import json
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+# Tipos de update tratados pelos handlers do bot (comandos e entrada/saída do bot nos grupos)
+ATUALIZACOES = ["message"]
+
+
+class CheckpointUpdates:
+    """
+    Acompanha os updates em processamento e grava o offset confirmado
+    """
+
+    def __init__(self, arquivo="data/telegram_offset.json", intervalo_gravacao=1.0):
+        """
+        Args:
+            arquivo: Arquivo JSON do checkpoint
+            intervalo_gravacao: Intervalo mínimo, em segundos, entre gravações durante o processamento
+        """
+        self.arquivo = arquivo
+        self.intervalo_gravacao = intervalo_gravacao
+        self._pendentes = set()
+        self._gravado = None
+        self._gravado_em = 0
+        self.proximo = self._carregar()
+
+    def _carregar(self):
+        try:
+            with open(self.arquivo, 'r') as f:
+                offset = json.load(f).get('offset')
+            logger.info(f"Retomando os updates a partir do offset {offset}")
+            self._gravado = offset
+            return offset
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.error(f"Erro ao carregar o checkpoint de updates: {str(e)}")
+            return None
+
+    @property
+    def confirmado(self):
+        """Offset a partir do qual os updates ainda não foram concluídos"""
+        if self._pendentes:
+            return min(self._pendentes)
+        return self.proximo
+
+    def ja_recebido(self, update_id):
+        """Update já entregue ao processamento (em andamento ou concluído) desde o início do bot"""
+        return self.proximo is not None and update_id < self.proximo
+
+    def recebido(self, update_id):
+        """Registra um update lido da API e ainda não processado"""
+        self._pendentes.add(update_id)
+        if self.proximo is None or update_id >= self.proximo:
+            self.proximo = update_id + 1
+
+    def concluido(self, update_id):
+        """Registra o fim do processamento de um update"""
+        self._pendentes.discard(update_id)
+        if time.monotonic() - self._gravado_em >= self.intervalo_gravacao:
+            self.salvar()
+
+    def salvar(self):
+        """Grava o offset confirmado se ele mudou (arquivo temporário + rename)"""
+        offset = self.confirmado
+        if offset is None or offset == self._gravado:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.arquivo) or ".", exist_ok=True)
+            temp_file = f"{self.arquivo}.tmp"
+            with open(temp_file, 'w') as f:
+                json.dump({'offset': offset}, f)
+            os.replace(temp_file, self.arquivo)
+            self._gravado = offset
+            self._gravado_em = time.monotonic()
+        except Exception as e:
+            logger.error(f"Erro ao salvar o checkpoint de updates: {str(e)}")
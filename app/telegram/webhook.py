@@ -0,0 +1,125 @@
+"""
+Servidor HTTP que recebe os updates do Telegram por webhook
+
+O Telegram envia cada update em um POST com o cabeçalho
+X-Telegram-Bot-Api-Secret-Token; pedidos sem o segredo correto são
+recusados. O update é colocado em uma fila limitada e respondido na hora;
+um grupo de workers consome a fila e despacha os updates para os handlers.
+Com a fila cheia, o servidor responde 503 e o Telegram reenvia o update
+mais tarde.
+"""
+import asyncio
+import hmac
+import logging
+
+from aiohttp import web
+from telebot import types
+
+logger = logging.getLogger(__name__)
+
+CABECALHO_SEGREDO = "X-Telegram-Bot-Api-Secret-Token"
+
+
+class ServidorWebhook:
+    """
+    Recebe os updates e os entrega a `processar` com concorrência limitada
+    """
+
+    def __init__(self, processar, secret_token, host="0.0.0.0", porta=8443, caminho="/telegram",
+                 capacidade_fila=1000, workers=200):
+        """
+        Args:
+            processar: Corrotina chamada com cada telebot.types.Update
+            secret_token: Segredo esperado no cabeçalho X-Telegram-Bot-Api-Secret-Token
+            host: Endereço em que o servidor escuta
+            porta: Porta do servidor (0 = porta livre escolhida pelo sistema)
+            caminho: Caminho da rota que recebe os updates
+            capacidade_fila: Updates aguardando processamento
+            workers: Updates processados ao mesmo tempo
+        """
+        self.processar = processar
+        self.secret_token = secret_token
+        self.host = host
+        self.porta = porta
+        self.caminho = caminho
+        self.capacidade_fila = capacidade_fila
+        self.workers = workers
+        self.recebidos = 0
+        self.recusados = 0
+        self._fila = None
+        self._tarefas = []
+        self._runner = None
+
+    async def _receber(self, request):
+        segredo = request.headers.get(CABECALHO_SEGREDO, "")
+        if not hmac.compare_digest(segredo.encode(), self.secret_token.encode()):
+            logger.warning(f"Pedido ao webhook com segredo inválido de {request.remote}")
+            return web.Response(status=401)
+
+        try:
+            dados = await request.json()
+        except ValueError:
+            return web.Response(status=400)
+
+        try:
+            self._fila.put_nowait(dados)
+        except asyncio.QueueFull:
+            # O Telegram reenvia o update quando não recebe 2xx
+            self.recusados += 1
+            logger.warning(f"Fila do webhook cheia ({self.capacidade_fila}), update {dados.get('update_id')} recusado")
+            return web.Response(status=503)
+        self.recebidos += 1
+        return web.Response()
+
+    async def _saude(self, request):
+        return web.json_response({
+            'fila': self._fila.qsize(),
+            'recebidos': self.recebidos,
+            'recusados': self.recusados
+        })
+
+    async def _worker(self):
+        while True:
+            dados = await self._fila.get()
+            try:
+                await self.processar(types.Update.de_json(dados))
+            except Exception as e:
+                logger.error(f"Erro ao processar update do webhook: {str(e)}")
+            finally:
+                self._fila.task_done()
+
+    async def iniciar(self):
+        """Inicia o servidor HTTP e os workers"""
+        self._fila = asyncio.Queue(maxsize=self.capacidade_fila)
+        self._tarefas = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+        app = web.Application()
+        app.router.add_post(self.caminho, self._receber)
+        app.router.add_get(f"{self.caminho.rstrip('/')}/saude", self._saude)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.porta)
+        await site.start()
+        if not self.porta:
+            self.porta = self._runner.addresses[0][1]
+        logger.info(f"Servidor do webhook escutando em {self.host}:{self.porta}{self.caminho}")
+
+    async def parar(self, espera=10):
+        """
+        Para de receber updates e aguarda (até `espera` segundos) os que estão na fila
+
+        Os que não forem concluídos são perdidos para este processo, mas o
+        Telegram já os considerou entregues.
+        """
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+        if self._fila is not None:
+            try:
+                await asyncio.wait_for(self._fila.join(), timeout=espera)
+            except asyncio.TimeoutError:
+                logger.warning(f"{self._fila.qsize()} updates do webhook não foram processados antes do encerramento")
+        for tarefa in self._tarefas:
+            tarefa.cancel()
+        await asyncio.gather(*self._tarefas, return_exceptions=True)
+        self._tarefas = []
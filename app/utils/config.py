@@ -22,10 +22,36 @@ ESTADOS_STR = os.getenv("ESTADOS")
 ESTADOS = [estado.strip() for estado in ESTADOS_STR.split(",")] if ESTADOS_STR else []
 OUTPUT_FILE = "data/tabela_aliquotas_ibpt.zip"
 
+# Arquivos da tabela separados por estado (um subdiretório por versão)
+ARTIFACT_CACHE_DIR = "data/cache"
+
+# Geração em lotes: divide os estados em solicitações menores processadas em paralelo
+# (SHARD_SIZE=0 mantém uma única solicitação com todos os estados)
+SHARD_SIZE = int(os.getenv("SHARD_SIZE", "0"))
+SHARD_WORKERS = int(os.getenv("SHARD_WORKERS", "4"))
+
 # Configurações de timeout
 MAX_ATTEMPTS = int(os.getenv("MAX_ATTEMPTS", "30"))
 DELAY_SECONDS = int(os.getenv("DELAY_SECONDS", "10"))
 
+# Informações da última versão baixada (lidas também pelo bot: /status, cache de file_id e broadcasts)
+VERSION_FILE = "data/last_version_downloaded.txt"
+
+# Validadores HTTP da página inicial (verificação condicional de versão)
+VERSION_PROBE_FILE = "data/version_probe.json"
+
+# Cache dos cookies da sessão autenticada no portal
+SESSION_FILE = "data/sessao_ibpt.json"
+
+# Durações das gerações anteriores, usadas para prever o tempo de espera
+GENERATION_HISTORY_FILE = "data/historico_geracao.json"
+
+# Backend de parsing HTML: auto (lxml quando instalado), lxml ou bs4
+HTML_PARSER = os.getenv("HTML_PARSER", "auto")
+
+# Agendamento da verificação no modo daemon (formato cron)
+CRON_SCHEDULE = os.getenv("CRON_SCHEDULE", "0 7 * * *")
+
 # Configurações opcionais para log
 LOG_FILE = "logs/ibpt_auto_update.log"
 ENABLE_DEBUG = os.getenv("ENABLE_DEBUG", "true").lower() == "true"
@@ -33,4 +59,61 @@ ENABLE_DEBUG = os.getenv("ENABLE_DEBUG", "true").lower() == "true"
 # Configurações do Telegram
 TELEGRAM_TOKEN = os.getenv("TELEGRAM_TOKEN")
 TELEGRAM_BOT_USERNAME = os.getenv("TELEGRAM_BOT_USERNAME")
-GRUPOS_FILE = "data/grupos.json" 
\ No newline at end of file
+GRUPOS_FILE = "data/grupos.json"
+BLACKLIST_FILE = "data/blacklist.txt"
+RATE_LIMITS_FILE = "data/rate_limits.json"
+
+# Armazenamento de grupos, blacklist e rate limits: json (arquivos acima) ou sqlite (STATE_DB)
+STATE_BACKEND = os.getenv("STATE_BACKEND", "json").lower()
+STATE_DB = "data/estado.db"
+
+# Várias réplicas do bot: use STATE_BACKEND=sqlite com data/ em um volume compartilhado.
+# REPLICA_ID identifica a réplica nas leases de broadcasts e da automação (padrão: host e PID)
+REPLICA_ID = os.getenv("REPLICA_ID") or None
+
+# Rate limit dos comandos: usuários ociosos por mais de RATE_LIMIT_TTL segundos são descartados da memória
+RATE_LIMIT_TTL = int(os.getenv("RATE_LIMIT_TTL", "7200"))
+RATE_LIMIT_MAX_USERS = int(os.getenv("RATE_LIMIT_MAX_USERS", "100000"))
+
+# Broadcasts: envios simultâneos e limite global de mensagens por segundo (limite do Telegram: ~30/s)
+BROADCAST_WORKERS = int(os.getenv("BROADCAST_WORKERS", "8"))
+BROADCAST_RATE = float(os.getenv("BROADCAST_RATE", "30"))
+
+# Chat privado (ex: canal do administrador) usado para o upload único dos arquivos (opcional)
+TELEGRAM_STORAGE_CHAT_ID = os.getenv("TELEGRAM_STORAGE_CHAT_ID") or None
+
+# Fila persistente dos broadcasts (status de cada grupo, retomada após quedas)
+BROADCAST_DB = "data/broadcasts.db"
+
+# Conexões simultâneas com a API do Telegram usadas pelos comandos do bot (pool aiohttp único)
+TELEGRAM_POOL_SIZE = int(os.getenv("TELEGRAM_POOL_SIZE", "100"))
+
+# Comandos pesados do bot (/tabela): execuções simultâneas e pedidos que podem aguardar na fila
+HEAVY_COMMAND_WORKERS = int(os.getenv("HEAVY_COMMAND_WORKERS", "4"))
+HEAVY_COMMAND_QUEUE = int(os.getenv("HEAVY_COMMAND_QUEUE", "50"))
+
+# Admissão dos comandos por custo: custo de cada comando (os demais custam 1) e orçamentos em tokens por minuto
+COMMAND_COSTS = os.getenv("COMMAND_COSTS", "tabela=10")
+ADMISSION_USER_BUDGET = float(os.getenv("ADMISSION_USER_BUDGET", "30"))
+ADMISSION_CHAT_BUDGET = float(os.getenv("ADMISSION_CHAT_BUDGET", "60"))
+ADMISSION_GLOBAL_BUDGET = float(os.getenv("ADMISSION_GLOBAL_BUDGET", "600"))
+# Espera máxima, em segundos, de um pedido adiado antes de ser recusado
+ADMISSION_MAX_WAIT = float(os.getenv("ADMISSION_MAX_WAIT", "120"))
+
+# file_id dos documentos já enviados ao Telegram (reenvio sem novo upload)
+FILE_ID_CACHE_FILE = "data/telegram_file_ids.json"
+
+# Checkpoint do último update do Telegram processado (reinícios sem repetir nem perder comandos)
+TELEGRAM_OFFSET_FILE = "data/telegram_offset.json"
+
+# Modo webhook (python run.py --modo webhook): URL pública registrada no Telegram ao iniciar
+# (vazia = registrada externamente, ex: atrás de um balanceador) e segredo do cabeçalho X-Telegram-Bot-Api-Secret-Token
+WEBHOOK_URL = os.getenv("WEBHOOK_URL") or None
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET") or None
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8443"))
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/telegram")
+# Updates aguardando processamento no modo webhook (acima disso o Telegram recebe 503 e reenvia)
+WEBHOOK_QUEUE = int(os.getenv("WEBHOOK_QUEUE", "1000"))
+# Recebimento dos updates no modo daemon: polling (uma réplica) ou webhook (réplicas atrás de um balanceador)
+TELEGRAM_MODE = os.getenv("TELEGRAM_MODE", "polling").lower() 
\ No newline at end of file
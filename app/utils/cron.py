@@ -0,0 +1,97 @@
+"""
+Interpretação de expressões cron (formato de 5 campos) para o agendador interno
+"""
+import datetime
+
+# (mínimo, máximo) de cada campo: minuto, hora, dia do mês, mês, dia da semana
+_LIMITES = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 7)]
+
+
+def _interpretar_campo(campo, minimo, maximo):
+    """
+    Converte um campo cron (ex: "*/15", "9-18", "1,3,5") no conjunto de valores aceitos
+    """
+    valores = set()
+    for parte in campo.split(','):
+        passo = 1
+        if '/' in parte:
+            parte, passo_str = parte.split('/', 1)
+            passo = int(passo_str)
+            if passo <= 0:
+                raise ValueError(f"Passo inválido na expressão cron: {campo}")
+
+        if parte == '*':
+            inicio, fim = minimo, maximo
+        elif '-' in parte:
+            inicio, fim = (int(v) for v in parte.split('-', 1))
+        else:
+            inicio = int(parte)
+            # "5/10" equivale a "5-máximo/10"
+            fim = maximo if passo > 1 else inicio
+
+        if inicio < minimo or fim > maximo or inicio > fim:
+            raise ValueError(f"Valor fora do intervalo na expressão cron: {campo}")
+        valores.update(range(inicio, fim + 1, passo))
+    return valores
+
+
+class ExpressaoCron:
+    """
+    Expressão cron no formato "minuto hora dia mês dia_da_semana"
+    """
+
+    def __init__(self, expressao):
+        campos = expressao.split()
+        if len(campos) != 5:
+            raise ValueError(f"Expressão cron deve ter 5 campos: '{expressao}'")
+
+        self.expressao = expressao
+        self.minutos, self.horas, self.dias, self.meses, dias_semana = (
+            _interpretar_campo(campo, *limites) for campo, limites in zip(campos, _LIMITES)
+        )
+        # Domingo pode ser 0 ou 7
+        self.dias_semana = {0 if d == 7 else d for d in dias_semana}
+        self._dia_restrito = campos[2] != '*'
+        self._semana_restrita = campos[4] != '*'
+
+    def _dia_aceito(self, data):
+        dia_semana = (data.weekday() + 1) % 7  # cron: 0 = domingo
+        no_dia = data.day in self.dias
+        na_semana = dia_semana in self.dias_semana
+        # Como no cron, se ambos os campos são restritos basta um deles coincidir
+        if self._dia_restrito and self._semana_restrita:
+            return no_dia or na_semana
+        return no_dia and na_semana
+
+    def proxima_execucao(self, apos=None):
+        """
+        Calcula o próximo horário que satisfaz a expressão
+
+        Args:
+            apos: Horário de referência (padrão: agora)
+
+        Returns:
+            datetime: Próximo horário estritamente posterior à referência
+        """
+        candidato = (apos or datetime.datetime.now()).replace(second=0, microsecond=0)
+        candidato += datetime.timedelta(minutes=1)
+        limite = candidato + datetime.timedelta(days=366 * 5)
+
+        while candidato < limite:
+            if candidato.month not in self.meses:
+                mes = candidato.month + 1
+                ano = candidato.year + (mes > 12)
+                candidato = candidato.replace(year=ano, month=(mes - 1) % 12 + 1, day=1, hour=0, minute=0)
+                continue
+            if not self._dia_aceito(candidato):
+                candidato = (candidato + datetime.timedelta(days=1)).replace(hour=0, minute=0)
+                continue
+            if candidato.hour not in self.horas:
+                candidato = (candidato + datetime.timedelta(hours=1)).replace(minute=0)
+                continue
+            if candidato.minute not in self.minutos:
+                candidato += datetime.timedelta(minutes=1)
+                continue
+            return candidato
+
+        raise ValueError(f"Expressão cron nunca é satisfeita: '{self.expressao}'")
@@ -0,0 +1,553 @@
+"""
+Armazenamento do estado do bot: grupos, blacklist, rate limits e leases
+
+Dois backends com a mesma interface:
+    EstadoJSON    arquivos data/grupos.json, data/blacklist.txt e data/rate_limits.json (formato original);
+                  para uma única réplica do bot
+    EstadoSQLite  banco SQLite em modo WAL (data/estado.db), com gravações
+                  transacionais apenas das linhas alteradas; compartilhado
+                  entre várias réplicas (mesmo volume), que passam a ver os
+                  mesmos grupos, blacklist, contadores de rate limit e file_ids
+
+Leases (posse temporária de um nome, ex: "broadcast:12") garantem que apenas
+uma réplica execute cada broadcast e cada horário da automação agendada. No
+backend JSON elas ficam em data/leases.json, protegido por um lock de arquivo.
+
+O formato JSON continua disponível para importação/exportação:
+    python -m app.utils.estado exportar --db data/estado.db --destino data/
+    python -m app.utils.estado importar --db data/estado.db --origem data/
+"""
+import argparse
+import datetime
+import json
+import logging
+import os
+import sqlite3
+import socket
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: o lock de arquivo vale apenas dentro do processo
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+def identificador_replica():
+    """Identificador padrão desta réplica (host e PID), usado como dono das leases"""
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class Lease:
+    """
+    Posse temporária de um nome no backend de estado, renovada enquanto o trabalho dura
+
+    Se o processo cair, a lease expira e outra réplica pode assumir o trabalho.
+    """
+
+    def __init__(self, estado, nome, dono, duracao=60):
+        self.estado = estado
+        self.nome = nome
+        self.dono = dono
+        self.duracao = duracao
+        self._renovada = 0
+        self._lock = threading.Lock()
+
+    def adquirir(self):
+        """
+        Returns:
+            bool: True se esta réplica passou a deter a lease
+        """
+        with self._lock:
+            if self.estado.adquirir_lease(self.nome, self.dono, self.duracao):
+                self._renovada = time.monotonic()
+                return True
+            return False
+
+    def manter(self):
+        """
+        Renova a lease quando um terço da duração já passou (seguro entre threads)
+
+        Returns:
+            bool: False se a lease foi perdida para outra réplica
+        """
+        with self._lock:
+            if time.monotonic() - self._renovada < self.duracao / 3:
+                return True
+            if self.estado.adquirir_lease(self.nome, self.dono, self.duracao):
+                self._renovada = time.monotonic()
+                return True
+            logger.warning(f"Lease {self.nome} perdida para outra réplica")
+            return False
+
+    def liberar(self):
+        try:
+            self.estado.liberar_lease(self.nome, self.dono)
+        except Exception as e:
+            logger.error(f"Erro ao liberar a lease {self.nome}: {str(e)}")
+
+
+@contextmanager
+def trava_arquivo(caminho):
+    """Lock exclusivo de um arquivo entre processos (quando fcntl está disponível), em `caminho`.lock"""
+    os.makedirs(os.path.dirname(caminho) or ".", exist_ok=True)
+    with open(f"{caminho}.lock", 'w') as trava:
+        if fcntl:
+            fcntl.flock(trava, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(trava, fcntl.LOCK_UN)
+
+
+def _gravar_atomico(caminho, conteudo):
+    os.makedirs(os.path.dirname(caminho) or ".", exist_ok=True)
+    temp_file = f"{caminho}.tmp"
+    with open(temp_file, 'w') as f:
+        f.write(conteudo)
+    os.replace(temp_file, caminho)
+
+
+class EstadoJSON:
+    """
+    Estado em arquivos JSON/texto
+    """
+
+    # Blacklist, rate limits e file_ids ficam na memória de cada processo
+    compartilhado = False
+
+    def __init__(self, grupos_file="data/grupos.json", blacklist_file="data/blacklist.txt",
+                 rate_limits_file="data/rate_limits.json", leases_file=None):
+        self.grupos_file = grupos_file
+        self.blacklist_file = blacklist_file
+        self.rate_limits_file = rate_limits_file
+        self.leases_file = leases_file or os.path.join(os.path.dirname(grupos_file) or ".", "leases.json")
+        self._lock = threading.Lock()
+
+    def marcador_grupos(self):
+        """
+        Returns:
+            Valor que muda quando os grupos são alterados por outro processo
+        """
+        try:
+            return os.stat(self.grupos_file).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def carregar_grupos(self):
+        try:
+            with open(self.grupos_file, 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def salvar_grupos(self, grupos, alteracoes):
+        """
+        Aplica as alterações sobre o conteúdo atual do arquivo, relido sob o
+        lock, para não desfazer o que outro processo gravou nesse meio tempo
+
+        Args:
+            grupos: Todos os grupos (não usado neste backend)
+            alteracoes: Grupos alterados ({chat_id: status ou None se removido})
+        """
+        with self._trava_arquivo(self.grupos_file):
+            atuais = self.carregar_grupos()
+            for chat_id, status in alteracoes.items():
+                if status is None:
+                    atuais.pop(chat_id, None)
+                else:
+                    atuais[chat_id] = status
+            _gravar_atomico(self.grupos_file, json.dumps(atuais, indent=4))
+
+    def carregar_blacklist(self):
+        try:
+            with open(self.blacklist_file, 'r') as f:
+                return {linha.strip() for linha in f if linha.strip()}
+        except FileNotFoundError:
+            return set()
+
+    def adicionar_blacklist(self, user_id):
+        with self._lock:
+            os.makedirs(os.path.dirname(self.blacklist_file) or ".", exist_ok=True)
+            with open(self.blacklist_file, 'a') as f:
+                f.write(f"{user_id}\n")
+
+    def remover_blacklist(self, user_id):
+        with self._lock:
+            restantes = self.carregar_blacklist() - {str(user_id)}
+            _gravar_atomico(self.blacklist_file, "".join(f"{item}\n" for item in restantes))
+
+    def carregar_rate_limits(self):
+        try:
+            with open(self.rate_limits_file, 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def salvar_rate_limits(self, registros):
+        conteudo = json.dumps(registros)
+        with self._lock:
+            _gravar_atomico(self.rate_limits_file, conteudo)
+
+    @contextmanager
+    def _trava_arquivo(self, caminho):
+        """Lock exclusivo de um arquivo, entre threads e entre processos"""
+        with self._lock, trava_arquivo(caminho):
+            yield
+
+    def _trava_leases(self):
+        return self._trava_arquivo(self.leases_file)
+
+    def _ler_leases(self):
+        try:
+            with open(self.leases_file, 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def adquirir_lease(self, nome, dono, duracao):
+        """
+        Obtém (ou renova, se já for do mesmo dono) a posse de `nome` por `duracao` segundos
+
+        Returns:
+            bool: True se `dono` detém a lease
+        """
+        agora = time.time()
+        with self._trava_leases():
+            leases = {chave: lease for chave, lease in self._ler_leases().items() if lease['expira'] > agora}
+            atual = leases.get(nome)
+            if atual and atual['dono'] != dono:
+                return False
+            leases[nome] = {'dono': dono, 'expira': agora + duracao}
+            _gravar_atomico(self.leases_file, json.dumps(leases))
+            return True
+
+    def liberar_lease(self, nome, dono):
+        with self._trava_leases():
+            leases = self._ler_leases()
+            if leases.get(nome, {}).get('dono') == dono:
+                del leases[nome]
+                _gravar_atomico(self.leases_file, json.dumps(leases))
+
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS grupos (
+    chat_id TEXT PRIMARY KEY,
+    nome TEXT NOT NULL,
+    ativo INTEGER NOT NULL DEFAULT 0,
+    atualizado_em TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS grupos_ativo ON grupos (ativo);
+CREATE TABLE IF NOT EXISTS blacklist (
+    user_id TEXT PRIMARY KEY,
+    criado_em TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS rate_limits (
+    user_id TEXT PRIMARY KEY,
+    dados TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS file_ids (
+    chave TEXT PRIMARY KEY,
+    versao TEXT NOT NULL,
+    file_id TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS leases (
+    nome TEXT PRIMARY KEY,
+    dono TEXT NOT NULL,
+    expira REAL NOT NULL
+);
+"""
+
+
+def _agora():
+    return datetime.datetime.now().isoformat()
+
+
+class EstadoSQLite:
+    """
+    Estado em SQLite (WAL), seguro para várias threads e processos
+    """
+
+    # Réplicas que usam o mesmo banco compartilham blacklist, rate limits e file_ids
+    compartilhado = True
+
+    def __init__(self, arquivo="data/estado.db"):
+        os.makedirs(os.path.dirname(arquivo) or ".", exist_ok=True)
+        self.arquivo = arquivo
+        self._lock = threading.Lock()
+        self._conexao = sqlite3.connect(arquivo, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conexao.execute("PRAGMA journal_mode=WAL")
+        self._conexao.executescript(_ESQUEMA)
+
+    def _executar(self, sql, parametros=()):
+        with self._lock:
+            return self._conexao.execute(sql, parametros).fetchall()
+
+    def _transacao(self, comandos):
+        """Executa [(sql, lista de parâmetros)] em uma única transação"""
+        with self._lock:
+            self._conexao.execute("BEGIN IMMEDIATE")
+            try:
+                for sql, parametros in comandos:
+                    if parametros is None:
+                        self._conexao.execute(sql)
+                    elif parametros:
+                        self._conexao.executemany(sql, parametros)
+                self._conexao.execute("COMMIT")
+            except Exception:
+                self._conexao.execute("ROLLBACK")
+                raise
+
+    def marcador_grupos(self):
+        # data_version muda quando outra conexão grava no banco
+        return self._executar("PRAGMA data_version")[0][0]
+
+    def vazio(self):
+        return not self._executar("SELECT 1 FROM grupos LIMIT 1") and not self._executar("SELECT 1 FROM blacklist LIMIT 1")
+
+    def carregar_grupos(self):
+        linhas = self._executar("SELECT chat_id, nome, ativo FROM grupos ORDER BY rowid")
+        return {chat_id: {'ativo': bool(ativo), 'nome': nome} for chat_id, nome, ativo in linhas}
+
+    def salvar_grupos(self, grupos, alteracoes):
+        """
+        Grava apenas os grupos alterados, em uma transação
+
+        Args:
+            grupos: Todos os grupos (não usado neste backend)
+            alteracoes: {chat_id: status ou None se removido}
+        """
+        agora = _agora()
+        gravar = [
+            (chat_id, status.get('nome', 'Grupo sem nome'), int(bool(status.get('ativo', False))), agora)
+            for chat_id, status in alteracoes.items() if status is not None
+        ]
+        remover = [(chat_id,) for chat_id, status in alteracoes.items() if status is None]
+        self._transacao([
+            ("INSERT INTO grupos (chat_id, nome, ativo, atualizado_em) VALUES (?, ?, ?, ?) "
+             "ON CONFLICT(chat_id) DO UPDATE SET nome = excluded.nome, ativo = excluded.ativo, "
+             "atualizado_em = excluded.atualizado_em", gravar),
+            ("DELETE FROM grupos WHERE chat_id = ?", remover)
+        ])
+
+    def carregar_blacklist(self):
+        return {linha[0] for linha in self._executar("SELECT user_id FROM blacklist")}
+
+    def adicionar_blacklist(self, user_id):
+        self._executar("INSERT OR IGNORE INTO blacklist (user_id, criado_em) VALUES (?, ?)", (str(user_id), _agora()))
+
+    def remover_blacklist(self, user_id):
+        self._executar("DELETE FROM blacklist WHERE user_id = ?", (str(user_id),))
+
+    def carregar_rate_limits(self):
+        return {user_id: json.loads(dados) for user_id, dados in self._executar("SELECT user_id, dados FROM rate_limits")}
+
+    def salvar_rate_limits(self, registros):
+        self._transacao([
+            ("DELETE FROM rate_limits", None),
+            ("INSERT INTO rate_limits (user_id, dados) VALUES (?, ?)",
+             [(str(user_id), json.dumps(dados)) for user_id, dados in registros.items()])
+        ])
+
+    def na_blacklist(self, user_id):
+        return bool(self._executar("SELECT 1 FROM blacklist WHERE user_id = ?", (str(user_id),)))
+
+    def obter_rate_limit(self, user_id):
+        linhas = self._executar("SELECT dados FROM rate_limits WHERE user_id = ?", (str(user_id),))
+        return json.loads(linhas[0][0]) if linhas else None
+
+    def atualizar_rate_limit(self, user_id, funcao):
+        """
+        Lê, altera e grava os contadores de um usuário em uma transação (atômico entre réplicas)
+
+        Args:
+            funcao: Recebe os dados atuais (ou None) e retorna (novos dados, resultado)
+
+        Returns:
+            O resultado retornado por `funcao`
+        """
+        user_id = str(user_id)
+        with self._lock:
+            self._conexao.execute("BEGIN IMMEDIATE")
+            try:
+                linha = self._conexao.execute("SELECT dados FROM rate_limits WHERE user_id = ?", (user_id,)).fetchone()
+                dados, resultado = funcao(json.loads(linha[0]) if linha else None)
+                self._conexao.execute(
+                    "INSERT INTO rate_limits (user_id, dados) VALUES (?, ?) "
+                    "ON CONFLICT(user_id) DO UPDATE SET dados = excluded.dados",
+                    (user_id, json.dumps(dados))
+                )
+                self._conexao.execute("COMMIT")
+            except Exception:
+                self._conexao.execute("ROLLBACK")
+                raise
+        return resultado
+
+    def remover_rate_limit(self, user_id):
+        self._executar("DELETE FROM rate_limits WHERE user_id = ?", (str(user_id),))
+
+    def contar_rate_limits(self):
+        return self._executar("SELECT COUNT(*) FROM rate_limits")[0][0]
+
+    def expirar_rate_limits(self, limite):
+        """Remove os contadores dos usuários sem comandos desde `limite` (timestamp)"""
+        self._executar("DELETE FROM rate_limits WHERE json_extract(dados, '$.last_seen') < ?", (limite,))
+
+    def obter_file_id(self, versao, chave):
+        linhas = self._executar("SELECT file_id FROM file_ids WHERE chave = ? AND versao = ?", (chave, versao))
+        return linhas[0][0] if linhas else None
+
+    def registrar_file_id(self, versao, chave, file_id):
+        """Guarda o file_id; uma versão nova descarta as entradas das anteriores"""
+        self._transacao([
+            ("DELETE FROM file_ids WHERE versao != ?", [(versao,)]),
+            ("INSERT OR REPLACE INTO file_ids (chave, versao, file_id) VALUES (?, ?, ?)", [(chave, versao, file_id)])
+        ])
+
+    def descartar_file_id(self, versao, chave):
+        self._executar("DELETE FROM file_ids WHERE chave = ? AND versao = ?", (chave, versao))
+
+    def adquirir_lease(self, nome, dono, duracao):
+        """
+        Obtém (ou renova, se já for do mesmo dono) a posse de `nome` por `duracao` segundos
+
+        Returns:
+            bool: True se `dono` detém a lease
+        """
+        agora = time.time()
+        with self._lock:
+            # Leases expiradas (ex: horários do cron já passados) não ficam acumuladas na tabela
+            self._conexao.execute("DELETE FROM leases WHERE expira < ?", (agora,))
+            cursor = self._conexao.execute(
+                "INSERT INTO leases (nome, dono, expira) VALUES (?, ?, ?) "
+                "ON CONFLICT(nome) DO UPDATE SET dono = excluded.dono, expira = excluded.expira "
+                "WHERE leases.expira < ? OR leases.dono = excluded.dono",
+                (nome, dono, agora + duracao, agora)
+            )
+            return cursor.rowcount == 1
+
+    def liberar_lease(self, nome, dono):
+        self._executar("DELETE FROM leases WHERE nome = ? AND dono = ?", (nome, dono))
+
+    def importar_json(self, origem):
+        """
+        Substitui o estado pelo conteúdo dos arquivos JSON/texto de `origem`
+
+        Args:
+            origem: EstadoJSON com os arquivos a importar
+        """
+        grupos = origem.carregar_grupos()
+        blacklist = origem.carregar_blacklist()
+        agora = _agora()
+        self._transacao([
+            ("DELETE FROM grupos", None),
+            ("DELETE FROM blacklist", None),
+            ("INSERT INTO grupos (chat_id, nome, ativo, atualizado_em) VALUES (?, ?, ?, ?)",
+             [(str(chat_id), status.get('nome', 'Grupo sem nome'), int(bool(status.get('ativo', False))), agora)
+              for chat_id, status in grupos.items()]),
+            ("INSERT INTO blacklist (user_id, criado_em) VALUES (?, ?)", [(user_id, agora) for user_id in blacklist])
+        ])
+        rate_limits = origem.carregar_rate_limits()
+        if rate_limits:
+            self.salvar_rate_limits(rate_limits)
+        logger.info(f"Estado importado: {len(grupos)} grupos, {len(blacklist)} usuários bloqueados")
+
+    def exportar_json(self, destino):
+        """
+        Grava o estado nos arquivos JSON/texto de `destino`
+
+        Args:
+            destino: EstadoJSON com os arquivos a gravar
+        """
+        grupos = self.carregar_grupos()
+        blacklist = self.carregar_blacklist()
+        # Substitui o arquivo inteiro (salvar_grupos aplicaria as alterações sobre o conteúdo atual)
+        with destino._trava_arquivo(destino.grupos_file):
+            _gravar_atomico(destino.grupos_file, json.dumps(grupos, indent=4))
+        _gravar_atomico(destino.blacklist_file, "".join(f"{user_id}\n" for user_id in blacklist))
+        destino.salvar_rate_limits(self.carregar_rate_limits())
+        logger.info(f"Estado exportado: {len(grupos)} grupos, {len(blacklist)} usuários bloqueados")
+
+    def diferencas_json(self, arquivos):
+        """
+        Compara o banco com os arquivos JSON/texto (verificação após importar ou exportar)
+
+        Args:
+            arquivos: EstadoJSON a comparar
+
+        Returns:
+            list: Descrição das diferenças (vazia se grupos e blacklist coincidem)
+        """
+        diferencas = []
+        grupos, grupos_arquivo = self.carregar_grupos(), arquivos.carregar_grupos()
+        for chat_id in sorted(set(grupos) | set(grupos_arquivo)):
+            if chat_id not in grupos_arquivo:
+                diferencas.append(f"grupo {chat_id} ausente nos arquivos")
+            elif chat_id not in grupos:
+                diferencas.append(f"grupo {chat_id} ausente no banco")
+            elif (grupos[chat_id]['nome'], grupos[chat_id]['ativo']) != (
+                    grupos_arquivo[chat_id].get('nome', 'Grupo sem nome'), bool(grupos_arquivo[chat_id].get('ativo', False))):
+                diferencas.append(f"grupo {chat_id} diferente")
+        blacklist, blacklist_arquivo = self.carregar_blacklist(), arquivos.carregar_blacklist()
+        diferencas.extend(f"usuário bloqueado {user_id} só em um dos lados" for user_id in sorted(blacklist ^ blacklist_arquivo))
+        return diferencas
+
+
+def criar_estado(backend="json", grupos_file="data/grupos.json", blacklist_file="data/blacklist.txt",
+                 rate_limits_file="data/rate_limits.json", state_db="data/estado.db"):
+    """
+    Cria o backend de estado configurado
+
+    Na primeira vez que o SQLite é usado, os arquivos JSON existentes são importados.
+
+    Args:
+        backend: 'json' ou 'sqlite'
+    """
+    arquivos = EstadoJSON(grupos_file, blacklist_file, rate_limits_file)
+    if backend == "json":
+        return arquivos
+    if backend != "sqlite":
+        raise ValueError(f"Backend de estado desconhecido: {backend}")
+
+    estado = EstadoSQLite(state_db)
+    if estado.vazio() and (os.path.exists(grupos_file) or os.path.exists(blacklist_file)):
+        logger.info(f"Migrando o estado dos arquivos JSON para {state_db}")
+        estado.importar_json(arquivos)
+    return estado
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Importação/exportação do estado do bot entre SQLite e JSON')
+    parser.add_argument('acao', choices=['importar', 'exportar'])
+    parser.add_argument('--db', default="data/estado.db", help='Banco SQLite do estado')
+    parser.add_argument('--origem', default="data", help='Diretório dos arquivos JSON a importar')
+    parser.add_argument('--destino', default="data", help='Diretório onde os arquivos JSON serão exportados')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    diretorio = args.origem if args.acao == 'importar' else args.destino
+    arquivos = EstadoJSON(
+        os.path.join(diretorio, "grupos.json"),
+        os.path.join(diretorio, "blacklist.txt"),
+        os.path.join(diretorio, "rate_limits.json")
+    )
+    estado = EstadoSQLite(args.db)
+    if args.acao == 'importar':
+        estado.importar_json(arquivos)
+    else:
+        estado.exportar_json(arquivos)
+
+    diferencas = estado.diferencas_json(arquivos)
+    if diferencas:
+        for diferenca in diferencas:
+            logger.error(f"Verificação falhou: {diferenca}")
+        raise SystemExit(1)
+    logger.info("Verificação: banco e arquivos JSON coincidem")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,128 @@
-import os
-import json
+import time
+import atexit
 import logging
+import threading
+
+from app.utils.estado import EstadoJSON
 
 logger = logging.getLogger(__name__)
 
 class GruposManager:
     """
     Classe para gerenciar os grupos com status ativo/inativo
+    
+    Os grupos ficam em memória (dicionário + índice dos ativos) e as consultas
+    não leem o arquivo. As alterações são gravadas em lote, de forma atômica,
+    alguns instantes depois (ou ao encerrar o processo), e o arquivo é
+    recarregado quando for alterado por outro processo, com as alterações
+    locais ainda não gravadas mantidas por cima.
+    
+    A persistência é feita pelo backend de estado (app/utils/estado.py):
+    arquivo JSON por padrão ou SQLite, que grava apenas os grupos alterados.
     """
-    def __init__(self, grupos_file="data/grupos.json"):
+    def __init__(self, grupos_file="data/grupos.json", intervalo_gravacao=2.0, intervalo_verificacao=1.0, estado=None):
+        """
+        Args:
+            grupos_file: Arquivo JSON dos grupos (usado quando `estado` não é informado)
+            intervalo_gravacao: Segundos entre uma alteração e a gravação no arquivo
+            intervalo_verificacao: Intervalo mínimo, em segundos, entre as verificações de alteração do arquivo
+            estado: Backend de estado (EstadoJSON ou EstadoSQLite)
+        """
         self.grupos_file = grupos_file
-        # Criar diretório se não existir
-        os.makedirs(os.path.dirname(self.grupos_file), exist_ok=True)
+        self.estado = estado or EstadoJSON(grupos_file)
+        self.intervalo_gravacao = intervalo_gravacao
+        self.intervalo_verificacao = intervalo_verificacao
+        self._lock = threading.RLock()
+        self._lock_gravacao = threading.Lock()
+        self._grupos = {}
+        self._ativos = {}  # dict como conjunto ordenado dos IDs ativos
+        self._marcador = None
+        self._verificado_em = 0
+        self._alterados = set()
+        self._timer = None
+        
+        self._carregar()
         # Inicializar o arquivo se não existir
-        if not os.path.exists(self.grupos_file):
+        if self._marcador is None:
             self.save_grupos({})
+        
+        atexit.register(self.flush)
+    
+    def _indexar(self, grupos):
+        self._grupos = grupos
+        self._ativos = {chat_id: None for chat_id, status in grupos.items() if status.get('ativo', False)}
+    
+    def _carregar(self):
+        """
+        Carrega os grupos do backend para a memória, mantendo por cima as
+        alterações locais ainda não gravadas
+        """
+        try:
+            # Marcador lido antes dos dados: uma gravação no meio só causa uma nova recarga
+            marcador = self.estado.marcador_grupos()
+            grupos = self.estado.carregar_grupos()
+            with self._lock:
+                for chat_id in self._alterados:
+                    if chat_id in self._grupos:
+                        grupos[chat_id] = self._grupos[chat_id]
+                    else:
+                        grupos.pop(chat_id, None)
+                self._indexar(grupos)
+                self._marcador = marcador
+            logger.info(f"Grupos carregados: {len(grupos)} ({len(self._ativos)} ativos)")
+        except Exception as e:
+            logger.error(f"Erro ao obter grupos: {str(e)}")
+    
+    def _recarregar_se_alterado(self):
+        """Recarrega o arquivo se outro processo o alterou (verificado no máximo a cada intervalo_verificacao)"""
+        agora = time.monotonic()
+        if agora - self._verificado_em < self.intervalo_verificacao:
+            return
+        self._verificado_em = agora
+        
+        marcador = self.estado.marcador_grupos()
+        if marcador is None or marcador == self._marcador:
+            return
+        logger.info("Arquivo de grupos alterado externamente, recarregando")
+        self._carregar()
+    
+    def _agendar_gravacao(self, *chat_ids):
+        """Marca os grupos alterados e agenda a gravação em lote"""
+        self._alterados.update(chat_ids)
+        if self._timer is None:
+            self._timer = threading.Timer(self.intervalo_gravacao, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+    
+    def flush(self, forcar=False):
+        """
+        Grava as alterações pendentes (no JSON: arquivo temporário + rename; no SQLite: uma transação)
+        
+        Args:
+            forcar: Gravar mesmo sem alterações pendentes (ex: criar o arquivo vazio)
+        """
+        with self._lock_gravacao:
+            with self._lock:
+                self._timer = None
+                if not self._alterados and not forcar:
+                    return
+                alteracoes = {
+                    chat_id: dict(self._grupos[chat_id]) if chat_id in self._grupos else None
+                    for chat_id in self._alterados
+                }
+                grupos = dict(self._grupos)
+                self._alterados = set()
+            
+            try:
+                self.estado.salvar_grupos(grupos, alteracoes)
+            except Exception as e:
+                logger.error(f"Erro ao salvar grupos: {str(e)}")
+                with self._lock:
+                    self._agendar_gravacao(*alteracoes)
+                return
+            # O backend aplica só as alterações sobre o que está gravado; recarregar
+            # traz o que outros processos gravaram, e só então o marcador é atualizado
+            self._carregar()
     
     def get_grupos(self):
         """
@@ -23,14 +131,30 @@ class GruposManager:
         Returns:
             dict: Dicionário com IDs dos grupos como chaves e status como valores
         """
-        try:
-            if os.path.exists(self.grupos_file):
-                with open(self.grupos_file, 'r') as f:
-                    return json.load(f)
-            return {}
-        except Exception as e:
-            logger.error(f"Erro ao obter grupos: {str(e)}")
-            return {}
+        with self._lock:
+            self._recarregar_se_alterado()
+            return {chat_id: dict(status) for chat_id, status in self._grupos.items()}
+    
+    def get_grupo(self, chat_id):
+        """
+        Obtém os dados de um grupo
+        
+        Returns:
+            dict: Status e nome do grupo, ou None se não estiver registrado
+        """
+        with self._lock:
+            self._recarregar_se_alterado()
+            status = self._grupos.get(str(chat_id))
+            return dict(status) if status is not None else None
+    
+    def is_ativo(self, chat_id):
+        """
+        Returns:
+            bool: True se o grupo está registrado e ativo
+        """
+        with self._lock:
+            self._recarregar_se_alterado()
+            return str(chat_id) in self._ativos
     
     def get_grupos_ativos(self):
         """
@@ -39,8 +163,9 @@ class GruposManager:
         Returns:
             list: Lista de IDs dos grupos ativos
         """
-        grupos = self.get_grupos()
-        return [chat_id for chat_id, status in grupos.items() if status.get('ativo', False)]
+        with self._lock:
+            self._recarregar_se_alterado()
+            return list(self._ativos)
     
     def get_grupos_inativos(self):
         """
@@ -49,8 +174,9 @@ class GruposManager:
         Returns:
             list: Lista de IDs dos grupos inativos
         """
-        grupos = self.get_grupos()
-        return [chat_id for chat_id, status in grupos.items() if not status.get('ativo', False)]
+        with self._lock:
+            self._recarregar_se_alterado()
+            return [chat_id for chat_id in self._grupos if chat_id not in self._ativos]
     
     def add_grupo(self, chat_id, nome_grupo=None, is_active=False):
         """
@@ -61,27 +187,30 @@ class GruposManager:
             chat_id: ID do chat do grupo
             nome_grupo: Nome do grupo (opcional)
             is_active: Define se o grupo deve ser ativado no momento da adição
-            
+        
         Returns:
             bool: True se o grupo foi adicionado/atualizado, False caso contrário
         """
         try:
-            grupos = self.get_grupos()
             chat_id_str = str(chat_id)
-            
-            # Adicionar/atualizar grupo
-            if chat_id_str in grupos:
-                # Apenas atualiza o nome se fornecido
-                if nome_grupo:
-                    grupos[chat_id_str]['nome'] = nome_grupo
-            else:
-                grupos[chat_id_str] = {
-                    'ativo': is_active,
-                    'nome': nome_grupo or 'Grupo sem nome'
-                }
-            
-            # Salvar alterações
-            self.save_grupos(grupos)
+            with self._lock:
+                self._recarregar_se_alterado()
+                
+                # Adicionar/atualizar grupo
+                if chat_id_str in self._grupos:
+                    # Apenas atualiza o nome se fornecido
+                    if nome_grupo:
+                        self._grupos[chat_id_str]['nome'] = nome_grupo
+                else:
+                    self._grupos[chat_id_str] = {
+                        'ativo': is_active,
+                        'nome': nome_grupo or 'Grupo sem nome'
+                    }
+                    if is_active:
+                        self._ativos[chat_id_str] = None
+                
+                # Salvar alterações
+                self._agendar_gravacao(chat_id_str)
             if not is_active:
                 logger.info(f"Grupo adicionado como inativo: {chat_id}")
             else:
@@ -97,27 +226,41 @@ class GruposManager:
         
         Args:
             chat_id: ID do chat do grupo
-            
+        
         Returns:
             bool: True se o grupo foi removido, False caso contrário
         """
-        try:
-            grupos = self.get_grupos()
-            chat_id_str = str(chat_id)
+        chat_id_str = str(chat_id)
+        with self._lock:
+            self._recarregar_se_alterado()
             
             # Remover grupo se existir
-            if chat_id_str in grupos:
-                del grupos[chat_id_str]
-                # Salvar alterações
-                self.save_grupos(grupos)
-                logger.info(f"Grupo removido: {chat_id}")
-                return True
-            else:
+            if chat_id_str not in self._grupos:
                 logger.info(f"Tentativa de remover grupo inexistente: {chat_id}")
                 return False
-        except Exception as e:
-            logger.error(f"Erro ao remover grupo: {str(e)}")
-            return False
+            
+            del self._grupos[chat_id_str]
+            self._ativos.pop(chat_id_str, None)
+            # Salvar alterações
+            self._agendar_gravacao(chat_id_str)
+        logger.info(f"Grupo removido: {chat_id}")
+        return True
+    
+    def _definir_ativo(self, chat_id, ativo):
+        chat_id_str = str(chat_id)
+        with self._lock:
+            self._recarregar_se_alterado()
+            if chat_id_str not in self._grupos:
+                return False
+            
+            self._grupos[chat_id_str]['ativo'] = ativo
+            if ativo:
+                self._ativos[chat_id_str] = None
+            else:
+                self._ativos.pop(chat_id_str, None)
+            # Salvar alterações
+            self._agendar_gravacao(chat_id_str)
+            return True
     
     def desativar_grupo(self, chat_id):
         """
@@ -125,27 +268,15 @@ class GruposManager:
         
         Args:
             chat_id: ID do chat do grupo
-            
+        
         Returns:
             bool: True se o grupo foi desativado, False caso contrário
         """
-        try:
-            grupos = self.get_grupos()
-            chat_id_str = str(chat_id)
-            
-            # Desativar grupo se existir
-            if chat_id_str in grupos:
-                grupos[chat_id_str]['ativo'] = False
-                # Salvar alterações
-                self.save_grupos(grupos)
-                logger.info(f"Grupo desativado: {chat_id}")
-                return True
-            else:
-                logger.info(f"Tentativa de desativar grupo inexistente: {chat_id}")
-                return False
-        except Exception as e:
-            logger.error(f"Erro ao desativar grupo: {str(e)}")
-            return False
+        if self._definir_ativo(chat_id, False):
+            logger.info(f"Grupo desativado: {chat_id}")
+            return True
+        logger.info(f"Tentativa de desativar grupo inexistente: {chat_id}")
+        return False
     
     def ativar_grupo(self, chat_id):
         """
@@ -153,37 +284,25 @@ class GruposManager:
         
         Args:
             chat_id: ID do chat do grupo
-            
+        
         Returns:
             bool: True se o grupo foi ativado, False caso contrário
         """
-        try:
-            grupos = self.get_grupos()
-            chat_id_str = str(chat_id)
-            
-            # Ativar grupo se existir
-            if chat_id_str in grupos:
-                grupos[chat_id_str]['ativo'] = True
-                # Salvar alterações
-                self.save_grupos(grupos)
-                logger.info(f"Grupo ativado: {chat_id}")
-                return True
-            else:
-                logger.info(f"Tentativa de ativar grupo inexistente: {chat_id}")
-                return False
-        except Exception as e:
-            logger.error(f"Erro ao ativar grupo: {str(e)}")
-            return False
+        if self._definir_ativo(chat_id, True):
+            logger.info(f"Grupo ativado: {chat_id}")
+            return True
+        logger.info(f"Tentativa de ativar grupo inexistente: {chat_id}")
+        return False
     
     def save_grupos(self, grupos):
         """
-        Salva o dicionário de grupos no arquivo
+        Substitui todos os grupos e grava imediatamente
         
         Args:
             grupos: Dicionário com IDs dos grupos como chaves e status como valores
         """
-        try:
-            with open(self.grupos_file, 'w') as f:
-                json.dump(grupos, f, indent=4)
-        except Exception as e:
-            logger.error(f"Erro ao salvar grupos: {str(e)}")
+        with self._lock:
+            anteriores = list(self._grupos)
+            self._indexar({str(chat_id): dict(status) for chat_id, status in grupos.items()})
+            self._alterados.update(anteriores, self._grupos)
+        self.flush(forcar=True)
@@ -0,0 +1,3 @@
+"""
+Módulo benchmarks - Medições de desempenho da automação
+"""
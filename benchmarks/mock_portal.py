@@ -0,0 +1,435 @@
+"""
+Portal IBPT simulado para benchmarks e execuções locais da automação
+
+Servidor HTTP local que imita as rotas usadas por IBPTAutomation e
+IBPTVersionChecker: página inicial com o comunicado da versão, login,
+página da empresa, solicitação de tabela, histórico e download do ZIP.
+
+A geração da tabela leva um tempo configurável, o tamanho das páginas e dos
+arquivos pode ser ajustado e há injeção de falhas (respostas 500 e conexões
+interrompidas no meio do download) para exercitar os caminhos de repetição.
+
+Uso isolado:
+    python -m benchmarks.mock_portal [--porta 8080] [--atraso 5]
+
+    URL_IBPT=http://127.0.0.1:8080 IBPT_USERNAME=usuario@exemplo.com IBPT_PASSWORD=senha \
+    CNPJ_EMPRESA=12345678910 python run.py --modo automacao
+"""
+import argparse
+import datetime
+import io
+import json
+import multiprocessing
+import random
+import re
+import secrets
+import threading
+import time
+import zipfile
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import requests
+
+from benchmarks import paginas_exemplo
+
+COOKIE_SESSAO = ".AspNetCore.Session"
+
+ROTAS = [
+    ('GET', r'/$', 'inicial'),
+    ('GET', r'/Site/Entrar$', 'entrar'),
+    ('POST', r'/Usuario/Login$', 'login'),
+    ('GET', r'/Empresa/Home$', 'empresa'),
+    ('GET', r'/TabelaAliquota/Solicitar$', 'solicitar'),
+    ('POST', r'/TabelaAliquota/Solicitar$', 'solicitar_post'),
+    ('GET', r'/TabelaAliquota/Historico$', 'historico'),
+    ('GET', r'/TabelaAliquota/Download/\d+/\d{17}/(\d+)$', 'download'),
+    ('GET', r'/_simulador/estatisticas$', '_estatisticas'),
+    ('POST', r'/_simulador/zerar$', '_zerar'),
+]
+
+
+class PortalSimulado:
+    """
+    Estado do portal simulado e servidor HTTP que o expõe
+    """
+
+    def __init__(self, cnpj="12345678910", usuario="usuario@exemplo.com", senha="senha",
+                 versao="25.2.A", vigencia_inicio="20/06/2025", vigencia_fim="31/07/2025",
+                 atraso_geracao=2.0, preenchimento=50, historico_inicial=10, linhas_por_estado=2000,
+                 taxa_falha=0.0, rotas_com_falha=('historico', 'download'), quedas_download=0,
+                 host="127.0.0.1", porta=0, semente=None):
+        """
+        Args:
+            atraso_geracao: Segundos até uma tabela solicitada ficar disponível
+            preenchimento: Blocos de conteúdo extra em cada página (controla o tamanho do HTML)
+            historico_inicial: Gerações anteriores já presentes no histórico
+            linhas_por_estado: Linhas do CSV de cada estado no ZIP gerado
+            taxa_falha: Probabilidade de uma requisição às rotas_com_falha responder 500
+            quedas_download: Quantos downloads serão interrompidos no meio da transferência
+            porta: Porta do servidor (0 escolhe uma porta livre)
+        """
+        self.cnpj = cnpj
+        self.usuario = usuario
+        self.senha = senha
+        self.versao = versao
+        self.vigencia_inicio = vigencia_inicio
+        self.vigencia_fim = vigencia_fim
+        self.atraso_geracao = atraso_geracao
+        self.preenchimento = preenchimento
+        self.linhas_por_estado = linhas_por_estado
+        self.taxa_falha = taxa_falha
+        self.rotas_com_falha = set(rotas_com_falha)
+        self.quedas_download = quedas_download
+        self._aleatorio = random.Random(semente)
+
+        self.requisicoes = Counter()
+        self.bytes_enviados = 0
+        self.sessoes = set()
+        self._lock = threading.Lock()
+        self._zips = {}
+
+        # Gerações anteriores: a partir de ontem, para não serem confundidas com a da execução
+        self.arquivos = []
+        for registro in paginas_exemplo.historico_exemplo(historico_inicial, pendentes=0):
+            self._adicionar_arquivo(
+                paginas_exemplo.ESTADOS_PADRAO,
+                registro['criado_em'] - datetime.timedelta(days=1),
+                pronto_em=0
+            )
+
+        self._servidor = ThreadingHTTPServer((host, porta), self._criar_handler())
+        self._servidor.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, porta = self._servidor.server_address[:2]
+        return f"http://{host}:{porta}"
+
+    def iniciar(self):
+        self._thread = threading.Thread(target=self._servidor.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def parar(self):
+        self._servidor.shutdown()
+        self._servidor.server_close()
+
+    def __enter__(self):
+        return self.iniciar()
+
+    def __exit__(self, *exc):
+        self.parar()
+
+    def zerar_contagem(self):
+        with self._lock:
+            self.requisicoes.clear()
+            self.bytes_enviados = 0
+
+    def expirar_sessoes(self):
+        """Invalida todos os logins, como o portal faz ao expirar a sessão"""
+        with self._lock:
+            self.sessoes.clear()
+
+    def publicar_versao(self, versao, vigencia_inicio, vigencia_fim):
+        """Troca a versão anunciada na página inicial"""
+        with self._lock:
+            self.versao = versao
+            self.vigencia_inicio = vigencia_inicio
+            self.vigencia_fim = vigencia_fim
+            self._zips.clear()
+
+    def _adicionar_arquivo(self, estados, criado_em, pronto_em):
+        arquivo = {
+            'id': len(self.arquivos),
+            'criado_em': criado_em.replace(microsecond=0),
+            'estados': list(estados),
+            'pronto_em': pronto_em
+        }
+        self.arquivos.append(arquivo)
+        return arquivo
+
+    def _registros_historico(self):
+        agora = time.monotonic()
+        with self._lock:
+            arquivos = sorted(self.arquivos, key=lambda a: a['criado_em'], reverse=True)
+        return [dict(a, pendente=agora < a['pronto_em']) for a in arquivos]
+
+    def conteudo_zip(self, estados):
+        """ZIP da tabela para os estados, gerado uma vez por combinação"""
+        chave = tuple(sorted(estados))
+        with self._lock:
+            if chave in self._zips:
+                return self._zips[chave]
+
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
+            for uf in chave:
+                linhas = ["codigo;ex;tipo;descricao;nacionalfederal;importadosfederal;estadual;municipal"]
+                aleatorio = random.Random(f"{uf}{self.versao}")
+                for i in range(self.linhas_por_estado):
+                    linhas.append(
+                        f"{10000000 + i * 7};;0;Produto {uf} {i};{aleatorio.uniform(5, 30):.2f};"
+                        f"{aleatorio.uniform(5, 30):.2f};{aleatorio.uniform(0, 20):.2f};0.00"
+                    )
+                zip_file.writestr(f"TabelaIBPTax{uf}{self.versao}.csv", "\n".join(linhas))
+
+        conteudo = buffer.getvalue()
+        with self._lock:
+            self._zips[chave] = conteudo
+        return conteudo
+
+    def _criar_handler(self):
+        portal = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def handle(self):
+                # O cliente pode fechar a conexão antes do fim da resposta (leitura interrompida)
+                try:
+                    super().handle()
+                except (ConnectionResetError, BrokenPipeError):
+                    pass
+
+            def do_GET(self):
+                self._despachar('GET')
+
+            def do_POST(self):
+                self._despachar('POST')
+
+            def _despachar(self, metodo):
+                caminho = urlsplit(self.path).path
+                for metodo_rota, padrao, nome in ROTAS:
+                    match = re.match(padrao, caminho)
+                    if metodo_rota == metodo and match:
+                        break
+                else:
+                    self._responder(404, "Não encontrado")
+                    return
+
+                if nome.startswith('_'):
+                    getattr(self, f"_rota{nome}")()
+                    return
+
+                with portal._lock:
+                    portal.requisicoes[nome] += 1
+                if nome in portal.rotas_com_falha and portal._aleatorio.random() < portal.taxa_falha:
+                    self._responder(500, "Erro interno simulado")
+                    return
+
+                getattr(self, f"_rota_{nome}")(*match.groups())
+
+            def _ler_formulario(self):
+                tamanho = int(self.headers.get('Content-Length', 0))
+                return parse_qs(self.rfile.read(tamanho).decode('utf-8'))
+
+            def _autenticado(self):
+                cookies = self.headers.get('Cookie', '')
+                match = re.search(rf'{re.escape(COOKIE_SESSAO)}=([\w-]+)', cookies)
+                return bool(match) and match.group(1) in portal.sessoes
+
+            def _responder(self, status, corpo, cabecalhos=None):
+                dados = corpo.encode('utf-8') if isinstance(corpo, str) else corpo
+                self.send_response(status)
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                self.send_header('Content-Length', str(len(dados)))
+                for nome, valor in (cabecalhos or {}).items():
+                    self.send_header(nome, valor)
+                self.end_headers()
+                self.wfile.write(dados)
+                with portal._lock:
+                    portal.bytes_enviados += len(dados)
+
+            def _redirecionar(self, destino, cabecalhos=None):
+                self._responder(302, "", dict(cabecalhos or {}, Location=destino))
+
+            def _rota_estatisticas(self):
+                with portal._lock:
+                    dados = {'requisicoes': dict(portal.requisicoes), 'bytes_enviados': portal.bytes_enviados}
+                self._responder(200, json.dumps(dados), {'Content-Type': 'application/json'})
+
+            def _rota_zerar(self):
+                portal.zerar_contagem()
+                self._responder(204, "")
+
+            def _rota_inicial(self):
+                etag = f'"{portal.versao}"'
+                if self.headers.get('If-None-Match') == etag:
+                    self._responder(304, "", {'ETag': etag})
+                    return
+                pagina = paginas_exemplo.pagina_inicial(
+                    portal.versao, portal.vigencia_inicio, portal.vigencia_fim, preenchimento=portal.preenchimento * 8
+                )
+                self._responder(200, pagina, {'ETag': etag})
+
+            def _rota_entrar(self):
+                self._responder(200, paginas_exemplo.pagina_login(preenchimento=portal.preenchimento))
+
+            def _rota_login(self):
+                dados = self._ler_formulario()
+                if dados.get('Email') != [portal.usuario] or dados.get('Senha') != [portal.senha]:
+                    self._redirecionar("/Site/Entrar")
+                    return
+                sessao = secrets.token_hex(16)
+                with portal._lock:
+                    portal.sessoes.add(sessao)
+                self._redirecionar("/Empresa/Home", {'Set-Cookie': f"{COOKIE_SESSAO}={sessao}; Path=/; HttpOnly"})
+
+            def _rota_empresa(self):
+                if not self._autenticado():
+                    self._redirecionar("/Site/Entrar")
+                    return
+                self._responder(200, paginas_exemplo.pagina_empresa(preenchimento=portal.preenchimento))
+
+            def _rota_solicitar(self):
+                if not self._autenticado():
+                    self._redirecionar("/Site/Entrar")
+                    return
+                pagina = paginas_exemplo.pagina_solicitar(cnpj=portal.cnpj, preenchimento=portal.preenchimento)
+                self._responder(200, pagina)
+
+            def _rota_solicitar_post(self):
+                if not self._autenticado():
+                    self._redirecionar("/Site/Entrar")
+                    return
+                estados = self._ler_formulario().get('Estados', [])
+                with portal._lock:
+                    portal._adicionar_arquivo(
+                        estados, datetime.datetime.now(), time.monotonic() + portal.atraso_geracao
+                    )
+                self._responder(200, paginas_exemplo.pagina_solicitacao_enviada(preenchimento=portal.preenchimento))
+
+            def _rota_historico(self):
+                if not self._autenticado():
+                    self._redirecionar("/Site/Entrar")
+                    return
+                pagina = paginas_exemplo.pagina_historico(
+                    portal._registros_historico(), cnpj=portal.cnpj, preenchimento=portal.preenchimento
+                )
+                self._responder(200, pagina)
+
+            def _rota_download(self, arquivo_id):
+                arquivo_id = int(arquivo_id)
+                if not self._autenticado() or arquivo_id >= len(portal.arquivos):
+                    self._responder(404, "Arquivo não encontrado")
+                    return
+                conteudo = portal.conteudo_zip(portal.arquivos[arquivo_id]['estados'])
+
+                inicio = 0
+                match = re.match(r'bytes=(\d+)-', self.headers.get('Range', ''))
+                if match and int(match.group(1)) < len(conteudo):
+                    inicio = int(match.group(1))
+                parte = conteudo[inicio:]
+
+                self.send_response(206 if inicio else 200)
+                self.send_header('Content-Type', 'application/zip')
+                self.send_header('Content-Length', str(len(parte)))
+                self.send_header('Accept-Ranges', 'bytes')
+                if inicio:
+                    self.send_header('Content-Range', f"bytes {inicio}-{len(conteudo) - 1}/{len(conteudo)}")
+                self.end_headers()
+
+                with portal._lock:
+                    interromper = portal.quedas_download > 0
+                    if interromper:
+                        portal.quedas_download -= 1
+                if interromper:
+                    # Envia metade do conteúdo e derruba a conexão
+                    self.wfile.write(parte[:len(parte) // 2])
+                    self.wfile.flush()
+                    self.close_connection = True
+                    with portal._lock:
+                        portal.bytes_enviados += len(parte) // 2
+                    return
+
+                self.wfile.write(parte)
+                with portal._lock:
+                    portal.bytes_enviados += len(parte)
+
+        return Handler
+
+
+def _servir(config, conexao):
+    portal = PortalSimulado(**config)
+    conexao.send({'url': portal.url, 'cnpj': portal.cnpj, 'usuario': portal.usuario, 'senha': portal.senha})
+    try:
+        portal._servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+class ProcessoPortal:
+    """
+    Portal simulado em um processo separado
+
+    Mantém o trabalho do servidor (geração dos ZIPs, montagem das páginas) fora
+    das medições de tempo e memória do processo que roda a automação. As
+    contagens são lidas pela rota interna /_simulador/estatisticas.
+
+    Args:
+        **config: Argumentos de PortalSimulado
+    """
+
+    def __init__(self, **config):
+        self.config = config
+        self.url = None
+        self.cnpj = None
+        self.usuario = None
+        self.senha = None
+        self._processo = None
+
+    def iniciar(self):
+        receptor, emissor = multiprocessing.Pipe(duplex=False)
+        self._processo = multiprocessing.Process(target=_servir, args=(self.config, emissor), daemon=True)
+        self._processo.start()
+        for nome, valor in receptor.recv().items():
+            setattr(self, nome, valor)
+        return self
+
+    def parar(self):
+        self._processo.terminate()
+        self._processo.join()
+
+    def __enter__(self):
+        return self.iniciar()
+
+    def __exit__(self, *exc):
+        self.parar()
+
+    def estatisticas(self):
+        """
+        Returns:
+            dict: 'requisicoes' por rota e 'bytes_enviados' desde a última contagem zerada
+        """
+        return requests.get(f"{self.url}/_simulador/estatisticas").json()
+
+    def zerar_contagem(self):
+        requests.post(f"{self.url}/_simulador/zerar")
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Portal IBPT simulado')
+    arg_parser.add_argument('--porta', type=int, default=8080)
+    arg_parser.add_argument('--atraso', type=float, default=5.0, help='Segundos para gerar cada tabela')
+    arg_parser.add_argument('--falhas', type=float, default=0.0, help='Probabilidade de erro 500 no histórico e download')
+    arg_parser.add_argument('--quedas', type=int, default=0, help='Downloads interrompidos no meio da transferência')
+    args = arg_parser.parse_args()
+
+    portal = PortalSimulado(
+        atraso_geracao=args.atraso, taxa_falha=args.falhas, quedas_download=args.quedas, porta=args.porta
+    )
+    print(f"🌐 Portal simulado em {portal.url} (usuário: {portal.usuario}, senha: {portal.senha}, CNPJ: {portal.cnpj})")
+    try:
+        portal._servidor.serve_forever()
+    except KeyboardInterrupt:
+        portal.parar()
+
+
+if __name__ == "__main__":
+    main()
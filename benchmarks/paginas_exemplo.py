@@ -0,0 +1,105 @@
+"""
+Páginas sintéticas com a mesma estrutura das páginas do portal IBPT
+
+Usadas pelos benchmarks quando não há cópias salvas das páginas reais.
+"""
+import datetime
+
+ESTADOS_PADRAO = [
+    'AC', 'AL', 'AM', 'AP', 'BA', 'CE', 'DF', 'ES', 'GO', 'MA', 'MG', 'MS', 'MT', 'PA',
+    'PB', 'PE', 'PI', 'PR', 'RJ', 'RN', 'RO', 'RR', 'RS', 'SC', 'SE', 'SP', 'TO'
+]
+
+
+def _layout(titulo, corpo, preenchimento=0):
+    """Envolve o corpo no layout comum do portal, com menus e scripts de preenchimento"""
+    menu = "".join(f'<li class="nav-item"><a class="nav-link" href="/Pagina/{i}">Item {i}</a></li>' for i in range(40))
+    extra = "".join(f'<div class="bloco"><p>Conteúdo institucional {i}</p></div>' for i in range(preenchimento))
+    return (
+        f"<!DOCTYPE html><html><head><title>{titulo}</title>"
+        '<link rel="stylesheet" href="/css/site.css"><script src="/js/site.js"></script></head>'
+        f'<body><nav><ul class="navbar-nav">{menu}</ul></nav>'
+        f'<div class="container">{corpo}</div>{extra}'
+        "<footer>De Olho no Imposto</footer></body></html>"
+    )
+
+
+def pagina_login(token="CfDJ8Token0123456789", preenchimento=50):
+    corpo = (
+        '<form method="post" action="/Usuario/Login">'
+        f'<input name="__RequestVerificationToken" type="hidden" value="{token}">'
+        '<input name="Email" type="email"><input name="Senha" type="password">'
+        '<input name="RememberMe" type="checkbox" value="true"></form>'
+    )
+    return _layout("Entrar - De Olho no Imposto", corpo, preenchimento)
+
+
+def pagina_empresa(preenchimento=50):
+    corpo = '<h2>Minha Empresa</h2><a href="/Empresa/Editar">Gerenciar empresa</a>'
+    return _layout("Minha Empresa", corpo, preenchimento)
+
+
+def pagina_solicitar(cnpj="12345678910", token="CfDJ8Token0123456789", estados=None, preenchimento=50):
+    estados = estados or ESTADOS_PADRAO
+    opcoes = "".join(
+        f'<label><input name="Estados" type="checkbox" value="{uf}"> {uf}</label>' for uf in estados
+    )
+    corpo = (
+        f'<h3>Solicitar tabela - {cnpj}</h3>'
+        f'<form method="post" action="/TabelaAliquota/Solicitar?cnpj={cnpj}">'
+        f'<input name="__RequestVerificationToken" type="hidden" value="{token}">{opcoes}'
+        '<select name="FinalidadeArquivo"><option>Tabela</option></select></form>'
+    )
+    return _layout("Solicitar tabela", corpo, preenchimento)
+
+
+def pagina_solicitacao_enviada(preenchimento=50):
+    corpo = '<div class="alert alert-success">Solicitação recebida. Acompanhe no histórico.</div>'
+    return _layout("Solicitar tabela", corpo, preenchimento)
+
+
+def pagina_historico(registros, cnpj="12345678910", preenchimento=50):
+    """
+    Args:
+        registros: Lista de dicts com 'criado_em' (datetime), 'estados' (list), 'pendente' (bool)
+                   e, opcionalmente, 'id' (identificador estável do arquivo)
+    """
+    linhas = []
+    for i, registro in enumerate(registros):
+        arquivo_id = registro.get('id', i)
+        timestamp = registro['criado_em'].strftime("%Y%m%d%H%M%S") + f"{arquivo_id % 1000:03d}"
+        if registro.get('pendente'):
+            acao = '<span class="pendente">Processando</span>'
+        else:
+            acao = f'<a class="btn btn-success" href="/TabelaAliquota/Download/{cnpj}/{timestamp}/{arquivo_id}">Baixar</a>'
+        linhas.append(
+            f"<tr><td>{registro['criado_em'].strftime('%d/%m/%Y %H:%M:%S')}</td>"
+            f"<td>{', '.join(registro['estados'])}</td><td>Tabela</td><td>{acao}</td></tr>"
+        )
+    corpo = (
+        '<table class="table table-striped"><thead><tr><th>Data</th><th>Estados</th>'
+        f'<th>Finalidade</th><th></th></tr></thead><tbody>{"".join(linhas)}</tbody></table>'
+    )
+    return _layout("Histórico", corpo, preenchimento)
+
+
+def pagina_inicial(versao="25.2.A", inicio="20/06/2025", fim="31/07/2025", preenchimento=400):
+    corpo = (
+        '<div id="popupshadow"><div class="popup"><h4>Comunicado</h4>'
+        f'<p>Versão {versao} da tabela disponível, vigente de {inicio} até {fim}.</p></div></div>'
+    )
+    return _layout("De Olho no Imposto", corpo, preenchimento)
+
+
+def historico_exemplo(quantidade=30, pendentes=1, estados=None):
+    """Registros de histórico com gerações diárias, os mais recentes primeiro"""
+    agora = datetime.datetime.now().replace(microsecond=0)
+    estados = estados or ESTADOS_PADRAO
+    return [
+        {
+            'criado_em': agora - datetime.timedelta(days=i),
+            'estados': estados,
+            'pendente': i < pendentes
+        }
+        for i in range(quantidade)
+    ]
@@ -0,0 +1,139 @@
+"""
+Micro-benchmark dos backends de parsing HTML
+
+Mede, para cada página usada pela automação, o tempo e a memória das
+mesmas extrações feitas por IBPTAutomation e IBPTVersionChecker.
+
+Uso:
+    python -m benchmarks.parser_bench [--paginas DIRETORIO] [--repeticoes N]
+
+O diretório de páginas pode conter cópias salvas das páginas reais do portal
+(login.html, empresa.html, solicitar.html, historico.html, inicial.html). Os
+arquivos de debug gerados pela automação (ex: login_page_debug.html) servem
+para isso. Páginas ausentes são substituídas por versões sintéticas.
+"""
+import argparse
+import os
+import timeit
+import tracemalloc
+
+from app.core.parser_html import BACKENDS
+from app.core.ibpt_automation import ERROR_CLASSES, SUCCESS_CLASSES
+from benchmarks import paginas_exemplo
+
+
+def _extrair_login(parser, html):
+    doc = parser.carregar(html)
+    return parser.titulo(doc), parser.csrf_token(doc)
+
+
+def _extrair_solicitar(parser, html):
+    doc = parser.carregar(html)
+    return (
+        parser.mensagens(doc, ERROR_CLASSES),
+        parser.tem_formulario(doc),
+        parser.contar_inputs(doc, "Estados"),
+        parser.csrf_token(doc),
+        parser.mensagens(doc, SUCCESS_CLASSES),
+    )
+
+
+def _extrair_historico(parser, html):
+    return parser.linhas_historico(parser.carregar(html))
+
+
+def _extrair_inicial(parser, html):
+    return parser.texto_por_id(parser.carregar(html), 'popupshadow')
+
+
+CENARIOS = [
+    ('login', 'login.html', paginas_exemplo.pagina_login, _extrair_login),
+    ('solicitar', 'solicitar.html', paginas_exemplo.pagina_solicitar, _extrair_solicitar),
+    ('historico', 'historico.html',
+     lambda: paginas_exemplo.pagina_historico(paginas_exemplo.historico_exemplo(50)), _extrair_historico),
+    ('inicial', 'inicial.html', paginas_exemplo.pagina_inicial, _extrair_inicial),
+]
+
+
+def carregar_paginas(diretorio):
+    """Lê as páginas salvas, usando as sintéticas para as que faltarem"""
+    paginas = {}
+    for nome, arquivo, gerar, _ in CENARIOS:
+        caminho = os.path.join(diretorio, arquivo) if diretorio else None
+        if caminho and os.path.exists(caminho):
+            with open(caminho, 'rb') as f:
+                paginas[nome] = (f.read(), 'salva')
+        else:
+            paginas[nome] = (gerar().encode('utf-8'), 'sintética')
+    return paginas
+
+
+def _memoria_residente():
+    """Memória residente do processo em KB (Linux) ou None"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024
+    except (OSError, ValueError):
+        return None
+
+
+def medir(parser, html, extrair, repeticoes, documentos=200):
+    """
+    Returns:
+        tuple: (tempo médio em ms, memória por documento em KB)
+
+    A memória é medida pelo crescimento da memória residente ao manter vários
+    documentos carregados, o que inclui as alocações em C do libxml2. Fora do
+    Linux, usa o pico do tracemalloc (apenas alocações Python).
+    """
+    tempos = timeit.repeat(lambda: extrair(parser, html), number=repeticoes, repeat=3)
+    tempo_ms = min(tempos) / repeticoes * 1000
+
+    antes = _memoria_residente()
+    if antes is not None:
+        mantidos = [parser.carregar(html) for _ in range(documentos)]
+        depois = _memoria_residente()
+        del mantidos
+        return tempo_ms, max(depois - antes, 0) / documentos
+
+    tracemalloc.start()
+    doc = parser.carregar(html)
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del doc
+    return tempo_ms, pico / 1024
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Benchmark dos backends de parsing HTML')
+    arg_parser.add_argument('--paginas', default='benchmarks/paginas', help='Diretório com páginas salvas do portal')
+    arg_parser.add_argument('--repeticoes', type=int, default=50, help='Execuções por medição')
+    args = arg_parser.parse_args()
+
+    parsers = {}
+    for nome, backend in BACKENDS.items():
+        try:
+            parsers[nome] = backend()
+        except ImportError:
+            print(f"⚠️ Backend {nome} indisponível (dependência não instalada)")
+
+    paginas = carregar_paginas(args.paginas)
+
+    print(f"{'Página':<12}{'Origem':<11}{'Tamanho':>10}  {'Backend':<6}{'Tempo (ms)':>12}{'KB/documento':>14}")
+    print("-" * 67)
+    for nome, _, _, extrair in CENARIOS:
+        html, origem = paginas[nome]
+        resultados = {}
+        for nome_backend, parser in parsers.items():
+            resultados[nome_backend] = medir(parser, html, extrair, args.repeticoes)
+            tempo_ms, memoria_kb = resultados[nome_backend]
+            print(f"{nome:<12}{origem:<11}{len(html):>10}  {nome_backend:<6}{tempo_ms:>12.3f}{memoria_kb:>14.1f}")
+
+        if 'bs4' in resultados and 'lxml' in resultados:
+            ganho_tempo = resultados['bs4'][0] / resultados['lxml'][0]
+            ganho_memoria = resultados['bs4'][1] / max(resultados['lxml'][1], 0.1)
+            print(f"{'':<12}↳ lxml {ganho_tempo:.1f}x mais rápido, {ganho_memoria:.1f}x menos memória")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+"""
+Benchmark ponta a ponta do pipeline de verificação e download
+
+Executa IBPTVersionChecker.needs_update e IBPTAutomation.run_automation contra
+o portal simulado (benchmarks.mock_portal) e mede, por etapa do pipeline, o
+tempo total, o número de requisições HTTP e o pico de memória.
+
+Uso:
+    python -m benchmarks.pipeline_bench [--execucoes N] [--atraso S] [--lotes N] [--reuso]
+
+Todos os arquivos de estado (versão, cache de sessão, histórico de gerações,
+ZIP baixado) ficam em um diretório temporário, sem tocar em data/.
+"""
+import argparse
+import contextlib
+import datetime
+import functools
+import os
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import defaultdict
+
+from app.core.ibpt_automation import IBPTAutomation
+from app.core.sessao import criar_sessao
+from app.core.version_checker import IBPTVersionChecker
+from benchmarks import paginas_exemplo
+from benchmarks.mock_portal import ProcessoPortal
+
+# (etapa, método instrumentado)
+ETAPAS_VERSAO = [
+    ('versao', 'get_current_version_info'),
+]
+ETAPAS_AUTOMACAO = [
+    ('login', 'garantir_login'),
+    ('reuso', 'buscar_arquivo_existente'),
+    ('solicitacao', 'request_table_download'),
+    ('espera', 'check_download_status'),
+    ('espera', 'check_lotes_status'),
+    ('download', 'download_file'),
+    ('mescla', '_mesclar_arquivos'),
+]
+
+
+class Medidor:
+    """
+    Acumula tempo, requisições e pico de memória por etapa
+
+    Cada requisição é atribuída à etapa mais interna em andamento na thread
+    que a fez, o que mantém a contagem correta nos downloads em paralelo.
+    """
+
+    def __init__(self):
+        self.tempos = defaultdict(float)
+        self.chamadas = defaultdict(int)
+        self.requisicoes = defaultdict(int)
+        self.picos = defaultdict(int)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def instrumentar(self, objeto, etapas):
+        for etapa, metodo in etapas:
+            setattr(objeto, metodo, self._envolver(etapa, getattr(objeto, metodo)))
+
+    def observar_sessao(self, sessao):
+        sessao.hooks['response'].append(self._contar_requisicao)
+
+    def _contar_requisicao(self, response, *args, **kwargs):
+        with self._lock:
+            self.requisicoes[getattr(self._local, 'etapa', None) or 'outros'] += 1
+
+    def _envolver(self, etapa, funcao):
+        @functools.wraps(funcao)
+        def medido(*args, **kwargs):
+            anterior = getattr(self._local, 'etapa', None)
+            self._local.etapa = etapa
+            tracemalloc.reset_peak()
+            memoria_inicial, _ = tracemalloc.get_traced_memory()
+            inicio = time.perf_counter()
+            try:
+                return funcao(*args, **kwargs)
+            finally:
+                duracao = time.perf_counter() - inicio
+                _, pico = tracemalloc.get_traced_memory()
+                pico -= memoria_inicial
+                self._local.etapa = anterior
+                with self._lock:
+                    self.tempos[etapa] += duracao
+                    self.chamadas[etapa] += 1
+                    self.picos[etapa] = max(self.picos[etapa], pico)
+        return medido
+
+    def relatorio(self, titulo):
+        print(f"\n{titulo}")
+        print(f"{'Etapa':<13}{'Chamadas':>9}{'Tempo (s)':>11}{'Requisições':>13}{'Pico (KB)':>11}")
+        print("-" * 57)
+        etapas = list(dict.fromkeys(list(self.tempos) + list(self.requisicoes)))
+        for etapa in etapas:
+            print(
+                f"{etapa:<13}{self.chamadas.get(etapa, 0):>9}{self.tempos.get(etapa, 0):>11.3f}"
+                f"{self.requisicoes.get(etapa, 0):>13}{self.picos.get(etapa, 0) / 1024:>11.1f}"
+            )
+
+
+def executar(portal, diretorio, args, saida):
+    """
+    Uma execução completa, como em app.main.run_ibpt_automation
+
+    Returns:
+        tuple: (Medidor, tempo total em segundos, resultado)
+    """
+    medidor = Medidor()
+    session_file = os.path.join(diretorio, 'sessao.json')
+    sessao = criar_sessao(session_file)
+    medidor.observar_sessao(sessao)
+
+    checker = IBPTVersionChecker(
+        version_file=os.path.join(diretorio, 'versao.txt'),
+        base_url=portal.url,
+        session=sessao,
+        parser=args.parser,
+        probe_file=os.path.join(diretorio, 'version_probe.json')
+    )
+    medidor.instrumentar(checker, ETAPAS_VERSAO)
+
+    inicio = time.perf_counter()
+    with saida:
+        needs_update, current_info, last_info = checker.needs_update()
+        resultado = "atualizada"
+        if needs_update or args.forcar:
+            # Sem versão nova (--forcar), vale a detecção registrada no último download
+            detectada_em = None
+            deteccao = (current_info or {}).get('detectada_em') or (last_info or {}).get('detectada_em')
+            if args.reuso and deteccao:
+                detectada_em = datetime.datetime.fromisoformat(deteccao)
+
+            ibpt = IBPTAutomation(
+                cnpj=portal.cnpj,
+                base_url=portal.url,
+                historico_file=os.path.join(diretorio, 'historico_geracao.json'),
+                session=sessao,
+                cookies_file=session_file,
+                parser=args.parser
+            )
+            medidor.instrumentar(ibpt, ETAPAS_AUTOMACAO)
+            sucesso = ibpt.run_automation(
+                username=portal.usuario,
+                password=portal.senha,
+                estados=paginas_exemplo.ESTADOS_PADRAO[:args.estados],
+                output_path=os.path.join(diretorio, 'tabela_ibpt.zip'),
+                tamanho_lote=args.lotes,
+                max_workers=args.workers,
+                max_attempts=args.tentativas,
+                delay=args.delay,
+                detectada_em=detectada_em
+            )
+            resultado = "sucesso" if sucesso else "falha"
+            if sucesso and current_info:
+                checker.mark_as_downloaded(current_info)
+
+    return medidor, time.perf_counter() - inicio, resultado
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Benchmark ponta a ponta contra o portal simulado')
+    arg_parser.add_argument('--execucoes', type=int, default=2, help='Execuções seguidas, com os mesmos arquivos de estado')
+    arg_parser.add_argument('--forcar', action='store_true', help='Baixar a tabela mesmo quando já estiver atualizada')
+    arg_parser.add_argument('--reuso', action='store_true', help='Permitir reaproveitar arquivos já gerados no portal')
+    arg_parser.add_argument('--estados', type=int, default=27, help='Quantidade de estados solicitados')
+    arg_parser.add_argument('--lotes', type=int, default=0, help='Estados por lote (0 desativa o modo em lotes)')
+    arg_parser.add_argument('--workers', type=int, default=4, help='Lotes simultâneos')
+    arg_parser.add_argument('--parser', default='auto', help='Backend de parsing HTML (auto, lxml, bs4)')
+    arg_parser.add_argument('--delay', type=int, default=1, help='Intervalo base entre consultas ao histórico (s)')
+    arg_parser.add_argument('--tentativas', type=int, default=30, help='Máximo de consultas ao histórico')
+    arg_parser.add_argument('--atraso', type=float, default=2.0, help='Tempo de geração da tabela no portal (s)')
+    arg_parser.add_argument('--preenchimento', type=int, default=50, help='Blocos extras por página (tamanho do HTML)')
+    arg_parser.add_argument('--historico', type=int, default=10, help='Gerações anteriores no histórico')
+    arg_parser.add_argument('--linhas', type=int, default=2000, help='Linhas do CSV de cada estado')
+    arg_parser.add_argument('--falhas', type=float, default=0.0, help='Probabilidade de erro 500 no histórico e download')
+    arg_parser.add_argument('--quedas', type=int, default=0, help='Downloads interrompidos no meio da transferência')
+    arg_parser.add_argument('--verbose', action='store_true', help='Mostrar a saída da automação')
+    args = arg_parser.parse_args()
+
+    # O portal roda em outro processo para não entrar nas medições de tempo e memória
+    portal = ProcessoPortal(
+        atraso_geracao=args.atraso,
+        preenchimento=args.preenchimento,
+        historico_inicial=args.historico,
+        linhas_por_estado=args.linhas,
+        taxa_falha=args.falhas,
+        quedas_download=args.quedas,
+        semente=0
+    )
+
+    with portal, tempfile.TemporaryDirectory(prefix='ibpt_bench_') as diretorio, open(os.devnull, 'w') as nulo:
+        print(f"🌐 Portal simulado em {portal.url}")
+        # Só depois de iniciar o portal, para que o processo dele não herde o rastreamento
+        tracemalloc.start()
+        for execucao in range(1, args.execucoes + 1):
+            portal.zerar_contagem()
+            saida = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(nulo)
+            medidor, total, resultado = executar(portal, diretorio, args, saida)
+            medidor.relatorio(f"Execução {execucao}: {resultado} em {total:.3f}s")
+
+            estatisticas = portal.estatisticas()
+            requisicoes = estatisticas['requisicoes']
+            rotas = ", ".join(f"{rota}={qtd}" for rota, qtd in sorted(requisicoes.items()))
+            print(f"Portal: {sum(requisicoes.values())} requisições ({rotas}), "
+                  f"{estatisticas['bytes_enviados'] / 1024:.0f} KB enviados")
+    tracemalloc.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,303 @@
+"""
+API do Telegram simulada e cliente de webhook para testes locais do bot
+
+TelegramSimulado é um servidor local que responde às chamadas da Bot API
+usadas pelo bot (getMe, setWebhook, deleteWebhook, getUpdates, sendMessage,
+sendDocument...) e registra cada chamada. ClienteWebhook envia updates
+falsos ao servidor de webhook do bot, com o cabeçalho do segredo, como o
+Telegram faria. Juntos permitem exercitar o modo webhook sem rede.
+
+Uso:
+    python -m benchmarks.telegram_simulado [--updates 500] [--comando /help] [--fila 1000]
+
+O bot roda no mesmo processo, com todos os arquivos de estado em um
+diretório temporário.
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import socket
+import statistics
+import tempfile
+import threading
+import time
+from urllib.parse import parse_qsl
+
+import aiohttp
+from aiohttp import web
+
+TOKEN = "123456:TESTE"
+CABECALHO_SEGREDO = "X-Telegram-Bot-Api-Secret-Token"
+
+
+def porta_livre():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class TelegramSimulado:
+    """
+    Bot API simulada, rodando em uma thread com loop de eventos próprio
+    """
+
+    def __init__(self, porta=0, atraso=0.0):
+        """
+        Args:
+            porta: Porta do servidor (0 = porta livre)
+            atraso: Segundos de espera antes de cada resposta (latência da API)
+        """
+        self.porta = porta or porta_livre()
+        self.atraso = atraso
+        self.chamadas = []
+        self.webhook = None
+        self.enviadas = {}  # {chat_id: [instantes das respostas enviadas]}
+        self.avisos = 0  # Avisos de fila/adiamento ("⏳ ..."), não contados como resposta
+        self._ids = itertools.count(1)
+        self._loop = None
+        self._runner = None
+        self._pronto = threading.Event()
+        self._thread = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.porta}"
+
+    def iniciar(self):
+        self._thread = threading.Thread(target=self._executar, name="telegram-simulado", daemon=True)
+        self._thread.start()
+        self._pronto.wait()
+        return self
+
+    def parar(self):
+        if self._loop:
+            asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result()
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+
+    def __enter__(self):
+        return self.iniciar()
+
+    def __exit__(self, *exc):
+        self.parar()
+
+    def configurar_telebot(self):
+        """Aponta os clientes síncrono e assíncrono do pyTelegramBotAPI para este servidor"""
+        from telebot import apihelper, asyncio_helper
+        apihelper.API_URL = f"{self.url}/bot{{0}}/{{1}}"
+        asyncio_helper.API_URL = f"{self.url}/bot{{0}}/{{1}}"
+
+    def _executar(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        app = web.Application()
+        app.router.add_route('*', '/bot{token}/{metodo}', self._responder)
+        self._runner = web.AppRunner(app, access_log=None)
+        self._loop.run_until_complete(self._runner.setup())
+        self._loop.run_until_complete(web.TCPSite(self._runner, "127.0.0.1", self.porta).start())
+        self._pronto.set()
+        self._loop.run_forever()
+
+    def _mensagem(self, parametros, **extra):
+        chat_id = int(parametros.get('chat_id', 0))
+        mensagem = {
+            'message_id': next(self._ids),
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private' if chat_id > 0 else 'group'}
+        }
+        mensagem.update(extra)
+        if mensagem.get('text', '').startswith("⏳"):
+            self.avisos += 1
+        else:
+            self.enviadas.setdefault(chat_id, []).append(time.perf_counter())
+        return mensagem
+
+    async def _parametros(self, request):
+        """Parâmetros da chamada (query string, formulário ou multipart; os arquivos são descartados)"""
+        parametros = dict(request.query)
+        if not request.body_exists:
+            return parametros
+        # O cliente assíncrono envia os parâmetros no corpo também em GET
+        if request.content_type.startswith('multipart/'):
+            leitor = await request.multipart()
+            async for parte in leitor:
+                if parte.filename is None:
+                    parametros[parte.name] = await parte.text()
+                else:
+                    await parte.read()
+        else:
+            parametros.update(parse_qsl(await request.text()))
+        return parametros
+
+    async def _responder(self, request):
+        metodo = request.match_info['metodo']
+        parametros = await self._parametros(request)
+        self.chamadas.append((metodo, parametros))
+        if self.atraso:
+            await asyncio.sleep(self.atraso)
+
+        if metodo == 'getMe':
+            resultado = {'id': int(TOKEN.split(':')[0]), 'is_bot': True, 'first_name': 'IBPT', 'username': 'ibpt_teste_bot'}
+        elif metodo == 'setWebhook':
+            self.webhook = parametros
+            resultado = True
+        elif metodo == 'deleteWebhook':
+            self.webhook = None
+            resultado = True
+        elif metodo == 'getUpdates':
+            resultado = []
+        elif metodo == 'sendMessage':
+            resultado = self._mensagem(parametros, text=parametros.get('text', ''))
+        elif metodo == 'sendDocument':
+            file_id = f"arquivo-{next(self._ids)}"
+            resultado = self._mensagem(parametros, document={'file_id': file_id, 'file_unique_id': file_id})
+        else:
+            resultado = True
+        return web.json_response({'ok': True, 'result': resultado})
+
+    def contagem(self):
+        """Chamadas recebidas por método"""
+        contagem = {}
+        for metodo, _ in self.chamadas:
+            contagem[metodo] = contagem.get(metodo, 0) + 1
+        return contagem
+
+
+class ClienteWebhook:
+    """
+    Envia updates ao webhook do bot como o Telegram faria
+    """
+
+    def __init__(self, url, secret_token):
+        self.url = url
+        self.secret_token = secret_token
+        self._update_ids = itertools.count(1)
+
+    def update_comando(self, user_id, chat_id, texto, titulo=None):
+        comando = texto.split()[0]
+        chat = {'id': chat_id, 'type': 'private'} if chat_id > 0 else {'id': chat_id, 'type': 'group', 'title': titulo or f"Grupo {chat_id}"}
+        update_id = next(self._update_ids)
+        return {
+            'update_id': update_id,
+            'message': {
+                'message_id': update_id,
+                'date': int(time.time()),
+                'chat': chat,
+                'from': {'id': user_id, 'is_bot': False, 'first_name': f"Usuário {user_id}"},
+                'text': texto,
+                'entities': [{'type': 'bot_command', 'offset': 0, 'length': len(comando)}]
+            }
+        }
+
+    async def enviar(self, sessao, update, secret_token=None):
+        """
+        Returns:
+            int: Status HTTP da resposta do webhook
+        """
+        cabecalhos = {CABECALHO_SEGREDO: secret_token if secret_token is not None else self.secret_token}
+        async with sessao.post(self.url, json=update, headers=cabecalhos) as resposta:
+            return resposta.status
+
+
+def iniciar_bot(diretorio, porta, secret_token, capacidade_fila):
+    """Cria o bot com os arquivos de estado em `diretorio` e inicia o webhook em uma thread"""
+    # O módulo do bot grava o log em logs/telegram_bot.log
+    os.makedirs("logs", exist_ok=True)
+    from app.telegram.bot import TelegramBot
+    from app.utils.estado import EstadoJSON
+
+    def caminho(nome):
+        return os.path.join(diretorio, nome)
+
+    bot = TelegramBot(
+        TOKEN, caminho("grupos.json"), caminho("tabela.zip"), caminho("cache"), caminho("file_ids.json"),
+        broadcast_db=caminho("broadcasts.db"), offset_file=caminho("offset.json"),
+        estado=EstadoJSON(caminho("grupos.json"), caminho("blacklist.txt"), caminho("rate_limits.json"))
+    )
+    thread = threading.Thread(
+        target=bot.start_webhook,
+        kwargs=dict(url="https://exemplo.invalid/telegram", secret_token=secret_token, host="127.0.0.1",
+                    porta=porta, capacidade_fila=capacidade_fila),
+        name="bot-webhook", daemon=True
+    )
+    thread.start()
+    return bot, thread
+
+
+async def disparar(cliente, telegram, args):
+    async with aiohttp.ClientSession() as sessao:
+        # Aguardar o servidor do webhook subir
+        for _ in range(100):
+            try:
+                async with sessao.get(f"{cliente.url}/saude") as resposta:
+                    if resposta.status == 200:
+                        break
+            except aiohttp.ClientError:
+                await asyncio.sleep(0.05)
+
+        recusado = await cliente.enviar(sessao, cliente.update_comando(1, 1, args.comando), secret_token="errado")
+
+        enviados = {}
+        inicio = time.perf_counter()
+
+        async def enviar(indice):
+            user_id = 1000 + indice
+            enviados[user_id] = time.perf_counter()
+            status = await cliente.enviar(sessao, cliente.update_comando(user_id, user_id, args.comando))
+            if status != 200:
+                # Recusado (fila cheia): o Telegram reenviaria mais tarde; aqui não é aguardada resposta
+                del enviados[user_id]
+            return status
+
+        status = await asyncio.gather(*[enviar(i) for i in range(args.updates)])
+        aceitos = time.perf_counter() - inicio
+
+        # Aguardar as respostas do bot a cada chat
+        limite = time.perf_counter() + args.espera
+        while time.perf_counter() < limite and sum(1 for chat in enviados if chat in telegram.enviadas) < len(enviados):
+            await asyncio.sleep(0.05)
+        total = time.perf_counter() - inicio
+
+    latencias = [telegram.enviadas[chat][0] - instante for chat, instante in enviados.items() if chat in telegram.enviadas]
+    return recusado, status, aceitos, total, latencias
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Bot em modo webhook contra a API do Telegram simulada')
+    arg_parser.add_argument('--updates', type=int, default=500, help='Updates enviados ao webhook (um usuário por update)')
+    arg_parser.add_argument('--comando', default='/help', help='Comando enviado em cada update')
+    arg_parser.add_argument('--fila', type=int, default=1000, help='Capacidade da fila do webhook')
+    arg_parser.add_argument('--atraso', type=float, default=0.0, help='Latência simulada da API do Telegram (s)')
+    arg_parser.add_argument('--espera', type=float, default=30.0, help='Tempo máximo de espera pelas respostas (s)')
+    args = arg_parser.parse_args()
+
+    secret_token = "segredo-de-teste"
+    porta = porta_livre()
+    with TelegramSimulado(atraso=args.atraso) as telegram, tempfile.TemporaryDirectory(prefix='ibpt_webhook_') as diretorio:
+        telegram.configurar_telebot()
+        print(f"🌐 API do Telegram simulada em {telegram.url}")
+        bot, thread = iniciar_bot(diretorio, porta, secret_token, args.fila)
+        cliente = ClienteWebhook(f"http://127.0.0.1:{porta}/telegram", secret_token)
+        try:
+            recusado, status, aceitos, total, latencias = asyncio.run(disparar(cliente, telegram, args))
+        finally:
+            bot.stop_polling()
+            thread.join(timeout=30)
+
+        webhook = telegram.webhook or {}
+        print(f"Webhook registrado: {webhook.get('url')} (segredo {'ok' if webhook.get('secret_token') == secret_token else 'diferente'})")
+        print(f"Segredo inválido: HTTP {recusado}")
+        contagem_status = {codigo: status.count(codigo) for codigo in sorted(set(status))}
+        print(f"{args.updates} updates enviados em {aceitos:.3f}s ({args.updates / aceitos:.0f}/s), status HTTP: {contagem_status}")
+        print(f"{len(latencias)}/{status.count(200)} respostas aos updates aceitos em {total:.3f}s")
+        if latencias:
+            latencias.sort()
+            p95 = latencias[max(int(len(latencias) * 0.95) - 1, 0)]
+            print(f"Latência até a resposta: mediana {statistics.median(latencias) * 1000:.1f} ms, p95 {p95 * 1000:.1f} ms")
+        print(f"Avisos de fila/adiamento: {telegram.avisos}")
+        print(f"Chamadas à API: {telegram.contagem()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,14 +4,20 @@ Ponto de entrada unificado para IBPT Bot e Automação
 import argparse
 from app.start_bot import run_telegram_bot
 from app.main import run_ibpt_automation
+from app.daemon import run_daemon
 
 def main():
     parser = argparse.ArgumentParser(description='IBPT Bot e Automação')
-    parser.add_argument('--modo', choices=['bot', 'automacao', 'ambos'], 
+    parser.add_argument('--modo', choices=['bot', 'webhook', 'automacao', 'ambos', 'daemon'], 
                         default='automacao', help='Modo de execução da aplicação')
     
     args = parser.parse_args()
     
+    # Bot e automação agendada no mesmo processo
+    if args.modo == 'daemon':
+        run_daemon()
+        return
+    
     # Execute a automação IBPT primeiro se solicitado
     if args.modo in ['automacao', 'ambos']:
         run_ibpt_automation()
@@ -19,6 +25,10 @@ def main():
     # Execute o bot por último, pois ele bloqueia com polling infinito
     if args.modo in ['bot', 'ambos']:
         run_telegram_bot()
+    
+    # Bot recebendo os updates por webhook em vez de polling
+    if args.modo == 'webhook':
+        run_telegram_bot(modo='webhook')
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file